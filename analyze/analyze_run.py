@@ -8,6 +8,7 @@ import math
 from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from typing import Any, Dict, Optional, List, Tuple
+from urllib.error import HTTPError
 from urllib.request import Request, urlopen
 
 import matplotlib.pyplot as plt
@@ -57,10 +58,13 @@ COORD_SCALE = 1e7
 
 API_REQUEST_TIMEOUT = 30.0
 API_POLL_TIMEOUT = 600.0
+# Times a job refused with 429 (API at capacity) is submitted again after its Retry-After
+API_BUSY_RETRIES = 30
 
 POLL_INITIAL = 0.2
 POLL_AFTER_5S = 0.5
 POLL_AFTER_20S = 1.0
+POLL_WAIT = 20.0
 
 DEFAULTS = {
     "tx_height": 2.0,
@@ -91,21 +95,33 @@ def http_json(url: str, payload: Optional[Dict[str, Any]], timeout: float) -> Di
     else:
         data = json.dumps(payload).encode("utf-8")
         req = Request(url, data=data, headers={"Content-Type": "application/json"})
-    with urlopen(req, timeout=timeout) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+    for attempt in range(API_BUSY_RETRIES + 1):
+        try:
+            with urlopen(req, timeout=timeout) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+        except HTTPError as e:
+            if e.code != 429 or attempt == API_BUSY_RETRIES:
+                raise
+            time.sleep(float(e.headers.get("Retry-After", "5")))
 
 
 def poll_task(task_id: str) -> Dict[str, Any]:
     start = time.monotonic()
     deadline = start + API_POLL_TIMEOUT
     while time.monotonic() < deadline:
-        status = http_json(f"{API_URL}/task/{task_id}", None, API_REQUEST_TIMEOUT)
+        # long-poll: the API answers as soon as the task finishes or after POLL_WAIT
+        request_start = time.monotonic()
+        status = http_json(f"{API_URL}/task/{task_id}?wait={POLL_WAIT:g}", None, API_REQUEST_TIMEOUT)
         st = status.get("status")
         if st == "completed":
             return status
         if st == "failed":
             raise RuntimeError(status.get("error", "Task failed"))
 
+        if time.monotonic() - request_start >= 1.0:
+            continue
+
+        # API without long-poll support, fall back to polling
         elapsed = time.monotonic() - start
         if elapsed < 5.0:
             time.sleep(POLL_INITIAL)
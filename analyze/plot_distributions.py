@@ -13,15 +13,19 @@ import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 from matplotlib.ticker import MultipleLocator
+from urllib.error import HTTPError
 from urllib.request import Request, urlopen
 
 API_URL = "http://localhost:8081"
 API_REQUEST_TIMEOUT = 30.0
 API_POLL_TIMEOUT = 600.0
+# Times a job refused with 429 (API at capacity) is submitted again after its Retry-After
+API_BUSY_RETRIES = 30
 
 POLL_INITIAL = 0.2
 POLL_AFTER_5S = 0.5
 POLL_AFTER_20S = 1.0
+POLL_WAIT = 20.0
 
 DEFAULTS = {
     "tx_height": 3.0,
@@ -84,21 +88,33 @@ def http_json(
     else:
         data = json.dumps(payload).encode("utf-8")
         req = Request(url, data=data, headers={"Content-Type": "application/json"})
-    with urlopen(req, timeout=timeout) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+    for attempt in range(API_BUSY_RETRIES + 1):
+        try:
+            with urlopen(req, timeout=timeout) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+        except HTTPError as e:
+            if e.code != 429 or attempt == API_BUSY_RETRIES:
+                raise
+            time.sleep(float(e.headers.get("Retry-After", "5")))
 
 
 def poll_task(api_url: str, task_id: str) -> Dict[str, Any]:
     start = time.monotonic()
     deadline = start + API_POLL_TIMEOUT
     while time.monotonic() < deadline:
-        status = http_json(f"{api_url}/task/{task_id}", None, API_REQUEST_TIMEOUT)
+        # long-poll: the API answers as soon as the task finishes or after POLL_WAIT
+        request_start = time.monotonic()
+        status = http_json(f"{api_url}/task/{task_id}?wait={POLL_WAIT:g}", None, API_REQUEST_TIMEOUT)
         st = status.get("status")
         if st == "completed":
             return status
         if st == "failed":
             raise RuntimeError(status.get("error", "Task failed"))
 
+        if time.monotonic() - request_start >= 1.0:
+            continue
+
+        # API without long-poll support, fall back to polling
         elapsed = time.monotonic() - start
         if elapsed < 5.0:
             time.sleep(POLL_INITIAL)
@@ -0,0 +1,226 @@
+"""
+Fixtures of the Splat service benchmarks
+
+The benchmarks are hermetic: they need neither the SPLAT! binaries, terrain tiles nor a GeoServer. Small SPLAT!
+artifacts (tx-to-rx.txt, output.kml) are bundled in fixtures/, the large ones (.gp files, output.ppm mosaics,
+output-ck.ppm) are generated deterministically once per session, and GeoServer is a local stub answering the REST calls
+of a publish.
+
+Recorded artifacts of a real run (the files SPLAT_DEBUG_ARTIFACTS dumps) can be used instead by pointing
+SPLAT_ARTIFACTS_DIR at them, every file found there replaces its bundled or generated counterpart and an output.ppm is
+benchmarked as the extra "recorded" mosaic.
+"""
+
+import math
+import os
+import stat
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.geoserver import GeoServerClient  # noqa: E402
+from services.splat import Splat  # noqa: E402
+from services.storage import LocalResultStore  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+RECORDED_DIR = os.getenv("SPLAT_ARTIFACTS_DIR")
+
+# Widths and heights in pixels of the benchmarked output.ppm terrain mosaics
+MOSAIC_SIZES = (1200, 2400, 4800)
+# Rows of the benchmarked .gp files, from a short 90 m path to a long 30 m one
+GP_ROWS = (1_000, 10_000, 100_000)
+
+COLORMAP = "rainbow"
+MIN_DBM = -130
+MAX_DBM = -30
+
+# 100 km around 46.0 N 14.0 E as coverage_prediction crops it out of the fixtures/output.kml mosaic
+COVERAGE_BOUNDS = {
+    "north": 46.0 + 100 / 111.0,
+    "south": 46.0 - 100 / 111.0,
+    "east": 14.0 + 100 / 111.0 / math.cos(math.radians(46.0)),
+    "west": 14.0 - 100 / 111.0 / math.cos(math.radians(46.0)),
+}
+
+
+def recorded(name):
+    """Path of a recorded artifact in SPLAT_ARTIFACTS_DIR, None if there is none."""
+    if not RECORDED_DIR:
+        return None
+    path = os.path.join(RECORDED_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def read_artifact(name):
+    with open(recorded(name) or os.path.join(FIXTURES_DIR, name), "rb") as artifact_file:
+        return artifact_file.read()
+
+
+def write_ppm(path, rgb):
+    """Binary (P6) PPM, the format SPLAT! writes."""
+    height, width = rgb.shape[:2]
+    with open(path, "wb") as ppm_file:
+        ppm_file.write(f"P6\n{width} {height}\n255\n".encode("ascii"))
+        ppm_file.write(np.ascontiguousarray(rgb, dtype=np.uint8).tobytes())
+
+
+def synthetic_mosaic(size):
+    """
+    A -dbm coverage painted the way SPLAT! does: the .dcf colour of the highest level reached, white where the signal
+    is below MIN_DBM, over a `size` x `size` terrain mosaic.
+    """
+    levels, rgb_colors = Splat._splat_dcf_levels(COLORMAP, MIN_DBM, MAX_DBM)
+    yy, xx = np.ogrid[0:size, 0:size]
+    distance = np.hypot(yy - size / 2, xx - size / 2) / (size / 2)
+    noise = np.random.default_rng(size).normal(0, 4, (size, size)).astype(np.float32)
+    dbm = MAX_DBM - distance * 140 + noise
+
+    rgb = np.full((size, size, 3), 255, dtype=np.uint8)
+    for level, color in zip(levels[::-1], rgb_colors[::-1]):
+        rgb[dbm >= level] = color
+    return rgb
+
+
+def synthetic_gp(rows):
+    """A gnuplot .gp terrain profile: distance (km) and elevation (m) per row, tab separated."""
+    rng = np.random.default_rng(rows)
+    distance = np.linspace(0, rows * 0.03, rows)
+    elevation = 300 + 400 * np.sin(distance / distance[-1] * math.pi) + rng.normal(0, 15, rows).cumsum() / 10
+    return "".join(f"{d:.6f}\t{e:.6f}\n" for d, e in zip(distance, elevation)).encode("ascii")
+
+
+def synthetic_color_key():
+    """The colour key SPLAT! writes next to a -dbm coverage (output-ck.ppm): one swatch per .dcf level."""
+    _, rgb_colors = Splat._splat_dcf_levels(COLORMAP, MIN_DBM, MAX_DBM)
+    return np.repeat(np.repeat(rgb_colors.astype(np.uint8)[:, None, :], 30, axis=0), 130, axis=1)
+
+
+@pytest.fixture(scope="session")
+def artifacts_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("splat-artifacts")
+
+
+@pytest.fixture(scope="session")
+def splat(tmp_path_factory):
+    """A Splat service on a directory of do-nothing binaries, only its parsers and converters are benchmarked."""
+    splat_dir = tmp_path_factory.mktemp("splat")
+    for binary in ("splat", "splat-hd", "srtm2sdf", "srtm2sdf-hd"):
+        path = splat_dir / binary
+        path.write_text("#!/bin/sh\nexit 0\n")
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return Splat(str(splat_dir), cache_dir=str(tmp_path_factory.mktemp("splat-tiles")))
+
+
+@pytest.fixture(scope="session")
+def tx_to_rx_report():
+    return read_artifact("tx-to-rx.txt")
+
+
+@pytest.fixture(scope="session")
+def kml_bytes():
+    return read_artifact("output.kml")
+
+
+@pytest.fixture(scope="session")
+def gp_file():
+    """Factory returning the bytes of a .gp file with the given number of rows, "recorded" for profile.gp."""
+    cache = {}
+
+    def get(rows):
+        if rows == "recorded":
+            return read_artifact("profile.gp")
+        if rows not in cache:
+            cache[rows] = synthetic_gp(rows)
+        return cache[rows]
+
+    return get
+
+
+@pytest.fixture(scope="session")
+def mosaic_ppm(artifacts_dir):
+    """Factory returning the path of an output.ppm mosaic of the given size, "recorded" for the recorded one."""
+
+    def get(size):
+        if size == "recorded":
+            return recorded("output.ppm")
+        path = artifacts_dir / f"output-{size}.ppm"
+        if not path.exists():
+            write_ppm(path, synthetic_mosaic(size))
+        return str(path)
+
+    return get
+
+
+@pytest.fixture(scope="session")
+def color_key_ppm(artifacts_dir):
+    path = recorded("output-ck.ppm")
+    if path is None:
+        path = str(artifacts_dir / "output-ck.ppm")
+        write_ppm(path, synthetic_color_key())
+    return path
+
+
+class StubGeoServerHandler(BaseHTTPRequestHandler):
+    """Answers the GeoServer REST calls of a publish the way GeoServer does, without doing anything."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like GeoServer behind its connection pool
+
+    def _reply(self, status):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        # workspace and raster style exist
+        self._reply(200)
+
+    def do_POST(self):
+        self._reply(201)
+
+    def do_PUT(self):
+        self._reply(201 if self.path.split("?")[0].endswith("/external.geotiff") else 200)
+
+    def do_DELETE(self):
+        self._reply(200)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def stub_geoserver():
+    """Base URL of a stub GeoServer running in a background thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGeoServerHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/geoserver"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def result_store(tmp_path):
+    return LocalResultStore(str(tmp_path / "data"), "/opt/geoserver_data/data")
+
+
+@pytest.fixture
+def geoserver(stub_geoserver, result_store):
+    client = GeoServerClient(
+        base_url=f"{stub_geoserver}/rest",
+        user="admin",
+        password="geoserver",
+        publish_mode="store",
+        store=result_store,
+    )
+    client.initialise()
+    yield client
+    client.session.close()
+
@@ -0,0 +1,137 @@
+import uuid
+
+import pytest
+from conftest import (
+    COLORMAP,
+    COVERAGE_BOUNDS,
+    GP_ROWS,
+    MAX_DBM,
+    MIN_DBM,
+    MOSAIC_SIZES,
+    recorded,
+)
+from services.splat import Splat
+from services.storage import geotiff_name
+
+MOSAICS = MOSAIC_SIZES + (("recorded",) if recorded("output.ppm") else ())
+GP_FILES = GP_ROWS + (("recorded",) if recorded("profile.gp") else ())
+
+
+def test_parse_tx_to_rx_report(benchmark, splat, tx_to_rx_report):
+    report = benchmark(splat._parse_tx_to_rx_report, tx_to_rx_report)
+    assert report["distance"] is not None
+    assert report["signal_power_level_at_rx"] is not None
+
+
+@pytest.mark.parametrize("rows", GP_FILES)
+def test_parse_gp_xy_lines(benchmark, gp_file, rows):
+    lines = Splat._decode_lines(gp_file(rows))
+    xs, ys = benchmark(Splat._parse_gp_xy_lines, lines)
+    assert len(xs) == len(ys) == len(lines)
+
+
+@pytest.mark.parametrize("rows", GP_FILES)
+def test_parse_gp_xy(benchmark, gp_file, rows):
+    data = gp_file(rows)
+    xs, ys = benchmark(Splat._parse_gp_xy, data, label="profile.gp")
+    assert len(xs) == len(ys) == len(Splat._decode_lines(data))
+
+
+@pytest.mark.parametrize("size", MOSAICS)
+def test_create_splat_geotiff(benchmark, mosaic_ppm, kml_bytes, size, tmp_path):
+    dst_path = str(tmp_path / "coverage.geotiff")
+    benchmark(
+        Splat._create_splat_geotiff,
+        mosaic_ppm(size),
+        kml_bytes,
+        COLORMAP,
+        MIN_DBM,
+        MAX_DBM,
+        explicit_bounds=COVERAGE_BOUNDS,
+        dst_path=dst_path,
+    )
+    assert (tmp_path / "coverage.geotiff").stat().st_size > 0
+
+
+@pytest.mark.parametrize("size", MOSAICS)
+def test_create_splat_signal_geotiff(benchmark, mosaic_ppm, kml_bytes, size, tmp_path):
+    dst_path = str(tmp_path / "signal.geotiff")
+    benchmark(
+        Splat._create_splat_signal_geotiff,
+        mosaic_ppm(size),
+        kml_bytes,
+        COLORMAP,
+        MIN_DBM,
+        MAX_DBM,
+        explicit_bounds=COVERAGE_BOUNDS,
+        dst_path=dst_path,
+    )
+    assert (tmp_path / "signal.geotiff").stat().st_size > 0
+
+
+def test_create_splat_dcf(benchmark):
+    dcf = benchmark(Splat._create_splat_dcf, COLORMAP, MIN_DBM, MAX_DBM)
+    assert dcf.count(b"\n") == 4 + 32
+
+
+def test_color_key_to_png(benchmark, color_key_ppm):
+    assert benchmark(Splat._ppm_to_png_base64, color_key_ppm)
+
+
+@pytest.mark.parametrize(
+    "tx, rx",
+    [
+        ((46.05, 14.50), (46.22, 14.96)),  # within one tile
+        ((45.10, 13.20), (47.60, 16.90)),  # 400 km diagonal
+    ],
+    ids=["short", "long"],
+)
+def test_calculate_required_terrain_tiles_los(benchmark, tx, rx):
+    tiles = benchmark(Splat._calculate_required_terrain_tiles_los, *tx, *rx)
+    assert tiles
+
+
+@pytest.mark.parametrize("radius_km", [10, 100, 300])
+def test_calculate_required_terrain_tiles_coverage(benchmark, radius_km):
+    tiles = benchmark(Splat._calculate_required_terrain_tiles_coverage, 46.0, 14.0, radius_km * 1000)
+    assert tiles
+
+
+def test_publish_geotiff(benchmark, geoserver, result_store, mosaic_ppm, kml_bytes):
+    """Publishing a stored coverage: the REST calls of a publish against a stub GeoServer."""
+    task_id = str(uuid.uuid4())
+    with result_store.staged(geotiff_name(task_id)) as geotiff_path:
+        Splat._create_splat_geotiff(
+            mosaic_ppm(MOSAIC_SIZES[0]),
+            kml_bytes,
+            COLORMAP,
+            MIN_DBM,
+            MAX_DBM,
+            explicit_bounds=COVERAGE_BOUNDS,
+            dst_path=geotiff_path,
+        )
+
+    layer = benchmark(geoserver.store_coverage, task_id)
+    assert layer == {"layers": f"RF-SITE-PLANNER:{task_id}"}
+
+
+@pytest.mark.parametrize("size", MOSAICS)
+def test_geotiff_to_geoserver(benchmark, geoserver, result_store, mosaic_ppm, kml_bytes, size):
+    """The end of a coverage job: SPLAT! output to a GeoTIFF in the result store, published to a stub GeoServer."""
+    ppm_path = mosaic_ppm(size)
+
+    def geotiff_to_geoserver():
+        task_id = str(uuid.uuid4())
+        with result_store.staged(geotiff_name(task_id)) as geotiff_path:
+            Splat._create_splat_geotiff(
+                ppm_path,
+                kml_bytes,
+                COLORMAP,
+                MIN_DBM,
+                MAX_DBM,
+                explicit_bounds=COVERAGE_BOUNDS,
+                dst_path=geotiff_path,
+            )
+        return geoserver.store_coverage(task_id)
+
+    assert benchmark(geotiff_to_geoserver)
@@ -1,26 +1,199 @@
+import asyncio
+import hmac
+import json
 import logging
+import os
+import re
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from uuid import uuid4
 
-from fastapi import BackgroundTasks, FastAPI
+import msgpack
+from fastapi import (
+    FastAPI,
+    Path,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from models.CoveragePredictionRequest import CoveragePredictionRequest
+from models.CoverageRestyleRequest import CoverageRestyleRequest
 from models.LosPredictionRequest import LosPredictionRequest
-from redis import StrictRedis
-from services.geoserver import remove_tiff_from_geoserver, store_tiff_in_geoserver
+from redis import BlockingConnectionPool, StrictRedis
+from redis.asyncio import BlockingConnectionPool as AsyncBlockingConnectionPool
+from redis.asyncio import StrictRedis as AsyncStrictRedis
+from services.capture import TRAFFIC_CAPTURE_DIR, TRAFFIC_CAPTURE_SALT, TrafficCapture
+from services.cost_model import (
+    JobCost,
+    JobCostModel,
+    ResolutionChoice,
+    memory_budget_mb,
+    restyle_memory_mb,
+)
+from services.geoserver import (
+    geoserver_client,
+    load_signal_raster,
+    remove_tiff_from_geoserver,
+    signal_raster_pixels,
+    store_tiff_in_geoserver,
+)
+from services.janitor import COVERAGE_RETENTION_S, CoverageJanitor
+from services.metrics import JOBS_REJECTED, JobMetrics
+from services.profiling import PROFILE_ARTIFACTS, JobProfile, profiling
+from services.scheduler import (
+    SCHEDULER_API_KEYS,
+    JobScheduler,
+    QueueFullError,
+    limits_from_env,
+    parse_api_keys,
+)
 from services.splat import Splat
+from services.storage import geotiff_name, profile_name, result_store, signal_raster_name
+from services.tasks import TaskStore
+from services.tiles import CoverageTiles
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Redis client for binary data
-redis_client = StrictRedis(host="redis", port=6379, decode_responses=False)
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+
+# Initialize Redis client for binary data, used by background workers (threads).
+# Blocking pools make callers wait for a free connection instead of failing when all are busy.
+redis_client = StrictRedis(
+    connection_pool=BlockingConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=10,
+        decode_responses=False,
+    )
+)
+
+# Async client with its own pool for request handlers, never blocks the event loop
+async_redis_client = AsyncStrictRedis(
+    connection_pool=AsyncBlockingConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=10,
+        decode_responses=False,
+    )
+)
+
+# Every open task event stream holds a pub/sub connection, they don't come from the bounded pool
+pubsub_redis_client = AsyncStrictRedis(
+    host=REDIS_HOST, port=REDIS_PORT, decode_responses=False
+)
+
+# Task status reads and writes, status changes are published for waiting clients.
+# Large results go to the result store (RESULT_STORE), Redis only keeps a pointer to them.
+task_store = TaskStore(
+    redis_client, async_redis_client, pubsub_redis_client, result_store=result_store
+)
+
+# Token admin-only features (job profiling) are unlocked with, sent as X-Admin-Token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Longest a `/task/{task_id}?wait=` long-poll is held open
+TASK_MAX_WAIT_S = 60
+
+# Idle SSE / WebSocket streams get a heartbeat so proxies don't close them
+TASK_STREAM_HEARTBEAT_S = 15
 
 # Initialize SPLAT service
-splat_service = Splat(splat_path="/usr/bin")
+splat_service = Splat(
+    splat_path=os.getenv("SPLAT_PATH", "/usr/bin"),
+    terrain_base_url=os.getenv("TERRAIN_BASE_URL", "https://gis.komelt.dev/static/dem/sdf"),
+)
+
+# Initialize XYZ tile renderer for published coverages
+tile_service = CoverageTiles(
+    lambda task_id: result_store.gdal_path(geotiff_name(task_id)),
+    cache_size_mb=int(os.getenv("TILE_CACHE_SIZE_MB", "1024")),
+    render_threads=int(os.getenv("TILE_RENDER_THREADS", "4")),
+    prerender_threads=int(os.getenv("TILE_PRERENDER_THREADS", "1")),
+    prerender_max_zoom=int(os.getenv("TILE_PRERENDER_MAX_ZOOM", "9")),
+)
+
+# Predicted peak memory and runtime of prediction jobs, calibrated with the jobs that completed
+cost_model = JobCostModel()
+
+# Prediction jobs run on a fixed set of workers, over the queue limit of their type new jobs are refused with 429.
+# A job only starts when its predicted memory fits in what the running jobs left of the memory budget.
+scheduler = JobScheduler(
+    {
+        "los": limits_from_env("los", workers=8, queue_limit=200),
+        "coverage": limits_from_env("coverage", workers=2, queue_limit=20),
+        "restyle": limits_from_env("restyle", workers=2, queue_limit=20),
+    },
+    memory_budget_mb=memory_budget_mb(),
+)
+
+# Clients sending one of these keys as X-API-Key are scheduled by its name instead of their address
+API_KEY_CLIENTS = parse_api_keys(SCHEDULER_API_KEYS)
+
+# Rasters and tiles of a coverage never change (a restyle is published under a new task id) but are deleted by the
+# janitor or DELETE /coverage/{id}, so caches may keep them no longer than the retention period
+COVERAGE_CACHE_MAX_AGE_S = min(int(os.getenv("COVERAGE_CACHE_MAX_AGE_S", "300")), COVERAGE_RETENTION_S)
+COVERAGE_CACHE_CONTROL = f"public, max-age={COVERAGE_CACHE_MAX_AGE_S}"
+
+# Single `bytes=start-end`, `bytes=start-` or `bytes=-suffix` range
+BYTE_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+UUID_PATTERN = r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$"
+
+
+def remove_coverage(task_id: str) -> int:
+    """Unpublish a coverage and delete its rasters and cached tiles, returns the bytes freed."""
+    reclaimed = remove_tiff_from_geoserver(task_id)
+    try:
+        reclaimed += tile_service.remove(task_id)
+    except ValueError as e:
+        logger.warning(f"Tile cache for task {task_id} not removed: {e}")
+    return reclaimed
+
+
+# Initialize retention of published coverages
+janitor = CoverageJanitor(
+    redis_client,
+    remove_coverage,
+    geoserver_client.list_task_ids,
+    batch_size=int(os.getenv("JANITOR_BATCH_SIZE", "50")),
+    concurrency=int(os.getenv("JANITOR_CONCURRENCY", "4")),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workspace and style are created once instead of being checked on every coverage
+    try:
+        await run_in_threadpool(geoserver_client.initialise)
+    except Exception as e:
+        logger.error(f"GeoServer initialisation failed, retrying on first publish: {e}")
+
+    janitor_task = asyncio.create_task(
+        janitor.run(
+            interval_s=float(os.getenv("JANITOR_INTERVAL_S", "300")),
+            orphan_scan_interval_s=float(os.getenv("JANITOR_ORPHAN_SCAN_INTERVAL_S", "3600")),
+        )
+    )
+    scheduler.start()
+    yield
+    janitor_task.cancel()
+    scheduler.stop(timeout=5)
+    await async_redis_client.aclose()
+    await pubsub_redis_client.aclose()
+
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware to allow requests from your frontend
 app.add_middleware(
@@ -31,84 +204,504 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in capture of anonymised traffic for utils/replay_traffic.py, inside GZip so it sees plain responses
+if TRAFFIC_CAPTURE_DIR:
+    app.add_middleware(TrafficCapture, directory=TRAFFIC_CAPTURE_DIR, salt=TRAFFIC_CAPTURE_SALT)
+
+# Compress large responses (LOS profiles, legends) for clients sending Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
+def _is_admin(request: Request) -> bool:
+    """Whether the request carries the ADMIN_TOKEN, admin features are off without one configured."""
+    token = request.headers.get("x-admin-token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def _client_id(request: Request) -> str:
+    """
+    Who a job is scheduled for: the name of a configured X-API-Key, or the address nginx passes in X-Real-IP. Unknown
+    keys are ignored, otherwise a client could send a new key per job to get past its limits.
+    """
+    client = API_KEY_CLIENTS.get(request.headers.get("x-api-key", ""))
+    if client:
+        return client
+    address = request.headers.get("x-real-ip") or (request.client.host if request.client else "unknown")
+    return f"ip:{address}"
 
-def run_los(task_id: str, request: CoveragePredictionRequest):
+
+def _auto_resolution(
+    job_type: str, payload, tiles: int, radius_km: float = None
+) -> Optional[ResolutionChoice]:
+    """Resolve `high_resolution="auto"` of a request in place, returns the choice made for it."""
+    if payload.high_resolution != "auto":
+        return None
+    choice = cost_model.choose_resolution(
+        job_type,
+        tiles,
+        radius_km,
+        latency_budget_s=payload.latency_budget_s,
+        wait_s=scheduler.estimated_wait_s(job_type),
+        memory_budget_mb=scheduler.memory_budget_mb,
+    )
+    payload.high_resolution = choice.high_resolution
+    return choice
+
+
+def _queue_full(e: QueueFullError) -> JSONResponse:
+    JOBS_REJECTED.labels(e.job_type, e.reason).inc()
+    return JSONResponse(
+        {"error": str(e), "retry_after_s": e.retry_after_s},
+        status_code=429,
+        headers={"Retry-After": str(e.retry_after_s)},
+    )
+
+
+def run_los(
+    task_id: str,
+    request: CoveragePredictionRequest,
+    job: JobMetrics,
+    cost: JobCost,
+    resolution: Optional[ResolutionChoice],
+):
+    job.started()
     try:
-        logger.info(f"Starting SPLAT! coverage prediction for task {task_id}.")
-        gp_file = splat_service.los_prediction(request)
-        redis_client.setex(f"{task_id}:status", 3600, "completed")
-        redis_client.setex(f"{task_id}:data", 3600, gp_file)
+        with profiling(job.profile, task_id, result_store):
+            logger.info(f"Starting SPLAT! coverage prediction for task {task_id}.")
+            gp_file = splat_service.los_prediction(request, job=job)
+        job.completed()
+        cost_model.observe(cost, job.timings())
+        if resolution is not None:
+            gp_file = _with_fields(gp_file, resolution=resolution.as_dict())
+        task_store.set_completed(task_id, gp_file, timings=job.timings())
         logger.info(f"Task {task_id} marked as completed.")
     except Exception as e:
         logger.error(f"Error in SPLAT! task {task_id}: {e}")
-        redis_client.setex(f"{task_id}:status", 3600, "failed")
-        redis_client.setex(f"{task_id}:error", 3600, str(e))
+        job.failed(e)
+        task_store.set_failed(task_id, str(e), timings=job.timings())
         raise
 
 
 @app.post("/los")
 async def predict_los(
-    payload: LosPredictionRequest, background_tasks: BackgroundTasks
+    payload: LosPredictionRequest,
+    request: Request,
+    profile: bool = Query(False, description="Profile the job, needs the X-Admin-Token header"),
 ) -> JSONResponse:
+    if profile and not _is_admin(request):
+        return JSONResponse({"error": "Profiling needs a valid X-Admin-Token"}, status_code=403)
+    client = _client_id(request)
+    try:
+        scheduler.admit("los", client)
+    except QueueFullError as e:
+        return _queue_full(e)
+
     task_id = str(uuid4())
-    redis_client.setex(f"{task_id}:status", 3600, "processing")
-    background_tasks.add_task(run_los, task_id, payload)
+    await task_store.set_processing_async(task_id)
+    tiles = Splat.terrain_tile_count(payload)
+    resolution = _auto_resolution("los", payload, tiles)
+    job = JobMetrics("los", payload.high_resolution).queued()
+    if profile:
+        job.profile = JobProfile()
+    cost = cost_model.predict("los", payload.high_resolution, tiles)
+    job.predicted_cost(cost)
+    scheduler.submit(
+        "los",
+        client,
+        run_los,
+        task_id,
+        payload,
+        job,
+        cost,
+        resolution,
+        memory_mb=cost.memory_mb,
+        runtime_s=cost.runtime_s,
+    )
     return JSONResponse({"task_id": task_id})
 
 
-def run_coverage(task_id: str, request: CoveragePredictionRequest):
+def _with_fields(data: str, **fields) -> str:
+    """Add fields (the WMS layer of a published coverage, an automatic resolution choice) to a JSON result."""
+    return json.dumps({**json.loads(data), **fields})
+
+
+def run_coverage(
+    task_id: str,
+    request: CoveragePredictionRequest,
+    job: JobMetrics,
+    cost: JobCost,
+    resolution: Optional[ResolutionChoice],
+):
+    job.started()
     try:
-        logger.info(f"Starting SPLAT! coverage prediction for task {task_id}.")
-        data = splat_service.coverage_prediction(request)
+        with profiling(job.profile, task_id, result_store):
+            logger.info(f"Starting SPLAT! coverage prediction for task {task_id}.")
+            # written locally, then streamed into the result store unless it already is local
+            with result_store.staged(geotiff_name(task_id)) as geotiff_path, result_store.staged(
+                signal_raster_name(task_id)
+            ) as signal_path:
+                data = splat_service.coverage_prediction(
+                    request, geotiff_path=geotiff_path, signal_path=signal_path, job=job
+                )
+            splat_rss_kb = (job.timings().get("splat") or {}).get("max_rss_kb")
+            logger.info(
+                f"Task {task_id} SPLAT! peak RSS: {splat_rss_kb} kB, "
+                f"API process peak RSS: {data['process_peak_rss_kb']} kB."
+            )
+            job.api_process_peak_rss(data["process_peak_rss_kb"])
 
-        store_tiff_in_geoserver(task_id, data["geotiff"])
+            with job.stage("geoserver_publish"):
+                wms = store_tiff_in_geoserver(task_id)
+            janitor.register(task_id)
+            tile_service.prerender(task_id)
 
-        redis_client.setex(f"{task_id}:data", 3600, data["data"])
-        redis_client.setex(f"{task_id}:status", 3600, "completed")
+        job.completed()
+        cost_model.observe(cost, job.timings())
+        fields = {"wms": wms}
+        if resolution is not None:
+            fields["resolution"] = resolution.as_dict()
+        task_store.set_completed(task_id, _with_fields(data["data"], **fields), timings=job.timings())
         logger.info(f"Task {task_id} marked as completed.")
     except Exception as e:
         logger.error(f"Error in SPLAT! task {task_id}: {e}")
-        redis_client.setex(f"{task_id}:status", 3600, "failed")
-        redis_client.setex(f"{task_id}:error", 3600, str(e))
+        job.failed(e)
+        task_store.set_failed(task_id, str(e), timings=job.timings())
         raise
 
 
 @app.post("/coverage")
 async def predict(
-    payload: CoveragePredictionRequest, background_tasks: BackgroundTasks
+    payload: CoveragePredictionRequest,
+    request: Request,
+    profile: bool = Query(False, description="Profile the job, needs the X-Admin-Token header"),
 ) -> JSONResponse:
+    if profile and not _is_admin(request):
+        return JSONResponse({"error": "Profiling needs a valid X-Admin-Token"}, status_code=403)
+    client = _client_id(request)
+    try:
+        scheduler.admit("coverage", client)
+    except QueueFullError as e:
+        return _queue_full(e)
+
     task_id = str(uuid4())
-    redis_client.setex(f"{task_id}:status", 3600, "processing")
-    background_tasks.add_task(run_coverage, task_id, payload)
+    await task_store.set_processing_async(task_id)
+    tiles = Splat.terrain_tile_count(payload)
+    resolution = _auto_resolution("coverage", payload, tiles, payload.radius)
+    job = JobMetrics("coverage", payload.high_resolution, payload.radius).queued()
+    if profile:
+        job.profile = JobProfile()
+    cost = cost_model.predict("coverage", payload.high_resolution, tiles, payload.radius)
+    job.predicted_cost(cost)
+    scheduler.submit(
+        "coverage",
+        client,
+        run_coverage,
+        task_id,
+        payload,
+        job,
+        cost,
+        resolution,
+        memory_mb=cost.memory_mb,
+        runtime_s=cost.runtime_s,
+    )
     return JSONResponse({"task_id": task_id})
 
 
+def run_restyle(task_id: str, source_task_id: str, request: CoverageRestyleRequest, job: JobMetrics):
+    job.started()
+    try:
+        logger.info(f"Restyling coverage {source_task_id} into task {task_id}.")
+        signal_data = load_signal_raster(source_task_id)
+        if signal_data is None:
+            raise RuntimeError(f"Coverage {source_task_id} was removed before it could be restyled")
+        with job.stage("geotiff_build"):
+            data = Splat.restyle_coverage(
+                signal_data,
+                colormap_name=request.colormap,
+                min_dbm=request.min_dbm,
+                max_dbm=request.max_dbm,
+                tx_power=request.tx_power,
+                tx_gain=request.tx_gain,
+                tx_loss=request.tx_loss,
+                rx_loss=request.rx_loss,
+                offset_db=request.offset_db,
+            )
+
+        job.output_size("geotiff", len(data["geotiff"]))
+        job.output_size("signal", len(data["signal"]))
+
+        with job.stage("geoserver_publish"):
+            wms = store_tiff_in_geoserver(task_id, data["geotiff"], data["signal"])
+        janitor.register(task_id)
+        tile_service.prerender(task_id)
+
+        job.completed()
+        task_store.set_completed(task_id, _with_fields(data["data"], wms=wms), timings=job.timings())
+        logger.info(f"Task {task_id} marked as completed.")
+    except Exception as e:
+        logger.error(f"Error in restyle task {task_id}: {e}")
+        job.failed(e)
+        task_store.set_failed(task_id, str(e), timings=job.timings())
+        raise
+
+
+@app.post("/coverage/{task_id}/restyle")
+async def restyle(
+    payload: CoverageRestyleRequest,
+    request: Request,
+    task_id: str = Path(..., pattern=UUID_PATTERN),
+) -> JSONResponse:
+    pixels = await run_in_threadpool(signal_raster_pixels, task_id)
+    if pixels is None:
+        logger.warning(f"Signal raster for task {task_id} not found.")
+        return JSONResponse({"error": "Coverage not found"}, status_code=404)
+
+    client = _client_id(request)
+    try:
+        scheduler.admit("restyle", client)
+    except QueueFullError as e:
+        return _queue_full(e)
+
+    # A restyled coverage is published as a new task, the source coverage is left untouched
+    restyled_task_id = str(uuid4())
+    await task_store.set_processing_async(restyled_task_id)
+    job = JobMetrics("restyle").queued()
+    scheduler.submit(
+        "restyle",
+        client,
+        run_restyle,
+        restyled_task_id,
+        task_id,
+        payload,
+        job,
+        memory_mb=restyle_memory_mb(pixels),
+    )
+    return JSONResponse({"task_id": restyled_task_id})
+
+
 @app.delete("/coverage/{task_id}")
 async def delete_coverage(task_id: str) -> JSONResponse:
-    remove_tiff_from_geoserver(task_id)
+    try:
+        await run_in_threadpool(remove_coverage, task_id)
+    except Exception as e:
+        # still registered, the janitor retries the removal once the coverage expires
+        return JSONResponse({"error": f"Failed to remove coverage: {e}"}, status_code=502)
+    await run_in_threadpool(janitor.unregister, task_id)
     return JSONResponse({"status": "deleted"})
 
 
+@app.get("/coverage/{task_id}/tiles/{z}/{x}/{y}.png")
+async def get_coverage_tile(
+    task_id: str,
+    z: int = Path(..., ge=0, le=22),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+) -> Response:
+    try:
+        tile = await asyncio.wrap_future(tile_service.submit(task_id, z, x, y))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    if tile is None:
+        return JSONResponse({"error": "Coverage not found"}, status_code=404)
+
+    return Response(
+        tile,
+        media_type="image/png",
+        headers={"Cache-Control": COVERAGE_CACHE_CONTROL},
+    )
+
+
+def _byte_range(range_header: str, size: int):
+    """(start, end) inclusive of a Range header, None to send everything, ValueError if unsatisfiable."""
+    match = BYTE_RANGE_PATTERN.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        # multiple ranges or another unit, answering with the whole blob is allowed
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        # syntactically invalid, RFC 9110 says to ignore the header
+        return None
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range {range_header} not satisfiable")
+    return start, end
+
+
+async def _blob_response(request: Request, name: str, filename: str) -> Response:
+    """
+    Serve a result store blob with a strong ETag, bounded caching and single range requests,
+    streamed in chunks so large rasters are never held in memory.
+    """
+    info = await run_in_threadpool(result_store.stat, name)
+    if info is None:
+        return JSONResponse({"error": "Coverage not found"}, status_code=404)
+
+    # a blob is written once and only ever deleted, size and mtime identify its content
+    etag = f'"{int(info.mtime * 1000):x}-{info.size:x}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": COVERAGE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        # keeps GZipMiddleware off, byte ranges refer to the raster itself
+        "Content-Encoding": "identity",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = _byte_range(range_header, info.size)
+        except ValueError:
+            return Response(
+                status_code=416, headers={**headers, "Content-Range": f"bytes */{info.size}"}
+            )
+
+    status_code = 200
+    offset, length = 0, info.size
+    if byte_range is not None:
+        status_code = 206
+        offset, length = byte_range[0], byte_range[1] - byte_range[0] + 1
+        headers["Content-Range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{info.size}"
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type="image/tiff")
+    return StreamingResponse(
+        result_store.iter_read(name, offset, length),
+        status_code=status_code,
+        headers=headers,
+        media_type="image/tiff",
+    )
+
+
+@app.api_route("/coverage/{task_id}/geotiff", methods=["GET", "HEAD"])
+async def download_coverage_geotiff(
+    request: Request, task_id: str = Path(..., pattern=UUID_PATTERN)
+) -> Response:
+    """The styled (palette) coverage GeoTIFF, a COG unless GEOTIFF_FORMAT=gtiff."""
+    return await _blob_response(request, geotiff_name(task_id), f"{task_id}.tif")
+
+
+@app.api_route("/coverage/{task_id}/signal", methods=["GET", "HEAD"])
+async def download_coverage_signal(
+    request: Request, task_id: str = Path(..., pattern=UUID_PATTERN)
+) -> Response:
+    """The signal level (dBm) raster of a coverage."""
+    return await _blob_response(request, signal_raster_name(task_id), f"{task_id}.signal.tif")
+
+
+def _task_response(request: Request, content: dict) -> Response:
+    """Encode a task status as MessagePack when the client asks for it, JSON otherwise."""
+    if "application/msgpack" in request.headers.get("accept", ""):
+        if "data" in content:
+            # send the result as a nested document instead of a JSON string
+            content = {**content, "data": json.loads(content["data"])}
+        return Response(
+            msgpack.packb(content, use_bin_type=True),
+            media_type="application/msgpack",
+        )
+    return JSONResponse(content)
+
+
+@app.get("/capacity")
+async def capacity(request: Request) -> JSONResponse:
+    """Workers, queue depth and limit, drain rate and expected wait per job type, to adapt client concurrency."""
+    return JSONResponse(scheduler.capacity(_client_id(request)))
+
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus metrics of this API process."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/task/{task_id}/profile/{artifact}")
+async def get_task_profile(
+    request: Request,
+    task_id: str = Path(..., pattern=UUID_PATTERN),
+    artifact: str = Path(..., description="pstats, collapsed or splat"),
+) -> Response:
+    """
+    Profiling artifact of a job started with `?profile=true`, admin only. `pstats` is missing when
+    another profiled job held cProfile at the time.
+    """
+    if not _is_admin(request):
+        return JSONResponse({"error": "Invalid X-Admin-Token"}, status_code=403)
+    if artifact not in PROFILE_ARTIFACTS:
+        return JSONResponse({"error": f"Unknown profile artifact {artifact}"}, status_code=404)
+
+    try:
+        data = await run_in_threadpool(result_store.read, profile_name(task_id, artifact))
+    except FileNotFoundError:
+        return JSONResponse({"error": "Profile not found"}, status_code=404)
+    return Response(
+        data,
+        media_type=PROFILE_ARTIFACTS[artifact],
+        headers={"Content-Disposition": f'attachment; filename="{task_id}.{artifact}"'},
+    )
+
+
 @app.get("/task/{task_id}")
-async def get_status(task_id: str):
-    status = redis_client.get(f"{task_id}:status")
-    if not status:
+async def get_status(
+    task_id: str,
+    request: Request,
+    wait: float = Query(0, ge=0, description="Seconds to hold the request open until the task finishes"),
+):
+    if wait > 0:
+        content = await task_store.wait(task_id, min(wait, TASK_MAX_WAIT_S))
+    else:
+        content = await task_store.get_async(task_id)
+
+    if content is None:
         logger.warning(f"Task {task_id} not found in Redis.")
         return JSONResponse({"error": "Task not found"}, status_code=404)
 
-    status = status.decode("utf-8")
-    if status == "completed":
-        data = redis_client.get(f"{task_id}:data")
-        if data:
-            return JSONResponse({"status": "completed", "data": data.decode("utf-8")})
-        else:
-            return JSONResponse(
-                {
-                    "status": "completed",
-                }
-            )
-    elif status == "failed":
-        error = redis_client.get(f"{task_id}:error")
-        return JSONResponse({"status": "failed", "error": error.decode("utf-8")})
+    return _task_response(request, content)
+
+
+@app.get("/tasks/events")
+async def task_events(task_id: List[str] = Query(..., min_length=1)) -> StreamingResponse:
+    """Server-Sent Events stream of the status of one or more tasks, ends when all are finished."""
+
+    async def events():
+        async for content in task_store.stream(task_id, heartbeat_s=TASK_STREAM_HEARTBEAT_S):
+            if content is None:
+                yield ": heartbeat\n\n"
+            else:
+                yield f"event: status\ndata: {json.dumps(content)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/tasks/ws")
+async def task_events_ws(websocket: WebSocket):
+    """
+    WebSocket stream of task status changes. The task ids come from `task_id` query parameters,
+    or from a first {"task_ids": [...]} message when there are none. Closed when all are finished.
+    """
+    await websocket.accept()
+    try:
+        task_ids = websocket.query_params.getlist("task_id")
+        if not task_ids:
+            task_ids = (await websocket.receive_json()).get("task_ids", [])
 
-    return JSONResponse({"status": status})
+        async for content in task_store.stream(task_ids, heartbeat_s=TASK_STREAM_HEARTBEAT_S):
+            if content is None:
+                await websocket.send_json({"status": "heartbeat"})
+            else:
+                await websocket.send_json(content)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
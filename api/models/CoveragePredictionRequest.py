@@ -1,4 +1,4 @@
-from typing import Literal, Optional
+from typing import Literal, Optional, Union
 
 import matplotlib.pyplot as plt
 from pydantic import BaseModel, Field
@@ -94,9 +94,14 @@ class CoveragePredictionRequest(BaseModel):
     radius: float = Field(
         1.0, ge=1.0, description="Model maximum range in kilometers (>= 1 km)"
     )
-    high_resolution: bool = Field(
+    high_resolution: Union[bool, Literal["auto"]] = Field(
         False,
-        description="Use optional 1-arcsecond / 30 meter resolution  terrain tiles instead of the default 3-arcsecond / 90 meter (default: False).",
+        description="Use optional 1-arcsecond / 30 meter resolution terrain tiles instead of the default 3-arcsecond / 90 meter, 'auto' picks one from the radius, terrain tiles and latency budget (default: False).",
+    )
+    latency_budget_s: Optional[float] = Field(
+        None,
+        gt=0,
+        description="Seconds the job may take with high_resolution 'auto', 1-arcsecond terrain is only used when predicted to finish within it (default: 60).",
     )
     itm_mode: bool = Field(
         True,
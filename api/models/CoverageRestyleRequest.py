@@ -0,0 +1,39 @@
+from typing import Literal, Optional
+
+import matplotlib.pyplot as plt
+from pydantic import BaseModel, Field
+
+AVAILABLE_COLORMAPS = plt.colormaps()
+
+
+class CoverageRestyleRequest(BaseModel):
+    # Styling
+    colormap: Optional[Literal[tuple(AVAILABLE_COLORMAPS)]] = Field(
+        None,
+        description=f"Matplotlib colormap to use (default: keep the current one). Available options: {', '.join(AVAILABLE_COLORMAPS)}",
+    )
+    min_dbm: Optional[float] = Field(
+        None,
+        description="Minimum dBm value for the colormap (default: keep the current one).",
+    )
+    max_dbm: Optional[float] = Field(
+        None,
+        description="Maximum dBm value for the colormap (default: keep the current one).",
+    )
+
+    # Power budget, applied as a linear dB shift against the stored coverage
+    tx_power: Optional[float] = Field(
+        None, gt=1, description="Transmitter power in dBm (default: unchanged)"
+    )
+    tx_gain: Optional[float] = Field(
+        None, ge=0, description="Transmitter antenna gain in dB (default: unchanged)"
+    )
+    tx_loss: Optional[float] = Field(
+        None, ge=0, description="TX loss in dB (default: unchanged)"
+    )
+    rx_loss: Optional[float] = Field(
+        None, ge=0, description="RX loss in dB (default: unchanged)"
+    )
+    offset_db: float = Field(
+        0.0, description="Additional constant signal offset in dB (default: 0.0)"
+    )
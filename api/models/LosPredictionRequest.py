@@ -1,4 +1,4 @@
-from typing import Literal, Optional
+from typing import Literal, Optional, Union
 
 import matplotlib.pyplot as plt
 from pydantic import BaseModel, Field
@@ -84,11 +84,27 @@ class LosPredictionRequest(BaseModel):
         le=100,
         description="Percentage of times where the signal prediction is expected to be valid (default 90).",
     )
-    high_resolution: bool = Field(
+    high_resolution: Union[bool, Literal["auto"]] = Field(
         False,
-        description="Use optional 1-arcsecond / 30 meter resolution terrain tiles instead of the default 3-arcsecond / 90 meter (default: False).",
+        description="Use optional 1-arcsecond / 30 meter resolution terrain tiles instead of the default 3-arcsecond / 90 meter, 'auto' picks one from the radius, terrain tiles and latency budget (default: False).",
+    )
+    latency_budget_s: Optional[float] = Field(
+        None,
+        gt=0,
+        description="Seconds the job may take with high_resolution 'auto', 1-arcsecond terrain is only used when predicted to finish within it (default: 60).",
     )
     itm_mode: bool = Field(
         True,
         description="Include ITM model instead of newer ITWOM (default: True).",
     )
+
+    # Output settings
+    max_points: Optional[int] = Field(
+        None,
+        ge=3,
+        description="Decimate the profile arrays to at most this many points, keeping the terrain shape (default: full resolution).",
+    )
+    encoding: Literal["json", "float32"] = Field(
+        "json",
+        description="Encoding of the profile arrays, 'json' number lists or base64 little-endian 'float32' (default: 'json').",
+    )
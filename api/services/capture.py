@@ -0,0 +1,212 @@
+import atexit
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Directory capture files are written to, capturing is off without it
+TRAFFIC_CAPTURE_DIR = os.getenv("TRAFFIC_CAPTURE_DIR")
+# Key of the anonymisation, set the same one on every API worker so their captures line up
+TRAFFIC_CAPTURE_SALT = os.getenv("TRAFFIC_CAPTURE_SALT")
+
+CAPTURE_FORMAT_VERSION = 1
+
+# Request bodies above this are recorded without their payload
+MAX_BODY_BYTES = 64 * 1024
+# Decimals coordinates are rounded to, about 100 m
+COORDINATE_DECIMALS = 3
+COORDINATE_FIELDS = ("lat", "lon", "tx_lat", "tx_lon", "rx_lat", "rx_lon")
+EXCLUDED_PATHS = ("/metrics",)
+
+UUID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+class CaptureAnonymiser:
+    """
+    Keyed, consistent anonymisation of captured traffic. Task ids and clients become short HMAC tokens, so a task
+    polled after it was submitted or a client sending bursts is still recognisable in the capture but can't be traced
+    back. All coordinates are shifted by one secret offset of up to half a degree and rounded, which hides the sites
+    but keeps what matters for load: repeated sites stay repeated, distances and the terrain tile count barely change.
+    """
+
+    def __init__(self, salt: str = None):
+        self.key = (salt or secrets.token_hex(16)).encode("utf-8")
+        digest = self._digest(b"coordinate-offset")
+        self.lat_offset = digest[0] / 255 - 0.5
+        self.lon_offset = digest[1] / 255 - 0.5
+
+    def _digest(self, value: bytes) -> bytes:
+        return hmac.new(self.key, value, hashlib.sha256).digest()
+
+    def token(self, value: str) -> str:
+        return self._digest(value.encode("utf-8")).hex()[:12]
+
+    def path(self, path: str) -> str:
+        """The request path with task ids replaced by `{task:<token>}`."""
+        return UUID_PATTERN.sub(lambda match: f"{{task:{self.token(match.group(0))}}}", path)
+
+    def payload(self, payload: Any) -> Any:
+        if not isinstance(payload, dict):
+            return payload
+        anonymised = dict(payload)
+        for field in COORDINATE_FIELDS:
+            value = anonymised.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                offset = self.lat_offset if field.endswith("lat") else self.lon_offset
+                anonymised[field] = round(value + offset, COORDINATE_DECIMALS)
+        return anonymised
+
+
+class CaptureWriter:
+    """
+    Appends records as JSON lines to a gzip file from a background thread, so a request never waits on compression or
+    the disk. Every process writes its own file, the replay tool merges them by time.
+    """
+
+    def __init__(self, directory: str, flush_interval_s: float = 5):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(
+            directory, f"capture-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.jsonl.gz"
+        )
+        self.flush_interval_s = flush_interval_s
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._queue.put(record)
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+
+    def _run(self) -> None:
+        with gzip.open(self.path, "wt", encoding="utf-8") as capture_file:
+            capture_file.write(json.dumps({"version": CAPTURE_FORMAT_VERSION, "started_at": time.time()}) + "\n")
+            last_flush = time.monotonic()
+            while True:
+                try:
+                    record = self._queue.get(timeout=self.flush_interval_s)
+                except queue.Empty:
+                    record = False  # nothing to write, only flush
+                if record is None:
+                    return
+                if record:
+                    capture_file.write(json.dumps(record, separators=(",", ":")) + "\n")
+                if time.monotonic() - last_flush >= self.flush_interval_s:
+                    # readable while the API runs, at a small cost in compression
+                    capture_file.flush()
+                    last_flush = time.monotonic()
+
+
+class TrafficCapture:
+    """
+    ASGI middleware recording every HTTP request as one line of a gzip JSONL capture: arrival time, method, path
+    and query, the anonymised JSON body, the anonymised client, the response status and the server side latency
+    (until the last byte of the response was sent, background jobs excluded). Responses carrying a task id record its
+    token, which lets the replay tool substitute the task ids of the replayed jobs.
+    """
+
+    def __init__(self, app, directory: str, salt: str = None):
+        self.app = app
+        self.anonymiser = CaptureAnonymiser(salt)
+        self.writer = CaptureWriter(directory)
+        if not salt:
+            logger.warning(
+                "TRAFFIC_CAPTURE_SALT is not set, captures of different API processes won't line up."
+            )
+        logger.info(f"Capturing traffic to {self.writer.path}.")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        arrived_at = time.time()
+        start = time.perf_counter()
+        body = bytearray()
+        response: Dict[str, Any] = {"status": None, "body": bytearray(), "json": False}
+        recorded = False
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request" and len(body) <= MAX_BODY_BYTES:
+                body.extend(message.get("body", b""))
+            return message
+
+        async def capture_send(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["json"] = any(
+                    name == b"content-type" and value.startswith(b"application/json")
+                    for name, value in message.get("headers", [])
+                )
+            elif message["type"] == "http.response.body":
+                if response["json"] and len(response["body"]) <= MAX_BODY_BYTES:
+                    response["body"].extend(message.get("body", b""))
+                await send(message)
+                if not message.get("more_body", False) and not recorded:
+                    recorded = True
+                    self._record(scope, arrived_at, time.perf_counter() - start, body, response)
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            if not recorded:
+                # the client went away or the app failed before a complete response
+                self._record(scope, arrived_at, time.perf_counter() - start, body, response)
+
+    def _record(self, scope, arrived_at: float, elapsed: float, body: bytearray, response: Dict) -> None:
+        try:
+            route = scope.get("route")
+            client = _client_address(scope)
+            record = {
+                "t": round(arrived_at, 4),
+                "method": scope["method"],
+                "route": getattr(route, "path", None),
+                "path": self.anonymiser.path(scope["path"]),
+                "query": self.anonymiser.path(scope.get("query_string", b"").decode("latin-1")),
+                "client": self.anonymiser.token(client) if client else None,
+                "status": response["status"],
+                "ms": round(elapsed * 1000, 2),
+            }
+            if body:
+                record["body"] = self._json(body)
+            content = self._json(response["body"]) if response["json"] else None
+            if isinstance(content, dict) and isinstance(content.get("task_id"), str):
+                record["task"] = self.anonymiser.token(content["task_id"])
+            self.writer.write(record)
+        except Exception as e:
+            logger.warning(f"Failed to capture request {scope.get('path')}: {e}")
+
+    def _json(self, data: bytearray) -> Optional[Any]:
+        if len(data) > MAX_BODY_BYTES:
+            return None
+        try:
+            return self.anonymiser.payload(json.loads(bytes(data)))
+        except ValueError:
+            return None
+
+
+def _client_address(scope) -> Optional[str]:
+    """The client's address, behind nginx the one it passes in X-Real-IP."""
+    for name, value in scope.get("headers", []):
+        if name == b"x-real-ip":
+            return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else None
@@ -0,0 +1,207 @@
+import logging
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Memory prediction jobs may reserve together, by default a share of the container limit or of the node's RAM
+SCHEDULER_MEMORY_BUDGET_MB = os.getenv("SCHEDULER_MEMORY_BUDGET_MB")
+MEMORY_BUDGET_FRACTION = float(os.getenv("SCHEDULER_MEMORY_BUDGET_FRACTION", "0.75"))
+
+# Observed jobs per job type and resolution the model is fitted to
+CALIBRATION_WINDOW = 200
+# Fewer observations than this only scale the prior, they don't replace it
+MIN_FIT_SAMPLES = 5
+# Predicted memory is padded by this, an underestimate costs an OOM kill, an overestimate a short wait
+MEMORY_HEADROOM = 1.25
+
+# Bytes a restyle holds per pixel of the signal raster: the int16 levels, their float32 shifted copy and masks, the
+# uint8 palette index and the two GeoTIFFs built in memory
+RESTYLE_BYTES_PER_PIXEL = 16
+
+# Coverage radius above which `high_resolution="auto"` keeps 3" terrain, at the zoom showing the whole coverage a
+# screen pixel spans far more than the 30 m of 1" terrain
+AUTO_HD_MAX_RADIUS_KM = float(os.getenv("AUTO_HD_MAX_RADIUS_KM", "50"))
+# Latency budget of `high_resolution="auto"` requests without their own `latency_budget_s`
+AUTO_LATENCY_BUDGET_S = float(os.getenv("AUTO_LATENCY_BUDGET_S", "60"))
+
+# Prior (intercept, slope) of SPLAT!'s peak RSS in MB over terrain tiles and of the runtime in seconds over the
+# runtime feature (tiles for LOS, km² of coverage area), until enough jobs were observed. 1" (30 m) tiles are 9x
+# the samples of 3" (90 m) ones.
+PRIORS = {
+    ("los", False): {"memory_mb": (60.0, 30.0), "runtime_s": (0.5, 0.3)},
+    ("los", True): {"memory_mb": (150.0, 250.0), "runtime_s": (1.0, 2.5)},
+    ("coverage", False): {"memory_mb": (100.0, 40.0), "runtime_s": (2.0, 0.001)},
+    ("coverage", True): {"memory_mb": (300.0, 350.0), "runtime_s": (5.0, 0.005)},
+}
+
+
+@dataclass
+class JobCost:
+    """Predicted footprint of one prediction job and the inputs it was predicted from."""
+
+    job_type: str
+    high_resolution: bool
+    tiles: int
+    radius_km: Optional[float]
+    memory_mb: float
+    runtime_s: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "tiles": self.tiles,
+            "radius_km": self.radius_km,
+            "memory_mb": round(self.memory_mb, 1),
+            "runtime_s": round(self.runtime_s, 2),
+        }
+
+
+@dataclass
+class ResolutionChoice:
+    """Terrain resolution picked for a `high_resolution="auto"` request and why, stored with its result."""
+
+    high_resolution: bool
+    reason: str
+    predicted_hd_s: float
+    latency_budget_s: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requested": "auto",
+            "terrain": "1-arcsecond" if self.high_resolution else "3-arcsecond",
+            "reason": self.reason,
+            "predicted_hd_s": round(self.predicted_hd_s, 1),
+            "latency_budget_s": self.latency_budget_s,
+        }
+
+
+class LinearFit:
+    """Least squares line over a sliding window of observations, falling back to a scaled prior."""
+
+    def __init__(self, prior: Tuple[float, float]):
+        self.prior = prior
+        self.samples: Deque[Tuple[float, float]] = deque(maxlen=CALIBRATION_WINDOW)
+
+    def add(self, x: float, y: float) -> None:
+        self.samples.append((x, y))
+
+    def predict(self, x: float) -> float:
+        intercept, slope = self.prior
+        prior = intercept + slope * x
+        n = len(self.samples)
+        if n == 0:
+            return prior
+
+        mean_x = sum(sx for sx, _ in self.samples) / n
+        mean_y = sum(sy for _, sy in self.samples) / n
+        variance = sum((sx - mean_x) ** 2 for sx, _ in self.samples)
+        if n >= MIN_FIT_SAMPLES and variance > 0:
+            fitted_slope = sum((sx - mean_x) * (sy - mean_y) for sx, sy in self.samples) / variance
+            if fitted_slope >= 0:
+                return max(0.0, mean_y + fitted_slope * (x - mean_x))
+
+        # too few or too similar jobs to fit a line, keep the prior's shape at the observed level
+        prior_mean = intercept + slope * mean_x
+        return prior * (mean_y / prior_mean) if prior_mean > 0 else prior
+
+
+class JobCostModel:
+    """
+    Predicts the peak memory and runtime of a prediction job from its type, terrain resolution and the terrain tiles
+    it loads (and the radius of a coverage), so the scheduler only starts jobs that fit the memory budget.
+
+    Memory is fitted to the max RSS of the SPLAT! child (its rusage, see JobMetrics.splat_rusage) over the tile count,
+    runtime to the job duration over the tile count (LOS) or the coverage area. Each job type and resolution has its
+    own fit over its last CALIBRATION_WINDOW jobs, starting from PRIORS; calibration is per API process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fits = {
+            key: {name: LinearFit(prior) for name, prior in priors.items()} for key, priors in PRIORS.items()
+        }
+
+    @staticmethod
+    def _runtime_feature(job_type: str, tiles: int, radius_km: Optional[float]) -> float:
+        return (radius_km or 0) ** 2 if job_type == "coverage" else tiles
+
+    def predict(
+        self, job_type: str, high_resolution: bool, tiles: int, radius_km: float = None
+    ) -> JobCost:
+        with self._lock:
+            fits = self._fits[(job_type, high_resolution)]
+            memory_mb = fits["memory_mb"].predict(tiles) * MEMORY_HEADROOM
+            runtime_s = fits["runtime_s"].predict(self._runtime_feature(job_type, tiles, radius_km))
+        return JobCost(job_type, high_resolution, tiles, radius_km, memory_mb, runtime_s)
+
+    def choose_resolution(
+        self,
+        job_type: str,
+        tiles: int,
+        radius_km: float = None,
+        latency_budget_s: float = None,
+        wait_s: float = 0,
+        memory_budget_mb: float = None,
+    ) -> ResolutionChoice:
+        """
+        1" terrain unless the coverage radius is above AUTO_HD_MAX_RADIUS_KM, the job would not fit the memory budget
+        or its predicted runtime after `wait_s` in the queue is over the latency budget, 3" terrain otherwise.
+        """
+        budget_s = latency_budget_s or AUTO_LATENCY_BUDGET_S
+        hd = self.predict(job_type, True, tiles, radius_km)
+        if radius_km is not None and radius_km > AUTO_HD_MAX_RADIUS_KM:
+            high_resolution, reason = False, f"radius above {AUTO_HD_MAX_RADIUS_KM:g} km"
+        elif memory_budget_mb is not None and hd.memory_mb > memory_budget_mb:
+            high_resolution, reason = False, "1-arcsecond terrain needs more memory than the budget"
+        elif wait_s + hd.runtime_s > budget_s:
+            high_resolution, reason = False, "1-arcsecond terrain predicted over the latency budget"
+        else:
+            high_resolution, reason = True, "1-arcsecond terrain predicted within the latency budget"
+        return ResolutionChoice(high_resolution, reason, wait_s + hd.runtime_s, budget_s)
+
+    def observe(self, cost: JobCost, timings: Dict[str, Any]) -> None:
+        """Calibrate with the breakdown of a completed job (JobMetrics.timings())."""
+        max_rss_kb = (timings.get("splat") or {}).get("max_rss_kb")
+        duration_s = timings.get("duration_s")
+        with self._lock:
+            fits = self._fits[(cost.job_type, cost.high_resolution)]
+            if max_rss_kb:
+                fits["memory_mb"].add(cost.tiles, max_rss_kb / 1024)
+            if duration_s is not None:
+                fits["runtime_s"].add(
+                    self._runtime_feature(cost.job_type, cost.tiles, cost.radius_km), duration_s
+                )
+
+
+def restyle_memory_mb(pixels: int) -> float:
+    """Predicted peak memory of restyling a signal raster of `pixels` pixels, no SPLAT! involved."""
+    return pixels * RESTYLE_BYTES_PER_PIXEL / (1024 * 1024) * MEMORY_HEADROOM
+
+
+def memory_budget_mb() -> float:
+    """SCHEDULER_MEMORY_BUDGET_MB, or MEMORY_BUDGET_FRACTION of the cgroup memory limit or of the node's RAM."""
+    if SCHEDULER_MEMORY_BUDGET_MB:
+        return float(SCHEDULER_MEMORY_BUDGET_MB)
+    return _memory_limit_mb() * MEMORY_BUDGET_FRACTION
+
+
+def _memory_limit_mb() -> float:
+    # cgroup v2, then v1: the limit of the container if it has one
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as limit_file:
+                limit = limit_file.read().strip()
+        except OSError:
+            continue
+        # "max" or a huge number when unlimited
+        if limit.isdigit() and int(limit) < 1 << 60:
+            return int(limit) / (1024 * 1024)
+
+    with open("/proc/meminfo") as meminfo:
+        for line in meminfo:
+            if line.startswith("MemTotal:"):
+                return int(line.split()[1]) / 1024
+    raise OSError("Memory size of the node unknown, set SCHEDULER_MEMORY_BUDGET_MB.")
@@ -1,97 +1,43 @@
 import os
-from io import BytesIO
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from logging import INFO, basicConfig, getLogger
 from os import getenv
+from typing import Dict, Optional, Set
 
+import rasterio
 import requests
+from rasterio.errors import RasterioIOError
+from requests.adapters import HTTPAdapter
+from services.rasters import palette_to_rgba_geotiff
+from services.storage import ResultStore, geotiff_name, result_store, signal_raster_name
+from urllib3.util.retry import Retry
 
 basicConfig(level=INFO)
 logger = getLogger(__name__)
 
+WORKSPACE = "RF-SITE-PLANNER"
+RASTER_STYLE = "raster-coverage"
 
-def store_tiff_in_geoserver(task_id: str, geotiff_data: bytes):
-    try:
-        with open(f"/var/app/geoserver_data/{task_id}.geotiff", "wb") as tiff_file:
-            tiff_file.write(BytesIO(geotiff_data).read())
-            logger.info(f"GeoTIFF saved to /var/app/geoserver_data/{task_id}.geotiff")
-
-        # https://docs.geoserver.org/main/en/user/rest/api/coveragestores.html#workspaces-ws-coveragestores-format
-        req = requests.request(
-            "PUT",
-            f"http://geoserver:8080/geoserver/rest/workspaces/RF-SITE-PLANNER/coveragestores/{task_id}/external.geotiff?configure=first&coverageName={task_id}",
-            auth=(
-                getenv("GEOSERVER_ADMIN_USER"),
-                getenv("GEOSERVER_ADMIN_PASSWORD"),
-            ),
-            headers={"Content-type": "text/plain"},
-            data=f"/opt/geoserver_data/data/{task_id}.geotiff",
-            timeout=15,
-        )
+# "store" publishes every coverage as its own coverage store and layer named by task id,
+# "mosaic" adds it as a granule of the single ImageMosaic MOSAIC_STORE, selected in WMS
+# requests with CQL_FILTER=task_id='<task id>'. The catalog then no longer grows per coverage.
+GEOSERVER_PUBLISH_MODE = getenv("GEOSERVER_PUBLISH_MODE", "store")
+GEOSERVER_REST_URL = getenv("GEOSERVER_REST_URL", "http://geoserver:8080/geoserver/rest")
+MOSAIC_STORE = "coverages"
 
-        if req.status_code != 201:
-            logger.error(f"Failed to upload GeoTIFF to Geoserver: {req.status_code}")
-            raise Exception(f"Failed to upload GeoTIFF to Geoserver: {req.status_code}")
+# Granule index configuration, task_id is taken from the granule file name
+MOSAIC_INDEXER = """Name=coverages
+Schema=*the_geom:Polygon,location:String,task_id:String
+PropertyCollectors=RegExPropertyCollectorSPI[task_idregex](task_id)
+CanBeEmpty=true
+Caching=false
+"""
+MOSAIC_TASK_ID_REGEX = "regex=[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\n"
 
-        logger.info(f"Storing result in Geoserver for task {task_id}")
-        
-        # Create and assign a raster style for proper WMS rendering
-        _create_raster_style_if_missing()
-        _assign_style_to_coverage(task_id, "raster-coverage")
-    except Exception as e:
-        logger.error(
-            f"Unexpected error while storing GeoTIFF data for task {task_id}: {e}"
-        )
-        raise
-
-
-def remove_tiff_from_geoserver(task_id: str):
-    try:
-        # https://docs.geoserver.org/main/en/user/rest/api/coveragestores.html#workspaces-ws-coveragestores-cs-format
-        req = requests.request(
-            "DELETE",
-            f"http://geoserver:8080/geoserver/rest/workspaces/RF-SITE-PLANNER/coveragestores/{task_id}.geotiff?purge=all&recurse=true",
-            auth=(
-                getenv("GEOSERVER_ADMIN_USER"),
-                getenv("GEOSERVER_ADMIN_PASSWORD"),
-            ),
-            timeout=15,
-        )
-
-        os.remove(f"/var/app/geoserver_data/{task_id}.geotiff")
-
-        if req.status_code != 200:
-            logger.error(f"Failed to remove GeoTIFF from Geoserver: {req.status_code}")
-            raise Exception(
-                f"Failed to remove GeoTIFF from Geoserver: {req.status_code}"
-            )
-
-        logger.info(f"Removed GeoTIFF from Geoserver for task {task_id}")
-    except Exception as e:
-        logger.error(
-            f"Unexpected error while removing GeoTIFF data for task {task_id}: {e}"
-        )
-
-
-
-def _create_raster_style_if_missing():
-    """Create a default raster style in GeoServer if it doesn't exist."""
-    try:
-        # Check if style exists
-        check_req = requests.get(
-            "http://geoserver:8080/geoserver/rest/styles/raster-coverage.json",
-            auth=(
-                getenv("GEOSERVER_ADMIN_USER"),
-                getenv("GEOSERVER_ADMIN_PASSWORD"),
-            ),
-            timeout=15,
-        )
-        
-        if check_req.status_code == 200:
-            logger.info("Raster style 'raster-coverage' already exists")
-            return
-        
-        # Create simple rasterize SLD for rendering coverage with embedded colormap
-        sld_body = """<?xml version="1.0" encoding="ISO-8859-1"?>
+# Create simple rasterize SLD for rendering coverage with embedded colormap
+RASTER_STYLE_SLD = """<?xml version="1.0" encoding="ISO-8859-1"?>
 <StyledLayerDescriptor version="1.0.0"
     xsi:schemaLocation="http://www.opengis.net/sld StyledLayerDescriptor.xsd"
     xmlns="http://www.opengis.net/sld"
@@ -123,72 +69,468 @@ def _create_raster_style_if_missing():
         </UserStyle>
     </NamedLayer>
 </StyledLayerDescriptor>"""
-        
-        create_req = requests.post(
-            "http://geoserver:8080/geoserver/rest/styles",
-            auth=(
-                getenv("GEOSERVER_ADMIN_USER"),
-                getenv("GEOSERVER_ADMIN_PASSWORD"),
-            ),
+
+
+class GeoServerClient:
+    """
+    GeoServer REST client sharing one keep-alive connection pool between all jobs.
+
+    The workspace and the raster style are created once by `initialise()` (at API startup),
+    so publishing a coverage costs two REST calls: creating the coverage store and setting
+    the default style of its layer. Idempotent calls are retried with exponential backoff on
+    connection errors and 502/503/504 responses, and the latency of every call is recorded
+    per operation, see `latency_stats()`.
+
+    In "mosaic" publish mode a coverage is instead harvested as an RGBA granule into one
+    ImageMosaic, and removed again with a filtered granule delete. All granules must share
+    one CRS, so COVERAGE_OUTPUT_CRS must not change while the mosaic holds granules.
+
+    Coverages are read from `store`: from the volume shared with GeoServer for a local store,
+    as Cloud Optimized GeoTIFFs straight from the bucket for an S3 store. The mosaic indexes
+    granule files, so "mosaic" mode needs a local store.
+    """
+
+    def __init__(
+        self,
+        base_url: str = None,
+        user: str = None,
+        password: str = None,
+        pool_size: int = 10,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: float = 15,
+        publish_mode: str = None,
+        store: ResultStore = None,
+    ):
+        self.base_url = base_url or GEOSERVER_REST_URL
+        self.timeout = timeout
+        self.publish_mode = publish_mode or GEOSERVER_PUBLISH_MODE
+        if self.publish_mode not in ("store", "mosaic"):
+            raise ValueError(f"Unsupported GeoServer publish mode '{self.publish_mode}'.")
+
+        self.store = store or result_store
+        if self.publish_mode == "mosaic" and self.store.local_path(MOSAIC_STORE) is None:
+            raise ValueError("The GeoServer mosaic publish mode needs a local result store.")
+
+        self.session = requests.Session()
+        self.session.auth = (
+            user or getenv("GEOSERVER_ADMIN_USER"),
+            password or getenv("GEOSERVER_ADMIN_PASSWORD"),
+        )
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "PUT", "DELETE"}),  # POST is not idempotent
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._initialised = False
+        self._mosaic_coverage_ready = False
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def initialise(self) -> None:
+        """Create the workspace, the raster style and in mosaic mode the mosaic if they don't exist yet."""
+        with self._init_lock:
+            if self._initialised:
+                return
+            self._create_workspace_if_missing()
+            self._create_raster_style_if_missing()
+            if self.publish_mode == "mosaic":
+                self._create_mosaic_if_missing()
+            self._initialised = True
+
+    def wms_layer(self, task_id: str) -> Dict[str, str]:
+        """WMS `layers` (and `cql_filter`) parameters showing the coverage of a task."""
+        if self.publish_mode == "mosaic":
+            return {
+                "layers": f"{WORKSPACE}:{MOSAIC_STORE}",
+                "cql_filter": f"task_id='{task_id}'",
+            }
+        return {"layers": f"{WORKSPACE}:{task_id}"}
+
+    def store_coverage(self, task_id: str) -> Dict[str, str]:
+        """Publish the stored GeoTIFF of a task, returns its `wms_layer()`."""
+        if not self._initialised:
+            # GeoServer was not reachable when the API started
+            self.initialise()
+
+        if self.publish_mode == "mosaic":
+            self._store_granule(task_id)
+        else:
+            self._store_coverage_store(task_id)
+        return self.wms_layer(task_id)
+
+    def remove_coverage(self, task_id: str) -> None:
+        if self.publish_mode == "mosaic":
+            self._remove_granule(task_id)
+        else:
+            self._remove_coverage_store(task_id)
+
+    def _store_coverage_store(self, task_id: str) -> None:
+        if self.store.local_path(geotiff_name(task_id)) is None:
+            self._store_cog_coverage_store(task_id)
+        else:
+            # https://docs.geoserver.org/main/en/user/rest/api/coveragestores.html#workspaces-ws-coveragestores-format
+            req = self._request(
+                "create_coverage",
+                "PUT",
+                f"/workspaces/{WORKSPACE}/coveragestores/{task_id}/external.geotiff",
+                params={"configure": "first", "coverageName": task_id},
+                headers={"Content-type": "text/plain"},
+                data=self.store.geoserver_url(geotiff_name(task_id)),
+            )
+
+            if req.status_code != 201:
+                logger.error(f"Failed to upload GeoTIFF to Geoserver: {req.status_code}")
+                raise Exception(f"Failed to upload GeoTIFF to Geoserver: {req.status_code}")
+
+        logger.info(f"Storing result in Geoserver for task {task_id}")
+
+        # The external.geotiff upload can't carry a style, it is set on the new layer in one PUT
+        self._assign_style_to_layer(task_id, RASTER_STYLE)
+
+    def _store_cog_coverage_store(self, task_id: str) -> None:
+        """Publish a GeoTIFF GeoServer can only reach over HTTP, read as COG with range requests."""
+        # https://docs.geoserver.org/main/en/user/community/cog/cog.html
+        store_req = self._request(
+            "create_coverage",
+            "POST",
+            f"/workspaces/{WORKSPACE}/coveragestores",
+            json={
+                "coverageStore": {
+                    "name": task_id,
+                    "type": "GeoTIFF",
+                    "enabled": True,
+                    "workspace": WORKSPACE,
+                    "url": self.store.geoserver_url(geotiff_name(task_id)),
+                }
+            },
+        )
+        if store_req.status_code != 201:
+            logger.error(f"Failed to create COG coverage store in Geoserver: {store_req.status_code}")
+            raise Exception(f"Failed to create COG coverage store in Geoserver: {store_req.status_code}")
+
+        coverage_req = self._request(
+            "create_coverage_layer",
+            "POST",
+            f"/workspaces/{WORKSPACE}/coveragestores/{task_id}/coverages",
+            json={"coverage": {"name": task_id, "nativeName": task_id}},
+        )
+        if coverage_req.status_code != 201:
+            logger.error(f"Failed to configure COG coverage in Geoserver: {coverage_req.status_code}")
+            raise Exception(f"Failed to configure COG coverage in Geoserver: {coverage_req.status_code}")
+
+    def _remove_coverage_store(self, task_id: str) -> None:
+        # https://docs.geoserver.org/main/en/user/rest/api/coveragestores.html#workspaces-ws-coveragestores-cs-format
+        req = self._request(
+            "delete_coverage",
+            "DELETE",
+            f"/workspaces/{WORKSPACE}/coveragestores/{task_id}.geotiff",
+            params={"purge": "all", "recurse": "true"},
+        )
+
+        if req.status_code == 404:
+            # already gone, e.g. removed by an earlier attempt that failed afterwards
+            logger.info(f"GeoTIFF of task {task_id} is not in Geoserver")
+            return
+        if req.status_code != 200:
+            logger.error(f"Failed to remove GeoTIFF from Geoserver: {req.status_code}")
+            raise Exception(
+                f"Failed to remove GeoTIFF from Geoserver: {req.status_code}"
+            )
+
+        logger.info(f"Removed GeoTIFF from Geoserver for task {task_id}")
+
+    def _store_granule(self, task_id: str) -> None:
+        granule = f"{MOSAIC_STORE}/{task_id}.tif"
+        palette_to_rgba_geotiff(
+            self.store.local_path(geotiff_name(task_id)),
+            dst_path=self.store.local_path(granule),
+        )
+
+        # https://docs.geoserver.org/main/en/user/rest/api/coveragestores.html#workspaces-ws-coveragestores-cs-file-extension
+        req = self._request(
+            "harvest_granule",
+            "POST",
+            f"/workspaces/{WORKSPACE}/coveragestores/{MOSAIC_STORE}/external.imagemosaic",
+            headers={"Content-type": "text/plain"},
+            data=f"file://{self.store.geoserver_url(granule)}",
+        )
+
+        if req.status_code not in [200, 201, 202]:
+            logger.error(f"Failed to harvest granule into Geoserver: {req.status_code}")
+            raise Exception(f"Failed to harvest granule into Geoserver: {req.status_code}")
+
+        if not self._mosaic_coverage_ready:
+            self._configure_mosaic_coverage_if_missing()
+
+        logger.info(f"Storing result in Geoserver mosaic for task {task_id}")
+
+    def _remove_granule(self, task_id: str) -> None:
+        # https://docs.geoserver.org/main/en/user/rest/api/structuredcoverages.html
+        req = self._request(
+            "delete_granule",
+            "DELETE",
+            f"/workspaces/{WORKSPACE}/coveragestores/{MOSAIC_STORE}/coverages/{MOSAIC_STORE}/index/granules",
+            params={"filter": f"task_id='{task_id}'", "purge": "all"},
+        )
+
+        granule_path = self.store.local_path(f"{MOSAIC_STORE}/{task_id}.tif")
+        if os.path.exists(granule_path):
+            os.remove(granule_path)
+
+        if req.status_code != 200:
+            logger.error(f"Failed to remove granule from Geoserver: {req.status_code}")
+            raise Exception(f"Failed to remove granule from Geoserver: {req.status_code}")
+
+        logger.info(f"Removed granule from Geoserver mosaic for task {task_id}")
+
+    def _create_mosaic_if_missing(self) -> None:
+        """Create the empty ImageMosaic store, its coverage is configured with the first granule."""
+        check_req = self._request(
+            "get_mosaic",
+            "GET",
+            f"/workspaces/{WORKSPACE}/coveragestores/{MOSAIC_STORE}.json",
+        )
+        if check_req.status_code == 200:
+            logger.info(f"Mosaic '{MOSAIC_STORE}' already exists")
+            return
+
+        mosaic_dir = self.store.local_path(MOSAIC_STORE)
+        os.makedirs(mosaic_dir, exist_ok=True)
+        with open(f"{mosaic_dir}/indexer.properties", "w") as indexer_file:
+            indexer_file.write(MOSAIC_INDEXER)
+        with open(f"{mosaic_dir}/task_idregex.properties", "w") as regex_file:
+            regex_file.write(MOSAIC_TASK_ID_REGEX)
+
+        create_req = self._request(
+            "create_mosaic",
+            "PUT",
+            f"/workspaces/{WORKSPACE}/coveragestores/{MOSAIC_STORE}/external.imagemosaic",
+            params={"configure": "none"},
+            headers={"Content-type": "text/plain"},
+            data=f"file://{self.store.geoserver_url(MOSAIC_STORE)}",
+        )
+        if create_req.status_code not in [200, 201]:
+            logger.error(f"Response: {create_req.text}")
+            raise Exception(f"Failed to create mosaic: {create_req.status_code}")
+        logger.info(f"Mosaic '{MOSAIC_STORE}' created successfully")
+
+    def _configure_mosaic_coverage_if_missing(self) -> None:
+        coverage_path = f"/workspaces/{WORKSPACE}/coveragestores/{MOSAIC_STORE}/coverages"
+        check_req = self._request("get_mosaic_coverage", "GET", f"{coverage_path}/{MOSAIC_STORE}.json")
+        if check_req.status_code != 200:
+            create_req = self._request(
+                "create_mosaic_coverage",
+                "POST",
+                coverage_path,
+                json={"coverage": {"name": MOSAIC_STORE, "nativeName": MOSAIC_STORE}},
+            )
+            if create_req.status_code != 201:
+                logger.error(f"Response: {create_req.text}")
+                raise Exception(f"Failed to configure mosaic coverage: {create_req.status_code}")
+            logger.info(f"Mosaic coverage '{MOSAIC_STORE}' configured successfully")
+
+        self._mosaic_coverage_ready = True
+
+    def list_task_ids(self) -> Set[str]:
+        """Task ids of all coverages currently published in GeoServer."""
+        if self.publish_mode == "mosaic":
+            req = self._request(
+                "list_granules",
+                "GET",
+                f"/workspaces/{WORKSPACE}/coveragestores/{MOSAIC_STORE}/coverages/{MOSAIC_STORE}/index/granules.json",
+            )
+            if req.status_code == 404:
+                return set()
+            if req.status_code != 200:
+                raise Exception(f"Failed to list granules: {req.status_code}")
+            return {
+                feature["properties"]["task_id"]
+                for feature in req.json().get("features", [])
+                if feature.get("properties", {}).get("task_id")
+            }
+
+        req = self._request(
+            "list_coverages", "GET", f"/workspaces/{WORKSPACE}/coveragestores.json"
+        )
+        if req.status_code != 200:
+            raise Exception(f"Failed to list coverage stores: {req.status_code}")
+        stores = req.json().get("coverageStores") or {}  # "" when there are none
+        return {
+            store["name"]
+            for store in stores.get("coverageStore", [])
+            if store["name"] != MOSAIC_STORE
+        }
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Per operation call count, error count and mean / max latency in milliseconds."""
+        with self._stats_lock:
+            return {
+                operation: {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "mean_ms": stats["total_s"] * 1000 / stats["count"],
+                    "max_ms": stats["max_s"] * 1000,
+                }
+                for operation, stats in self._stats.items()
+            }
+
+    def _request(self, operation: str, method: str, path: str, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(
+                method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs
+            )
+            # 404 is the expected answer of the existence checks
+            failed = response.status_code >= 400 and response.status_code != 404
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            self._record(operation, elapsed, failed)
+            logger.debug(f"GeoServer {operation} took {elapsed * 1000:.1f} ms")
+
+    def _record(self, operation: str, elapsed: float, failed: bool) -> None:
+        with self._stats_lock:
+            stats = self._stats.setdefault(
+                operation, {"count": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0}
+            )
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["total_s"] += elapsed
+            stats["max_s"] = max(stats["max_s"], elapsed)
+
+    def _create_workspace_if_missing(self) -> None:
+        check_req = self._request("get_workspace", "GET", f"/workspaces/{WORKSPACE}.json")
+        if check_req.status_code == 200:
+            logger.info(f"Workspace '{WORKSPACE}' already exists")
+            return
+
+        create_req = self._request(
+            "create_workspace",
+            "POST",
+            "/workspaces",
+            json={"workspace": {"name": WORKSPACE}},
+        )
+        if create_req.status_code != 201:
+            raise Exception(f"Failed to create workspace: {create_req.status_code}")
+        logger.info(f"Workspace '{WORKSPACE}' created successfully")
+
+    def _create_raster_style_if_missing(self) -> None:
+        """Create a default raster style in GeoServer if it doesn't exist."""
+        check_req = self._request("get_style", "GET", f"/styles/{RASTER_STYLE}.json")
+        if check_req.status_code == 200:
+            logger.info(f"Raster style '{RASTER_STYLE}' already exists")
+            return
+
+        create_req = self._request(
+            "create_style",
+            "POST",
+            "/styles",
             headers={"Content-Type": "application/vnd.ogc.sld+xml"},
-            params={"name": "raster-coverage"},
-            data=sld_body,
-            timeout=15,
+            params={"name": RASTER_STYLE},
+            data=RASTER_STYLE_SLD,
         )
-        
         if create_req.status_code != 201:
-            logger.error(f"Failed to create raster style: {create_req.status_code}")
             logger.error(f"Response: {create_req.text}")
+            raise Exception(f"Failed to create raster style: {create_req.status_code}")
+        logger.info(f"Raster style '{RASTER_STYLE}' created successfully")
+
+    def _assign_style_to_layer(self, task_id: str, style_name: str) -> None:
+        """Set the default style of a coverage layer, a partial layer update needs no GET first."""
+        # https://docs.geoserver.org/main/en/user/rest/api/layers.html
+        update_req = self._request(
+            "assign_style",
+            "PUT",
+            f"/layers/{WORKSPACE}:{task_id}",
+            headers={"Content-Type": "application/json"},
+            json={"layer": {"defaultStyle": {"name": style_name}}},
+        )
+
+        if update_req.status_code in [200, 201]:
+            logger.info(f"Style '{style_name}' assigned to coverage {task_id}")
         else:
-            logger.info("Raster style 'raster-coverage' created successfully")
-            
+            logger.error(f"Failed to assign style: {update_req.status_code}")
+            logger.error(f"Response: {update_req.text}")
+
+
+geoserver_client = GeoServerClient()
+
+# GeoServer purges run here while the rasters are deleted from disk
+_purge_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="geoserver-purge")
+
+
+def store_tiff_in_geoserver(
+    task_id: str, geotiff_data: bytes = None, signal_data: bytes = None
+):
+    """
+    Publish the coverage GeoTIFF of a task and return the WMS parameters showing it. Rasters
+    already in the result store (`geotiff_name` / `signal_raster_name`) are published as they
+    are, passed bytes are stored first.
+    """
+    try:
+        if geotiff_data is not None:
+            result_store.put(geotiff_name(task_id), geotiff_data)
+            logger.info(f"GeoTIFF saved as {geotiff_name(task_id)}")
+
+        if signal_data is not None:
+            result_store.put(signal_raster_name(task_id), signal_data)
+            logger.info(f"Signal raster saved as {signal_raster_name(task_id)}")
+
+        return geoserver_client.store_coverage(task_id)
     except Exception as e:
-        logger.error(f"Error creating raster style: {e}")
+        logger.error(
+            f"Unexpected error while storing GeoTIFF data for task {task_id}: {e}"
+        )
+        raise
 
 
-def _assign_style_to_coverage(task_id: str, style_name: str):
-    """Assign a default style to a coverage layer."""
+def load_signal_raster(task_id: str):
+    """Read the stored signal level (dBm) raster of a coverage, None if there is none."""
     try:
-        # Get current coverage metadata
-        get_req = requests.get(
-            f"http://geoserver:8080/geoserver/rest/workspaces/RF-SITE-PLANNER/coveragestores/{task_id}/coverages/{task_id}.json",
-            auth=(
-                getenv("GEOSERVER_ADMIN_USER"),
-                getenv("GEOSERVER_ADMIN_PASSWORD"),
-            ),
-            timeout=15,
-        )
-        
-        if get_req.status_code != 200:
-            logger.error(f"Failed to get coverage info: {get_req.status_code}")
-            return
-        
-        coverage_data = get_req.json()
-        
-        # Set default style
-        if "coverage" in coverage_data:
-            coverage_data["coverage"]["defaultStyle"] = {
-                "name": style_name,
-                "href": f"http://geoserver:8080/geoserver/rest/styles/{style_name}.json"
-            }
-            
-            # Update and commit
-            update_req = requests.put(
-                f"http://geoserver:8080/geoserver/rest/workspaces/RF-SITE-PLANNER/coveragestores/{task_id}/coverages/{task_id}.json",
-                auth=(
-                    getenv("GEOSERVER_ADMIN_USER"),
-                    getenv("GEOSERVER_ADMIN_PASSWORD"),
-                ),
-                headers={"Content-Type": "application/json"},
-                json=coverage_data,
-                timeout=15,
-            )
-            
-            if update_req.status_code in [200, 201]:
-                logger.info(f"Style '{style_name}' assigned to coverage {task_id}")
-            else:
-                logger.error(f"Failed to assign style: {update_req.status_code}")
-                logger.error(f"Response: {update_req.text}")
-        
+        return result_store.read(signal_raster_name(task_id))
+    except FileNotFoundError:
+        return None
+
+
+def signal_raster_pixels(task_id: str) -> Optional[int]:
+    """Pixel count of the stored signal level raster of a coverage, from its header only, None if there is none."""
+    try:
+        with rasterio.open(result_store.gdal_path(signal_raster_name(task_id))) as src:
+            return src.width * src.height
+    except RasterioIOError:
+        return None
+
+
+def remove_tiff_from_geoserver(task_id: str) -> int:
+    """
+    Unpublish a coverage and delete its rasters, returns the number of bytes freed in the
+    result store. The GeoServer purge and the raster deletes run concurrently, a failed purge
+    is raised once the rasters are deleted so the janitor keeps the coverage and retries.
+    """
+    purge = _purge_executor.submit(geoserver_client.remove_coverage, task_id)
+
+    reclaimed = 0
+    for name in (geotiff_name(task_id), signal_raster_name(task_id)):
+        try:
+            reclaimed += result_store.delete(name)
+        except Exception as e:
+            logger.error(f"Failed to remove {name}: {e}")
+
+    try:
+        purge.result()
     except Exception as e:
-        logger.error(f"Error assigning style to coverage: {e}")
+        logger.error(
+            f"Unexpected error while removing GeoTIFF data for task {task_id}: {e}"
+        )
+        raise
+    return reclaimed
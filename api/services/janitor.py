@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Set, Tuple
+
+from redis import StrictRedis
+from services.storage import ResultStore, result_store
+from services.tasks import TASK_TTL_S
+
+logger = logging.getLogger(__name__)
+
+# Published coverages live this long, the same as their task status in Redis
+COVERAGE_RETENTION_S = int(os.getenv("COVERAGE_RETENTION_S", "3600"))
+
+REGISTRY_KEY = "coverages:expiry"  # sorted set, task id -> expiry unix time
+LOCK_KEY = "coverages:janitor"
+
+TASK_ID_PATTERN = re.compile(
+    r"^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(\.signal)?\.geotiff$"
+)
+RESULT_BLOB_PATTERN = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.(result\.zst|profile\.\w+)$"
+)
+
+
+class CoverageJanitor:
+    """
+    Retention of published coverages.
+
+    Every published coverage is registered in a Redis sorted set scored by its expiry time.
+    `sweep()` removes expired coverages in batches of `batch_size`, at most `concurrency` at a
+    time, through `remove_coverage(task_id) -> bytes freed`. `find_orphans()` reconciles the
+    registry with the rasters in the result store and the coverages published in GeoServer:
+    unregistered rasters are adopted with an expiry based on their age, GeoServer coverages
+    without a raster are removed, and registry entries without either are dropped. Task result
+    blobs and profiles outliving their task (TASK_TTL_S) are deleted along the way.
+
+    A Redis lock makes sure only one API process sweeps at a time.
+    """
+
+    def __init__(
+        self,
+        redis_client: StrictRedis,
+        remove_coverage: Callable[[str], int],
+        list_published: Callable[[], Set[str]],
+        store: ResultStore = None,
+        retention_s: int = COVERAGE_RETENTION_S,
+        batch_size: int = 50,
+        concurrency: int = 4,
+        orphan_grace_s: int = 600,
+    ):
+        self.redis_client = redis_client
+        self.remove_coverage = remove_coverage
+        self.list_published = list_published
+        self.store = store or result_store
+        self.retention_s = retention_s
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.orphan_grace_s = orphan_grace_s
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "sweeps": 0,
+            "coverages_removed": 0,
+            "removal_errors": 0,
+            "bytes_reclaimed": 0,
+            "orphans_adopted": 0,
+            "orphans_removed": 0,
+            "registry_entries_dropped": 0,
+            "result_blobs_removed": 0,
+            "last_sweep_s": 0.0,
+        }
+
+    def register(self, task_id: str, retention_s: int = None) -> None:
+        expires_at = time.time() + (retention_s or self.retention_s)
+        self.redis_client.zadd(REGISTRY_KEY, {task_id: expires_at})
+
+    def unregister(self, task_id: str) -> None:
+        self.redis_client.zrem(REGISTRY_KEY, task_id)
+
+    def sweep(self) -> int:
+        """Remove every expired coverage, returns the number of bytes reclaimed."""
+        lock = self.redis_client.lock(LOCK_KEY, timeout=600, blocking=False)
+        if not lock.acquire():
+            logger.info("Another process is sweeping expired coverages.")
+            return 0
+
+        start = time.perf_counter()
+        removed = 0
+        reclaimed = 0
+        try:
+            with ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix="janitor"
+            ) as executor:
+                while True:
+                    expired = [
+                        task_id.decode("utf-8")
+                        for task_id in self.redis_client.zrangebyscore(
+                            REGISTRY_KEY, "-inf", time.time(), start=0, num=self.batch_size
+                        )
+                    ]
+                    if not expired:
+                        break
+
+                    batch_removed = []
+                    for task_id, freed in zip(
+                        expired, executor.map(self._remove, expired)
+                    ):
+                        if freed is None:
+                            continue
+                        batch_removed.append(task_id)
+                        reclaimed += freed
+
+                    if not batch_removed:
+                        # every removal in the batch failed, retry on the next sweep
+                        break
+                    self.redis_client.zrem(REGISTRY_KEY, *batch_removed)
+                    removed += len(batch_removed)
+        finally:
+            lock.release()
+
+        elapsed = time.perf_counter() - start
+        self._add_stats(
+            sweeps=1, coverages_removed=removed, bytes_reclaimed=reclaimed
+        )
+        with self._stats_lock:
+            self._stats["last_sweep_s"] = elapsed
+        if removed:
+            logger.info(
+                f"Removed {removed} expired coverages, reclaimed {reclaimed} bytes in {elapsed:.1f} s."
+            )
+        return reclaimed
+
+    def find_orphans(self) -> Dict[str, Set[str]]:
+        """Reconcile the registry with the store and GeoServer, returns the orphans found per kind."""
+        now = time.time()
+        registered = {
+            task_id.decode("utf-8")
+            for task_id in self.redis_client.zrange(REGISTRY_KEY, 0, -1)
+        }
+        on_disk, expired_results = self._scan_store(now)
+        published = self.list_published()
+
+        for name in expired_results:
+            reclaimed_result = self.store.delete(name)
+            self._add_stats(result_blobs_removed=1, bytes_reclaimed=reclaimed_result)
+
+        # rasters nobody will ever expire, e.g. from before the registry existed
+        unregistered = {
+            task_id
+            for task_id, mtime in on_disk.items()
+            if task_id not in registered and now - mtime > self.orphan_grace_s
+        }
+        for task_id in unregistered:
+            expires_at = max(on_disk[task_id] + self.retention_s, now)
+            self.redis_client.zadd(REGISTRY_KEY, {task_id: expires_at}, nx=True)
+
+        # published without a raster, GeoServer can't render these anyway
+        broken = published - set(on_disk) - registered
+        reclaimed = 0
+        for task_id in broken:
+            freed = self._remove(task_id)
+            reclaimed += freed or 0
+
+        stale = registered - set(on_disk) - published
+        if stale:
+            self.redis_client.zrem(REGISTRY_KEY, *stale)
+
+        self._add_stats(
+            orphans_adopted=len(unregistered),
+            orphans_removed=len(broken),
+            registry_entries_dropped=len(stale),
+            bytes_reclaimed=reclaimed,
+        )
+        if unregistered or broken or stale:
+            logger.info(
+                f"Orphans: {len(unregistered)} rasters adopted, {len(broken)} GeoServer coverages "
+                f"removed, {len(stale)} registry entries dropped."
+            )
+        return {"unregistered": unregistered, "broken": broken, "stale": stale}
+
+    async def run(self, interval_s: float, orphan_scan_interval_s: float) -> None:
+        """Sweep every `interval_s` and look for orphans every `orphan_scan_interval_s` until cancelled."""
+        last_orphan_scan = 0.0
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                if time.monotonic() - last_orphan_scan >= orphan_scan_interval_s:
+                    await asyncio.to_thread(self.find_orphans)
+                    last_orphan_scan = time.monotonic()
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"Coverage janitor failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _remove(self, task_id: str):
+        try:
+            return self.remove_coverage(task_id)
+        except Exception as e:
+            logger.error(f"Failed to remove expired coverage {task_id}: {e}")
+            self._add_stats(removal_errors=1)
+            return None
+
+    def _scan_store(self, now: float) -> Tuple[Dict[str, float], List[str]]:
+        """Task id -> newest modification time of its rasters, and the expired result blobs."""
+        task_ids = {}
+        expired_results = []
+        for info in self.store.list():
+            if RESULT_BLOB_PATTERN.match(info.name):
+                if now - info.mtime > TASK_TTL_S:
+                    expired_results.append(info.name)
+                continue
+            match = TASK_ID_PATTERN.match(info.name)
+            if match:
+                task_ids[match.group(1)] = max(info.mtime, task_ids.get(match.group(1), 0))
+        return task_ids, expired_results
+
+    def _add_stats(self, **increments) -> None:
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
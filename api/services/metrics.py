@@ -0,0 +1,210 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+JOB_LABELS = ("job_type", "resolution", "radius_bucket")
+
+# Upper bounds (km) of the coverage radius buckets, the API caps the radius at 300 km
+RADIUS_BUCKETS_KM = (10, 25, 50, 100, 300)
+
+# From a cached terrain tile lookup to a four minute 300 km HD coverage
+STAGE_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+JOB_STAGE_SECONDS = Histogram(
+    "splat_job_stage_seconds",
+    "Duration of one stage of a prediction job.",
+    JOB_LABELS + ("stage",),
+    buckets=STAGE_BUCKETS_S,
+)
+JOB_SECONDS = Histogram(
+    "splat_job_seconds",
+    "Duration of a whole prediction job, from the start of the worker to the stored result.",
+    JOB_LABELS,
+    buckets=STAGE_BUCKETS_S,
+)
+JOBS_QUEUED = Gauge("splat_jobs_queued", "Accepted jobs waiting for a worker.", ("job_type",))
+JOBS_RUNNING = Gauge("splat_jobs_running", "Jobs being processed.", ("job_type",))
+JOBS_REJECTED = Counter(
+    "splat_jobs_rejected_total",
+    "Jobs refused with 429, reason is queue_full or client_limit (too many jobs of the client in flight).",
+    ("job_type", "reason"),
+)
+CLIENT_JOBS = Counter(
+    "splat_client_jobs_total",
+    "Jobs accepted per client, clients without an API key or weight are counted as other.",
+    ("client", "job_type"),
+)
+CLIENT_JOB_SECONDS = Counter(
+    "splat_client_job_seconds_total",
+    "Worker time used by the jobs of a client, clients without an API key or weight are counted as other.",
+    ("client", "job_type"),
+)
+CLIENT_JOBS_IN_FLIGHT = Gauge(
+    "splat_client_jobs_in_flight", "Queued and running jobs of a client.", ("client",)
+)
+JOBS_COMPLETED = Counter("splat_jobs_completed_total", "Completed jobs.", JOB_LABELS)
+JOBS_FAILED = Counter(
+    "splat_jobs_failed_total",
+    "Failed jobs by the stage they failed in and the error raised there.",
+    JOB_LABELS + ("stage", "error"),
+)
+TERRAIN_TILE_CACHE = Counter(
+    "splat_terrain_tile_cache_total",
+    "Terrain tile lookups in the SPLAT! tile cache, result is hit or miss (downloaded).",
+    JOB_LABELS + ("result",),
+)
+XYZ_TILE_CACHE = Counter(
+    "coverage_tile_cache_total",
+    "Rendered XYZ coverage tile lookups, result is hit or miss (rendered).",
+    ("result",),
+)
+
+
+def resolution_label(high_resolution: bool) -> str:
+    return "30m" if high_resolution else "90m"
+
+
+def radius_bucket(radius_km: Optional[float]) -> str:
+    """Prometheus label of a coverage radius, "none" for jobs without one (LOS, restyle)."""
+    if radius_km is None:
+        return "none"
+    for upper_km in RADIUS_BUCKETS_KM:
+        if radius_km <= upper_km:
+            return f"le_{upper_km}km"
+    return f"gt_{RADIUS_BUCKETS_KM[-1]}km"
+
+
+class JobMetrics:
+    """
+    Prometheus instrumentation and timing breakdown of one prediction job.
+
+    `stage(name)` times a pipeline stage into `splat_job_stage_seconds`, and remembers the stage
+    and error type a job fails in so `failed()` can count it. Create it when the job is accepted
+    (`queued()`), then call `started()` in the worker and `completed()` or `failed()` at the end.
+
+    The same calls also collect the per task breakdown returned by `timings()`: wall clock start
+    and end of every stage, the SPLAT! child's rusage, terrain tiles used / downloaded and the
+    output raster sizes. That is a handful of dict writes per job, cheap enough to always keep.
+    """
+
+    def __init__(self, job_type: str, high_resolution: bool = False, radius_km: float = None):
+        self.job_type = job_type
+        self.labels = {
+            "job_type": job_type,
+            "resolution": resolution_label(high_resolution),
+            "radius_bucket": radius_bucket(radius_km),
+        }
+        self.failed_stage = None
+        self.error = None
+        self._queued = False
+        self._start = None
+        self._timestamps: Dict[str, float] = {}
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._details: Dict[str, Any] = {}
+        # set for jobs an admin asked to profile, see services.profiling
+        self.profile = None
+
+    def queued(self) -> "JobMetrics":
+        JOBS_QUEUED.labels(self.job_type).inc()
+        self._queued = True
+        self._timestamps["queued_at"] = time.time()
+        return self
+
+    def started(self) -> None:
+        if self._queued:
+            JOBS_QUEUED.labels(self.job_type).dec()
+            self._queued = False
+        JOBS_RUNNING.labels(self.job_type).inc()
+        self._start = time.perf_counter()
+        self._timestamps["started_at"] = time.time()
+
+    def completed(self) -> None:
+        self._finish()
+        JOBS_COMPLETED.labels(**self.labels).inc()
+
+    def failed(self, error: BaseException) -> None:
+        self._finish()
+        JOBS_FAILED.labels(
+            **self.labels,
+            stage=self.failed_stage or "unknown",
+            error=self.error or type(error).__name__,
+        ).inc()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            # the innermost stage is the one that failed, outer stages see the wrapped error
+            if self.failed_stage is None:
+                self.failed_stage = name
+                self.error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            JOB_STAGE_SECONDS.labels(**self.labels, stage=name).observe(elapsed)
+            self._stages[name] = {
+                "started_at": started_at,
+                "finished_at": started_at + elapsed,
+                "duration_s": elapsed,
+            }
+
+    def terrain_tiles(self, used: int, downloaded: int) -> None:
+        TERRAIN_TILE_CACHE.labels(**self.labels, result="hit").inc(used - downloaded)
+        TERRAIN_TILE_CACHE.labels(**self.labels, result="miss").inc(downloaded)
+        self._details["terrain_tiles"] = {"used": used, "downloaded": downloaded}
+
+    def splat_rusage(self, rusage) -> None:
+        """Resource usage of the SPLAT! child process, as returned by `os.wait4`."""
+        self._details["splat"] = {
+            "cpu_user_s": rusage.ru_utime,
+            "cpu_system_s": rusage.ru_stime,
+            "max_rss_kb": rusage.ru_maxrss,  # kB on Linux
+            "read_blocks": rusage.ru_inblock,  # 512 byte blocks
+            "write_blocks": rusage.ru_oublock,
+            "major_page_faults": rusage.ru_majflt,
+        }
+
+    def predicted_cost(self, cost) -> None:
+        """Memory and runtime the scheduler predicted for the job (services.cost_model.JobCost)."""
+        self._details["predicted"] = cost.as_dict()
+
+    def output_size(self, name: str, size: int) -> None:
+        self._details.setdefault("output_bytes", {})[name] = size
+
+    def api_process_peak_rss(self, peak_rss_kb: Optional[int]) -> None:
+        """Peak RSS of the whole API process so far, it includes every job running in it, not only this one."""
+        self._details["api_process_peak_rss_kb"] = peak_rss_kb
+
+    def timings(self) -> Dict[str, Any]:
+        """Breakdown of the job so far, stored with the task and returned by `GET /task/{task_id}`."""
+        timings = dict(self._timestamps)
+        if "started_at" in timings:
+            timings["finished_at"] = timings.get("finished_at", time.time())
+            timings["duration_s"] = timings["finished_at"] - timings["started_at"]
+            if "queued_at" in timings:
+                timings["queue_wait_s"] = timings["started_at"] - timings["queued_at"]
+        timings["stages"] = dict(self._stages)
+        timings.update(self._details)
+        if self.failed_stage:
+            timings["failed_stage"] = self.failed_stage
+        if self.profile is not None and self.profile.stored:
+            timings["profile"] = list(self.profile.stored)
+        return timings
+
+    def _finish(self) -> None:
+        self._timestamps["finished_at"] = time.time()
+        if self._queued:
+            JOBS_QUEUED.labels(self.job_type).dec()
+            self._queued = False
+        if self._start is not None:
+            JOBS_RUNNING.labels(self.job_type).dec()
+            JOB_SECONDS.labels(**self.labels).observe(time.perf_counter() - self._start)
+            self._start = None
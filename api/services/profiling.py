@@ -0,0 +1,166 @@
+import cProfile
+import json
+import logging
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from services.storage import ResultStore, profile_name
+
+logger = logging.getLogger(__name__)
+
+# One cProfile may be active per process on Python 3.12+, where it also records every thread. The job holding this
+# gets cProfile stats, jobs profiled meanwhile only their sampled stacks.
+_cprofile_lock = threading.Lock()
+
+PROFILE_ARTIFACTS = {
+    # artifact -> media type of the download
+    "pstats": "application/octet-stream",  # pstats.Stats / snakeviz input
+    "collapsed": "text/plain",  # flamegraph.pl / speedscope input
+    "splat": "application/json",  # SPLAT! command lines and output
+}
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the Python stack of one thread every `interval_s` and counts each distinct stack,
+    giving the collapsed stack format ("outer;inner;leaf count") flame graph tools read. Unlike
+    cProfile this keeps whole call paths, including time spent waiting on the SPLAT! child.
+    """
+
+    def __init__(self, thread_id: int, interval_s: float = 0.005):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class JobProfile:
+    """
+    Profile of one job: cProfile stats and sampled stacks of the worker thread while it runs
+    inside `running()`, plus every SPLAT! command line with its output (`record_splat`).
+    `store()` writes the artifacts to the result store next to the task's other results.
+    """
+
+    def __init__(self, sample_interval_s: float = 0.005):
+        self.sample_interval_s = sample_interval_s
+        self.profiler: Optional[cProfile.Profile] = None
+        self.sampler: Optional[StackSampler] = None
+        self.splat_runs: List[Dict] = []
+        self.stored: List[str] = []
+
+    @contextmanager
+    def running(self) -> Iterator[None]:
+        """
+        Profile the calling thread. The stack sampler only follows this thread. cProfile runs
+        for one job at a time and, on Python 3.12+, also records the calls of other threads
+        running meanwhile. Profiling errors are logged, they never fail the job.
+        """
+        try:
+            self.sampler = StackSampler(threading.get_ident(), self.sample_interval_s)
+            self.sampler.start()
+        except Exception as e:
+            logger.error(f"Could not start the stack sampler: {e}")
+            self.sampler = None
+
+        if _cprofile_lock.acquire(blocking=False):
+            try:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                self.profiler = profiler
+            except Exception as e:
+                # e.g. "Another profiling tool is already active" (a debugger or coverage run)
+                logger.warning(f"cProfile unavailable, only sampling stacks: {e}")
+                _cprofile_lock.release()
+        else:
+            logger.info("Another job is being profiled with cProfile, only sampling stacks.")
+
+        try:
+            yield
+        finally:
+            if self.profiler is not None:
+                try:
+                    self.profiler.disable()
+                except Exception as e:
+                    logger.error(f"Could not stop cProfile: {e}")
+                finally:
+                    _cprofile_lock.release()
+            if self.sampler is not None:
+                self.sampler.stop()
+
+    def record_splat(
+        self, command: List[str], returncode: int, stdout: str, stderr: str, duration_s: float
+    ) -> None:
+        self.splat_runs.append(
+            {
+                "command": [part for part in command if part],
+                "returncode": returncode,
+                "duration_s": duration_s,
+                "stdout": stdout,
+                "stderr": stderr,
+            }
+        )
+
+    def artifacts(self) -> Dict[str, bytes]:
+        artifacts = {
+            "collapsed": (self.sampler.collapsed() if self.sampler else "").encode("utf-8"),
+            "splat": json.dumps(self.splat_runs, indent=2).encode("utf-8"),
+        }
+        if self.profiler is not None:
+            self.profiler.create_stats()
+            # the format pstats.Stats(path) loads, see cProfile.Profile.dump_stats
+            artifacts["pstats"] = marshal.dumps(self.profiler.stats)
+        return artifacts
+
+    def store(self, task_id: str, store: ResultStore) -> List[str]:
+        for artifact, data in self.artifacts().items():
+            store.put(profile_name(task_id, artifact), data)
+            self.stored.append(artifact)
+        return self.stored
+
+
+@contextmanager
+def profiling(profile: Optional[JobProfile], task_id: str, store: ResultStore) -> Iterator[None]:
+    """
+    Run the block under `profile` and store its artifacts afterwards, also when the job fails,
+    that is often the run worth looking at. Does nothing without a profile.
+    """
+    if profile is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        with profile.running():
+            yield
+    finally:
+        try:
+            profile.store(task_id, store)
+            logger.info(
+                f"Stored profile of task {task_id} ({time.perf_counter() - start:.1f} s profiled)."
+            )
+        except Exception as e:
+            logger.error(f"Failed to store profile of task {task_id}: {e}")
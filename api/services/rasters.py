@@ -0,0 +1,101 @@
+import os
+from typing import Optional
+
+import numpy as np
+import rasterio
+from rasterio.enums import ColorInterp
+from rasterio.io import MemoryFile
+
+# GeoTIFF output layout: "cog" (internal tiles + overviews) or "gtiff" (stripped, no overviews)
+GEOTIFF_FORMAT = os.getenv("GEOTIFF_FORMAT", "cog")
+GEOTIFF_COMPRESS = os.getenv("GEOTIFF_COMPRESS", "deflate")  # deflate, zstd or lzw
+GEOTIFF_BLOCKSIZE = int(os.getenv("GEOTIFF_BLOCKSIZE", "256"))  # 256 or 512
+
+
+def write_geotiff(dst_path: Optional[str], profile: dict, fill) -> Optional[bytes]:
+    """
+    Create a GeoTIFF with `profile` and let `fill(dataset)` write its content.
+    Written atomically to `dst_path` when given, otherwise returned as bytes.
+    """
+    if dst_path is None:
+        with MemoryFile() as memfile:
+            with memfile.open(**profile) as dst:
+                fill(dst)
+            return memfile.read()
+
+    part_path = f"{dst_path}.part"
+    try:
+        with rasterio.open(part_path, "w", **profile) as dst:
+            fill(dst)
+        os.replace(part_path, dst_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return None
+
+
+def geotiff_profile(geotiff_format: str = None, palette: bool = False) -> dict:
+    """
+    Rasterio creation options for coverage GeoTIFFs. "cog" writes a Cloud Optimized
+    GeoTIFF with internal tiles and a nearest-neighbour overview pyramid, so GeoServer
+    only decodes the tiles and overview level a WMS request needs. "gtiff" keeps the
+    legacy stripped layout.
+    """
+    geotiff_format = geotiff_format or GEOTIFF_FORMAT
+
+    if geotiff_format == "gtiff":
+        if palette:
+            return {"driver": "GTiff", "photometric": "palette", "compress": "lzw"}
+        return {"driver": "GTiff", "compress": "deflate", "predictor": 2}
+
+    if geotiff_format != "cog":
+        raise ValueError(f"Unsupported GeoTIFF format '{geotiff_format}'.")
+
+    return {
+        "driver": "COG",
+        "blocksize": GEOTIFF_BLOCKSIZE,
+        "compress": GEOTIFF_COMPRESS,
+        "predictor": 2,  # horizontal differencing, integer bands only
+        "overview_resampling": "nearest",  # palette indices must not be blended
+        "num_threads": "ALL_CPUS",
+    }
+
+
+def palette_to_rgba_geotiff(src_path: str, dst_path: str = None) -> Optional[bytes]:
+    """
+    Expand a palette coverage GeoTIFF into an RGBA one with NoData as alpha 0. Granules of one
+    ImageMosaic must share a colour model, while every coverage carries its own palette.
+    """
+    with rasterio.open(src_path) as src:
+        index = src.read(1)
+        lut = np.zeros((256, 4), dtype=np.uint8)
+        for i, rgba in src.colormap(1).items():
+            lut[i] = rgba
+        if src.nodata is not None:
+            lut[int(src.nodata)] = (0, 0, 0, 0)
+        crs, transform = src.crs, src.transform
+
+    rgba = np.moveaxis(lut[index], -1, 0)
+
+    def fill(dst):
+        dst.write(rgba)
+        dst.colorinterp = [
+            ColorInterp.red,
+            ColorInterp.green,
+            ColorInterp.blue,
+            ColorInterp.alpha,
+        ]
+
+    return write_geotiff(
+        dst_path,
+        dict(
+            height=index.shape[0],
+            width=index.shape[1],
+            count=4,
+            dtype="uint8",
+            crs=crs,
+            transform=transform,
+            **geotiff_profile(),
+        ),
+        fill,
+    )
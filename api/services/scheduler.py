@@ -0,0 +1,362 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional
+
+from services.metrics import CLIENT_JOB_SECONDS, CLIENT_JOBS, CLIENT_JOBS_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+# Completions the drain rate of a job type is estimated from
+DRAIN_WINDOW = 50
+# Retry-After bounds in seconds, and the guess before any job of a type finished
+RETRY_AFTER_MIN_S = 1
+RETRY_AFTER_MAX_S = 600
+RETRY_AFTER_DEFAULT_S = 30
+# Seconds after which a job waiting for memory isn't overtaken by smaller jobs any more
+MEMORY_STARVATION_S = 60
+
+# Queued and running jobs one client may have, more are refused with 429
+SCHEDULER_CLIENT_MAX_IN_FLIGHT = int(os.getenv("SCHEDULER_CLIENT_MAX_IN_FLIGHT", "50"))
+# Fair share weights of clients, e.g. "ip:10.0.0.5=4,key:analyze=2", every other client has weight 1
+SCHEDULER_CLIENT_WEIGHTS = os.getenv("SCHEDULER_CLIENT_WEIGHTS", "")
+# Named API keys, "name=key,name=key", a request sending one as X-API-Key is scheduled as client "key:<name>"
+SCHEDULER_API_KEYS = os.getenv("SCHEDULER_API_KEYS", "")
+# Shortest service time a job is charged to its client, so jobs predicted to be instant aren't free
+MIN_JOB_COST_S = 0.1
+
+
+@dataclass
+class JobTypeLimits:
+    """Concurrent workers and the most jobs allowed to wait for one, per job type."""
+
+    workers: int
+    queue_limit: int
+
+
+def limits_from_env(job_type: str, workers: int, queue_limit: int) -> JobTypeLimits:
+    prefix = f"SCHEDULER_{job_type.upper()}"
+    return JobTypeLimits(
+        workers=int(os.getenv(f"{prefix}_WORKERS", str(workers))),
+        queue_limit=int(os.getenv(f"{prefix}_QUEUE_LIMIT", str(queue_limit))),
+    )
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for part in value.split(","):
+        if part.strip():
+            name, item = part.split("=", 1)
+            pairs[name.strip()] = item.strip()
+    return pairs
+
+
+def parse_client_weights(value: str) -> Dict[str, float]:
+    """Client weights of a "client=weight,client=weight" string."""
+    return {client: float(weight) for client, weight in _parse_pairs(value).items()}
+
+
+def parse_api_keys(value: str) -> Dict[str, str]:
+    """Client id of every API key of a "name=key,name=key" string."""
+    return {key: f"key:{name}" for name, key in _parse_pairs(value).items()}
+
+
+class QueueFullError(Exception):
+    """A job was refused because the queue of its type is full, retry after `retry_after_s`."""
+
+    reason = "queue_full"
+
+    def __init__(self, job_type: str, message: str, retry_after_s: int):
+        super().__init__(message)
+        self.job_type = job_type
+        self.retry_after_s = retry_after_s
+
+
+class ClientLimitError(QueueFullError):
+    """A job was refused because its client already has the most jobs in flight it may have."""
+
+    reason = "client_limit"
+
+
+@dataclass
+class ScheduledJob:
+    job_type: str
+    client: str
+    run: Callable[..., Any]
+    args: tuple
+    memory_mb: float = 0
+    # virtual times of the client's fair share the job starts and finishes at
+    start_tag: float = 0
+    finish_tag: float = 0
+    submitted_at: float = field(default_factory=time.monotonic)
+
+
+class JobScheduler:
+    """
+    Runs prediction jobs on a fixed set of worker threads with admission control.
+
+    Every job type has its own number of workers and a queue limit. `admit()` refuses a job with QueueFullError once
+    the limit of waiting jobs is reached, with a retry delay estimated from how fast the queue has been draining (the
+    last DRAIN_WINDOW completions), so clients back off instead of piling up tasks that time out. Admitted jobs are
+    queued with `submit()` once their task exists, jobs admitted at the same time may overshoot the limit by a few.
+    `capacity()` reports the same numbers for clients adapting their concurrency. Limits hold per API process.
+
+    Within a job type, clients (an API key or address, see `_client_id` in main) share the workers by weighted fair
+    queuing: every job is tagged with the virtual time its client's share of the workers would finish it at, from its
+    predicted runtime divided by the client's weight, and the job with the earliest tag runs first. A client
+    submitting 80 jobs at once then waits behind its own jobs, not everyone else. No client may have more than
+    `client_max_in_flight` jobs queued or running, `admit()` refuses more with ClientLimitError.
+
+    Workers are shared between the job types and pick the next job in `_next_job()`, which starts the oldest next job
+    of a type with a free worker slot whose predicted memory fits in what is left of `memory_budget_mb` (see
+    services.cost_model). A job that doesn't fit is overtaken by smaller ones for up to MEMORY_STARVATION_S, then the
+    memory freed is kept for it. A job larger than the whole budget runs once nothing else does.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, JobTypeLimits],
+        memory_budget_mb: float = None,
+        client_weights: Dict[str, float] = None,
+        client_max_in_flight: int = None,
+    ):
+        self.limits = limits
+        self.memory_budget_mb = memory_budget_mb
+        self.client_weights = (
+            client_weights if client_weights is not None else parse_client_weights(SCHEDULER_CLIENT_WEIGHTS)
+        )
+        self.client_max_in_flight = client_max_in_flight or SCHEDULER_CLIENT_MAX_IN_FLIGHT
+        # clients with their own usage counters, the rest are counted together as "other"
+        self._named_clients = set(self.client_weights) | set(parse_api_keys(SCHEDULER_API_KEYS).values())
+        self._reserved_mb = 0.0
+        self._condition = threading.Condition()
+        # job type -> client -> the client's waiting jobs, in the order they were submitted
+        self._queues: Dict[str, Dict[str, Deque[ScheduledJob]]] = {job_type: {} for job_type in limits}
+        self._queued: Dict[str, int] = {job_type: 0 for job_type in limits}
+        self._running: Dict[str, int] = {job_type: 0 for job_type in limits}
+        # fair queuing state per job type: virtual time and the finish tag of each client's last job
+        self._virtual_time: Dict[str, float] = {job_type: 0.0 for job_type in limits}
+        self._finish_tags: Dict[str, Dict[str, float]] = {job_type: {} for job_type in limits}
+        self._client_in_flight: Dict[str, int] = {}
+        self._completions: Dict[str, Deque[float]] = {
+            job_type: deque(maxlen=DRAIN_WINDOW) for job_type in limits
+        }
+        self._durations: Dict[str, Optional[float]] = {job_type: None for job_type in limits}
+        self._threads = []
+        self._stopping = False
+
+    def start(self) -> None:
+        with self._condition:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(sum(limit.workers for limit in self.limits.values())):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop the workers once their current job is done, waiting jobs are dropped."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def admit(self, job_type: str, client: str) -> None:
+        """
+        Raises QueueFullError when too many jobs of `job_type` are waiting to accept another one, ClientLimitError
+        when `client` has too many jobs in flight.
+        """
+        with self._condition:
+            queued = self._queued[job_type]
+            if queued >= self.limits[job_type].queue_limit:
+                raise QueueFullError(
+                    job_type, f"The {job_type} queue is full ({queued} jobs waiting).", self._retry_after(job_type)
+                )
+            in_flight = self._client_in_flight.get(client, 0)
+            if in_flight >= self.client_max_in_flight:
+                raise ClientLimitError(
+                    job_type,
+                    f"Too many jobs in flight ({in_flight}), wait for some to finish.",
+                    self._retry_after(job_type),
+                )
+
+    def submit(
+        self,
+        job_type: str,
+        client: str,
+        run: Callable[..., Any],
+        *args,
+        memory_mb: float = 0,
+        runtime_s: float = 0,
+    ) -> None:
+        """
+        Queue `run(*args)` of `client` for the next free worker of `job_type` with `memory_mb` of the budget left,
+        charging the predicted `runtime_s` to the client's fair share. An admitted job is always queued.
+        """
+        with self._condition:
+            job = ScheduledJob(job_type, client, run, args, memory_mb)
+            job.start_tag = max(self._virtual_time[job_type], self._finish_tags[job_type].get(client, 0.0))
+            job.finish_tag = job.start_tag + max(runtime_s, MIN_JOB_COST_S) / self.client_weights.get(client, 1.0)
+            self._finish_tags[job_type][client] = job.finish_tag
+            self._queues[job_type].setdefault(client, deque()).append(job)
+            self._queued[job_type] += 1
+
+            self._client_in_flight[client] = self._client_in_flight.get(client, 0) + 1
+            CLIENT_JOBS.labels(self._usage_label(client), job_type).inc()
+            CLIENT_JOBS_IN_FLIGHT.labels(client).inc()
+            self._condition.notify()
+
+    def capacity(self, client: str = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Per job type: workers, running and queued jobs, the queue limit and how fast the queue drains. Under "memory"
+        the budget and the predicted memory of the running jobs, under "client" the jobs `client` has in flight.
+        """
+        with self._condition:
+            capacity: Dict[str, Dict[str, Any]] = {
+                "memory": {"budget_mb": self.memory_budget_mb, "reserved_mb": round(self._reserved_mb, 1)}
+            }
+            if client is not None:
+                capacity["client"] = {
+                    "id": client,
+                    "weight": self.client_weights.get(client, 1.0),
+                    "in_flight": self._client_in_flight.get(client, 0),
+                    "max_in_flight": self.client_max_in_flight,
+                }
+            for job_type, limits in self.limits.items():
+                queued = self._queued[job_type]
+                drain_rate = self._drain_rate(job_type)
+                capacity[job_type] = {
+                    "workers": limits.workers,
+                    "running": self._running[job_type],
+                    "queued": queued,
+                    "queue_limit": limits.queue_limit,
+                    "clients": len(self._queues[job_type]),
+                    "accepting": queued < limits.queue_limit,
+                    "drain_rate_per_s": drain_rate,
+                    "estimated_wait_s": self._estimated_wait(job_type, queued),
+                }
+            return capacity
+
+    def estimated_wait_s(self, job_type: str) -> float:
+        """Seconds a job of `job_type` submitted now likely waits for a worker, 0 without a guess."""
+        with self._condition:
+            return self._estimated_wait(job_type, self._queued[job_type]) or 0.0
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    if self._stopping:
+                        return
+                    self._condition.wait()
+                    job = self._next_job()
+                self._running[job.job_type] += 1
+                self._reserved_mb += job.memory_mb
+
+            start = time.monotonic()
+            try:
+                job.run(*job.args)
+            except Exception as e:
+                # the job has already recorded its failure in the task
+                logger.debug(f"{job.job_type} job failed: {e}")
+            finally:
+                duration_s = time.monotonic() - start
+                CLIENT_JOB_SECONDS.labels(self._usage_label(job.client), job.job_type).inc(duration_s)
+                with self._condition:
+                    self._running[job.job_type] -= 1
+                    self._reserved_mb -= job.memory_mb
+                    self._client_finished(job.client)
+                    self._record_completion(job.job_type, duration_s)
+                    self._condition.notify_all()
+
+    def _next_job(self) -> Optional[ScheduledJob]:
+        """
+        Of the next job of every job type with a free worker slot, the oldest one with enough memory, called with
+        the lock held.
+        """
+        candidates = sorted(
+            (
+                min((queue[0] for queue in queues.values()), key=lambda head: head.finish_tag)
+                for job_type, queues in self._queues.items()
+                if queues and self._running[job_type] < self.limits[job_type].workers
+            ),
+            key=lambda candidate: candidate.submitted_at,
+        )
+        now = time.monotonic()
+        for job in candidates:
+            if self._fits_memory(job):
+                self._dequeue(job)
+                return job
+            if now - job.submitted_at >= MEMORY_STARVATION_S:
+                return None
+        return None
+
+    def _dequeue(self, job: ScheduledJob) -> None:
+        queues = self._queues[job.job_type]
+        queues[job.client].popleft()
+        if not queues[job.client]:
+            del queues[job.client]
+        self._queued[job.job_type] -= 1
+
+        # virtual time moves to the start of the job being served, clients whose last job is behind it are idle
+        # and start from the virtual time again when they submit
+        virtual_time = max(self._virtual_time[job.job_type], job.start_tag)
+        self._virtual_time[job.job_type] = virtual_time
+        finish_tags = self._finish_tags[job.job_type]
+        for client in [client for client, tag in finish_tags.items() if tag <= virtual_time]:
+            del finish_tags[client]
+
+    def _usage_label(self, client: str) -> str:
+        """Client label of the usage counters, which keep their series forever: named clients or "other"."""
+        return client if client in self._named_clients else "other"
+
+    def _client_finished(self, client: str) -> None:
+        self._client_in_flight[client] -= 1
+        if self._client_in_flight[client]:
+            CLIENT_JOBS_IN_FLIGHT.labels(client).dec()
+        else:
+            # a series only while the client has jobs in flight
+            del self._client_in_flight[client]
+            CLIENT_JOBS_IN_FLIGHT.remove(client)
+
+    def _fits_memory(self, job: ScheduledJob) -> bool:
+        if self.memory_budget_mb is None or not any(self._running.values()):
+            return True
+        return self._reserved_mb + job.memory_mb <= self.memory_budget_mb
+
+    def _record_completion(self, job_type: str, duration_s: float) -> None:
+        self._completions[job_type].append(time.monotonic())
+        previous = self._durations[job_type]
+        self._durations[job_type] = duration_s if previous is None else 0.8 * previous + 0.2 * duration_s
+
+    def _drain_rate(self, job_type: str) -> Optional[float]:
+        """Completed jobs per second over the recent completions, None without enough of them."""
+        completions = self._completions[job_type]
+        if len(completions) < 2:
+            return None
+        # the time since the last completion counts too, a stalled queue drains at a falling rate
+        span = time.monotonic() - completions[0]
+        return (len(completions) - 1) / span if span > 0 else None
+
+    def _estimated_wait(self, job_type: str, queued: int) -> Optional[float]:
+        drain_rate = self._drain_rate(job_type)
+        if drain_rate:
+            return queued / drain_rate
+        if self._durations[job_type] is not None:
+            return math.ceil(queued / self.limits[job_type].workers) * self._durations[job_type]
+        return None
+
+    def _retry_after(self, job_type: str) -> int:
+        """Seconds until a slot in the queue is likely free again: one drained job, or a fresh guess."""
+        estimated_wait = self._estimated_wait(job_type, 1)
+        if estimated_wait is None:
+            return RETRY_AFTER_DEFAULT_S
+        return int(min(RETRY_AFTER_MAX_S, max(RETRY_AFTER_MIN_S, math.ceil(estimated_wait))))
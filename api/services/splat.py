@@ -6,22 +6,41 @@ import os
 import shutil
 import subprocess
 import tempfile
+import time
+import warnings
 import xml.etree.ElementTree as ET
 from json import dumps
-from typing import List, Literal, Tuple
+from typing import Dict, List, Literal, Optional, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
 import rasterio
 import requests
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from models.CoveragePredictionRequest import CoveragePredictionRequest
 from models.LosPredictionRequest import LosPredictionRequest
 from PIL import Image
+from rasterio.enums import Resampling
 from rasterio.transform import from_bounds
+from rasterio.warp import calculate_default_transform, reproject
+from services.metrics import JobMetrics
+from services.rasters import geotiff_profile, write_geotiff
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# NoData value of the int16 signal level (dBm) raster
+SIGNAL_NODATA = -32768
+
+# CRS of the published (palette) coverage GeoTIFF. "EPSG:3857" warps it once at publish time
+# so GeoServer and the tile endpoint don't reproject on every map tile. The signal raster
+# always stays in the native SPLAT! grid (EPSG:4326) so restyling remains lossless.
+COVERAGE_OUTPUT_CRS = os.getenv("COVERAGE_OUTPUT_CRS", "EPSG:4326")
+
+# Copy every SPLAT! working file to /var/app/geoserver_data/tmp for debugging
+SPLAT_DEBUG_ARTIFACTS = os.getenv("SPLAT_DEBUG_ARTIFACTS", "false").lower() == "true"
+
 
 class Splat:
     def __init__(
@@ -85,246 +104,256 @@ class Splat:
 
         self.terrain_base_url = terrain_base_url
 
-    def los_prediction(self, request: LosPredictionRequest) -> bytes:
+    def los_prediction(self, request: LosPredictionRequest, job: JobMetrics = None) -> bytes:
         logger.debug(f"LOS prediction request: {request.json()}")
+        job = job or JobMetrics("los", request.high_resolution)
 
         with tempfile.TemporaryDirectory() as tmpdir:
             try:
                 logger.debug(f"Temporary directory created: {tmpdir}")
 
-                self._copy_antenna_pattern_files(request.tx_gain, tmpdir, "tx")
-                self._copy_antenna_pattern_files(request.rx_gain, tmpdir, "rx")
-
-                # request.tx_gain = 0
-                # request.rx_gain = 0
-
-                request.tx_gain = request.tx_gain - 2.15 if request.tx_gain != 0 else 0
-                request.rx_gain = request.rx_gain - 2.15 if request.rx_gain != 0 else 0
-
                 # determine the required terrain tiles
-                required_tiles = Splat._calculate_required_terrain_tiles_los(
-                    request.tx_lat,
-                    request.tx_lon,
-                    request.rx_lat,
-                    request.rx_lon,
-                )
-
-                self._download_terrain_tile(required_tiles, request.high_resolution)
-
-                # write transmitter qth file
-                with open(os.path.join(tmpdir, "tx.qth"), "wb") as qth_file:
-                    qth_file.write(
-                        Splat._create_splat_qth(
-                            "tx",
-                            request.tx_lat,
-                            request.tx_lon,
-                            request.tx_height,
-                        )
+                with job.stage("tile_resolution"):
+                    required_tiles = Splat._calculate_required_terrain_tiles_los(
+                        request.tx_lat,
+                        request.tx_lon,
+                        request.rx_lat,
+                        request.rx_lon,
                     )
 
-                # write reciver qth file
-                with open(os.path.join(tmpdir, "rx.qth"), "wb") as qth_file:
-                    qth_file.write(
-                        Splat._create_splat_qth(
-                            "rx",
-                            request.rx_lat,
-                            request.rx_lon,
-                            request.rx_height,
-                        )
+                with job.stage("tile_download"):
+                    downloaded = self._download_terrain_tile(
+                        required_tiles, request.high_resolution
                     )
-
-                # write model parameter / lrp file
-                with open(os.path.join(tmpdir, "splat.lrp"), "wb") as lrp_file:
-                    logger.debug(request.tx_power)
-                    lrp_file.write(
-                        Splat._create_splat_lrp(
-                            ground_dielectric=request.ground_dielectric,
-                            ground_conductivity=request.ground_conductivity,
-                            atmosphere_bending=request.atmosphere_bending,
-                            frequency_mhz=request.frequency_mhz,
-                            radio_climate=request.radio_climate,
-                            polarization=request.polarization,
-                            situation_fraction=request.situation_fraction,
-                            time_fraction=request.time_fraction,
-                            tx_power=request.tx_power,
-                            tx_gain=request.tx_gain,
-                            tx_loss=request.tx_loss,
+                job.terrain_tiles(len(required_tiles), downloaded)
+
+                with job.stage("input_files"):
+                    self._copy_antenna_pattern_files(request.tx_gain, tmpdir, "tx")
+                    self._copy_antenna_pattern_files(request.rx_gain, tmpdir, "rx")
+
+                    # request.tx_gain = 0
+                    # request.rx_gain = 0
+
+                    request.tx_gain = request.tx_gain - 2.15 if request.tx_gain != 0 else 0
+                    request.rx_gain = request.rx_gain - 2.15 if request.rx_gain != 0 else 0
+
+                    # write transmitter qth file
+                    with open(os.path.join(tmpdir, "tx.qth"), "wb") as qth_file:
+                        qth_file.write(
+                            Splat._create_splat_qth(
+                                "tx",
+                                request.tx_lat,
+                                request.tx_lon,
+                                request.tx_height,
+                            )
                         )
-                    )
-
-                splat_command = [
-                    (
-                        self.splat_hd_binary
-                        if request.high_resolution
-                        else self.splat_binary
-                    ),
-                    "-t",
-                    "tx.qth",
-                    "-r",
-                    "rx.qth",
-                    # "-L",
-                    # str(request.rx_height),
-                    "-gc",
-                    str(request.clutter_height),
-                    "-d",
-                    self.tile_cache,
-                    "-f",
-                    f"{request.frequency_mhz}M",
-                    # "-p",
-                    # "terrain_profile_graph.png",
-                    # "-e",
-                    # "terrain_elevation_graph.png",
-                    # "-h",
-                    # "terrain_height_graph.png",
-                    "-H",
-                    "normalized_terrain_height_graph.png",
-                    # "-l",
-                    # "path_loss_graph.png",
-                    # "-o",
-                    # "topo_map.ppm",
-                    # "-kml",
-                    "-gpsav",
-                    "-metric",
-                    "-olditm" if request.itm_mode else "",
-                ]
-                logger.debug(f"Executing SPLAT! command: {' '.join(splat_command)}")
-
-                splat_result = subprocess.run(
-                    splat_command,
-                    cwd=tmpdir,
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                )
 
-                logger.debug(f"SPLAT! stdout:\n{splat_result.stdout}")
-                logger.debug(f"SPLAT! stderr:\n{splat_result.stderr}")
-
-                if splat_result.returncode != 0:
-                    logger.error(
-                        f"SPLAT! execution failed with return code {splat_result.returncode}"
-                    )
-                    raise RuntimeError(
-                        f"SPLAT! execution failed with return code {splat_result.returncode}\n"
-                        f"Stdout: {splat_result.stdout}\nStderr: {splat_result.stderr}"
-                    )
-
-                logger.info("SPLAT! coverage prediction completed successfully.")
-
-                # self._save_all_files_from_tmpdir(tmpdir)
+                    # write reciver qth file
+                    with open(os.path.join(tmpdir, "rx.qth"), "wb") as qth_file:
+                        qth_file.write(
+                            Splat._create_splat_qth(
+                                "rx",
+                                request.rx_lat,
+                                request.rx_lon,
+                                request.rx_height,
+                            )
+                        )
 
-                files = {
-                    "profile": "profile.gp",
-                    "curvature": "curvature.gp",
-                    "fresnel": "fresnel.gp",
-                    "fresnel_pt_6": "fresnel_pt_6.gp",
-                    "reference": "reference.gp",
-                    "tx_to_rx": "tx-to-rx.txt",
-                }
+                    # write model parameter / lrp file
+                    with open(os.path.join(tmpdir, "splat.lrp"), "wb") as lrp_file:
+                        logger.debug(request.tx_power)
+                        lrp_file.write(
+                            Splat._create_splat_lrp(
+                                ground_dielectric=request.ground_dielectric,
+                                ground_conductivity=request.ground_conductivity,
+                                atmosphere_bending=request.atmosphere_bending,
+                                frequency_mhz=request.frequency_mhz,
+                                radio_climate=request.radio_climate,
+                                polarization=request.polarization,
+                                situation_fraction=request.situation_fraction,
+                                time_fraction=request.time_fraction,
+                                tx_power=request.tx_power,
+                                tx_gain=request.tx_gain,
+                                tx_loss=request.tx_loss,
+                            )
+                        )
 
-                data = {
-                    k: self._read_bytes(os.path.join(tmpdir, v))
-                    for k, v in files.items()
-                }
+                with job.stage("splat_run"):
+                    splat_command = [
+                        (
+                            self.splat_hd_binary
+                            if request.high_resolution
+                            else self.splat_binary
+                        ),
+                        "-t",
+                        "tx.qth",
+                        "-r",
+                        "rx.qth",
+                        # "-L",
+                        # str(request.rx_height),
+                        "-gc",
+                        str(request.clutter_height),
+                        "-d",
+                        self.tile_cache,
+                        "-f",
+                        f"{request.frequency_mhz}M",
+                        # "-p",
+                        # "terrain_profile_graph.png",
+                        # "-e",
+                        # "terrain_elevation_graph.png",
+                        # "-h",
+                        # "terrain_height_graph.png",
+                        "-H",
+                        "normalized_terrain_height_graph.png",
+                        # "-l",
+                        # "path_loss_graph.png",
+                        # "-o",
+                        # "topo_map.ppm",
+                        # "-kml",
+                        "-gpsav",
+                        "-metric",
+                        "-olditm" if request.itm_mode else "",
+                    ]
+                    logger.debug(f"Executing SPLAT! command: {' '.join(splat_command)}")
 
-                profile_lines = self._decode_lines(data["profile"])
-                curvature_lines = self._decode_lines(data["curvature"])
-                fresnel_lines = self._decode_lines(data["fresnel"])
-                fresnel_pt_6_lines = self._decode_lines(data["fresnel_pt_6"])
-                reference_lines = self._decode_lines(data["reference"])
+                    splat_result = Splat._run_splat(splat_command, tmpdir, job)
 
-                distance, profile = self._parse_gp_xy_lines(
-                    profile_lines, logger=logger, label="profile.gp"
-                )
-                _, curvature = self._parse_gp_xy_lines(
-                    curvature_lines, logger=logger, label="curvature.gp"
-                )
-                _, fresnel = self._parse_gp_xy_lines(
-                    fresnel_lines, logger=logger, label="fresnel.gp"
-                )
-                _, fresnel_pt_6 = self._parse_gp_xy_lines(
-                    fresnel_pt_6_lines, logger=logger, label="fresnel_pt_6.gp"
-                )
-                _, reference = self._parse_gp_xy_lines(
-                    reference_lines, logger=logger, label="reference.gp"
-                )
+                    logger.debug(f"SPLAT! stdout:\n{splat_result.stdout}")
+                    logger.debug(f"SPLAT! stderr:\n{splat_result.stderr}")
 
-                report = self._parse_tx_to_rx_report(data["tx_to_rx"])
+                    if splat_result.returncode != 0:
+                        logger.error(
+                            f"SPLAT! execution failed with return code {splat_result.returncode}"
+                        )
+                        raise RuntimeError(
+                            f"SPLAT! execution failed with return code {splat_result.returncode}\n"
+                            f"Stdout: {splat_result.stdout}\nStderr: {splat_result.stderr}"
+                        )
 
-                sig = report["signal_power_level_at_rx"]
-                fspl = report["free_space_path_loss"]
-                lr_loss = report["lr_loss"]
+                with job.stage("output_parsing"):
+                    logger.info("SPLAT! coverage prediction completed successfully.")
 
-                rx_signal_power = None
-                path_loss_rssi = None
-                lr_it_loss_rssi = None
+                    # self._save_all_files_from_tmpdir(tmpdir)
 
-                if sig is not None:
-                    rx_signal_power = sig + request.rx_gain - request.rx_loss
-                    rx_signal_power_optimized = (
-                        rx_signal_power
-                        if not report["path_obstruction"]
-                        else rx_signal_power + (1.651 * (report["distance"]))
-                    )
+                    files = {
+                        "profile": "profile.gp",
+                        "curvature": "curvature.gp",
+                        "fresnel": "fresnel.gp",
+                        "fresnel_pt_6": "fresnel_pt_6.gp",
+                        "reference": "reference.gp",
+                        "tx_to_rx": "tx-to-rx.txt",
+                    }
 
-                if fspl is not None:
-                    path_loss_rssi = (
-                        request.tx_power
-                        + request.tx_gain
-                        - request.tx_loss
-                        - fspl
-                        + request.rx_gain
-                        - request.rx_loss
-                    )
+                    data = {
+                        k: self._read_bytes(os.path.join(tmpdir, v))
+                        for k, v in files.items()
+                    }
 
-                if lr_loss is not None:
-                    lr_it_loss_rssi = (
-                        request.tx_power
-                        + request.tx_gain
-                        - request.tx_loss
-                        - lr_loss
-                        + request.rx_gain
-                        - request.rx_loss
+                    distance, profile = self._parse_gp_xy(data["profile"], label="profile.gp")
+                    _, curvature = self._parse_gp_xy(data["curvature"], label="curvature.gp")
+                    _, fresnel = self._parse_gp_xy(data["fresnel"], label="fresnel.gp")
+                    _, fresnel_pt_6 = self._parse_gp_xy(
+                        data["fresnel_pt_6"], label="fresnel_pt_6.gp"
                     )
+                    _, reference = self._parse_gp_xy(data["reference"], label="reference.gp")
 
-                return dumps(
-                    {
+                    series = {
                         "distance": distance,
-                        "length": report["distance"],
                         "profile": profile,
                         "curvature": curvature,
                         "fresnel": fresnel,
                         "fresnel_pt_6": fresnel_pt_6,
                         "reference": reference,
-                        "path": {
-                            "obstructed": report["path_obstruction"],
-                            "message": report["path_message"],
-                            "obstructions": report["path_obstructions"],
-                        },
-                        "first_fresnel": {
-                            "obstructed": report["first_fresnel_obstruction"],
-                            "message": report["first_fresnel_message"],
-                        },
-                        "fresnel_60": {
-                            "obstructed": report["fresnel_60_obstruction"],
-                            "message": report["fresnel_60_message"],
-                        },
-                        "rx_signal_power": rx_signal_power,
-                        "rx_signal_power_optimized": rx_signal_power_optimized,
-                        "path_loss": fspl,
-                        "path_loss_rssi": path_loss_rssi,
-                        "lr_it_loss_line_type": report["lr_loss_type"],
-                        "lr_it_loss": lr_loss,
-                        "lr_it_loss_rssi": lr_it_loss_rssi,
                     }
-                )
+
+                    if request.max_points is not None:
+                        series = Splat._decimate_series(
+                            series, request.max_points, key="profile"
+                        )
+
+                    series = {
+                        k: Splat._encode_series(v, request.encoding)
+                        for k, v in series.items()
+                    }
+
+                    report = self._parse_tx_to_rx_report(data["tx_to_rx"])
+
+                    sig = report["signal_power_level_at_rx"]
+                    fspl = report["free_space_path_loss"]
+                    lr_loss = report["lr_loss"]
+
+                    rx_signal_power = None
+                    path_loss_rssi = None
+                    lr_it_loss_rssi = None
+
+                    if sig is not None:
+                        rx_signal_power = sig + request.rx_gain - request.rx_loss
+                        rx_signal_power_optimized = (
+                            rx_signal_power
+                            if not report["path_obstruction"]
+                            else rx_signal_power + (1.651 * (report["distance"]))
+                        )
+
+                    if fspl is not None:
+                        path_loss_rssi = (
+                            request.tx_power
+                            + request.tx_gain
+                            - request.tx_loss
+                            - fspl
+                            + request.rx_gain
+                            - request.rx_loss
+                        )
+
+                    if lr_loss is not None:
+                        lr_it_loss_rssi = (
+                            request.tx_power
+                            + request.tx_gain
+                            - request.tx_loss
+                            - lr_loss
+                            + request.rx_gain
+                            - request.rx_loss
+                        )
+
+                    return dumps(
+                        {
+                            **series,
+                            "length": report["distance"],
+                            "path": {
+                                "obstructed": report["path_obstruction"],
+                                "message": report["path_message"],
+                                "obstructions": report["path_obstructions"],
+                            },
+                            "first_fresnel": {
+                                "obstructed": report["first_fresnel_obstruction"],
+                                "message": report["first_fresnel_message"],
+                            },
+                            "fresnel_60": {
+                                "obstructed": report["fresnel_60_obstruction"],
+                                "message": report["fresnel_60_message"],
+                            },
+                            "rx_signal_power": rx_signal_power,
+                            "rx_signal_power_optimized": rx_signal_power_optimized,
+                            "path_loss": fspl,
+                            "path_loss_rssi": path_loss_rssi,
+                            "lr_it_loss_line_type": report["lr_loss_type"],
+                            "lr_it_loss": lr_loss,
+                            "lr_it_loss_rssi": lr_it_loss_rssi,
+                        }
+                    )
 
             except Exception as e:
                 logger.error(f"Error during LOS prediction: {e}")
                 raise RuntimeError(f"Error during LOS prediction: {e}")
 
-    def coverage_prediction(self, request: CoveragePredictionRequest) -> bytes:
+    def coverage_prediction(
+        self,
+        request: CoveragePredictionRequest,
+        geotiff_path: str,
+        signal_path: str,
+        job: JobMetrics = None,
+    ) -> dict:
         logger.debug(f"Coverage prediction request: {request.json()}")
+        job = job or JobMetrics("coverage", request.high_resolution, request.radius)
 
         with tempfile.TemporaryDirectory() as tmpdir:
             try:
@@ -339,142 +368,159 @@ class Splat:
                     request.radius = 300
 
                 # determine the required terrain tiles
-                required_tiles = Splat._calculate_required_terrain_tiles_coverage(
-                    request.lat, request.lon, request.radius * 1000
-                )
-
-                self._download_terrain_tile(required_tiles, request.high_resolution)
-
-                # write transmitter / qth file
-                with open(os.path.join(tmpdir, "tx.qth"), "wb") as qth_file:
-                    qth_file.write(
-                        Splat._create_splat_qth(
-                            "tx", request.lat, request.lon, request.tx_height
-                        )
+                with job.stage("tile_resolution"):
+                    required_tiles = Splat._calculate_required_terrain_tiles_coverage(
+                        request.lat, request.lon, request.radius * 1000
                     )
 
-                # write model parameter / lrp file
-                with open(os.path.join(tmpdir, "splat.lrp"), "wb") as lrp_file:
-                    lrp_file.write(
-                        Splat._create_splat_lrp(
-                            ground_dielectric=request.ground_dielectric,
-                            ground_conductivity=request.ground_conductivity,
-                            atmosphere_bending=request.atmosphere_bending,
-                            frequency_mhz=request.frequency_mhz,
-                            radio_climate=request.radio_climate,
-                            polarization=request.polarization,
-                            situation_fraction=request.situation_fraction,
-                            time_fraction=request.time_fraction,
-                            tx_power=request.tx_power,
-                            tx_gain=request.tx_gain,
-                            tx_loss=request.tx_loss,
-                        )
+                with job.stage("tile_download"):
+                    downloaded = self._download_terrain_tile(
+                        required_tiles, request.high_resolution
                     )
-
-                # write colorbar / dcf file
-                with open(os.path.join(tmpdir, "splat.dcf"), "wb") as dcf_file:
-                    dcf_file.write(
-                        Splat._create_splat_dcf(
-                            colormap_name=request.colormap,
-                            min_dbm=request.min_dbm,
-                            max_dbm=request.max_dbm,
+                job.terrain_tiles(len(required_tiles), downloaded)
+
+                with job.stage("input_files"):
+                    # write transmitter / qth file
+                    with open(os.path.join(tmpdir, "tx.qth"), "wb") as qth_file:
+                        qth_file.write(
+                            Splat._create_splat_qth(
+                                "tx", request.lat, request.lon, request.tx_height
+                            )
                         )
-                    )
 
-                logger.debug(f"Contents of {tmpdir}: {os.listdir(tmpdir)}")
-
-                splat_command = [
-                    (
-                        self.splat_hd_binary
-                        if request.high_resolution
-                        else self.splat_binary
-                    ),
-                    "-t",
-                    "tx.qth",
-                    "-L",
-                    str(request.rx_height),
-                    "-d",
-                    self.tile_cache,
-                    "-metric",
-                    "-R",
-                    str(request.radius),
-                    "-sc",
-                    "-gc",
-                    str(request.clutter_height),
-                    "-ngs",
-                    "-N",
-                    "-o",
-                    "output.ppm",
-                    "-dbm",
-                    "-db",
-                    str(request.min_dbm),
-                    "-kml",
-                    "-olditm" if request.itm_mode else "",
-                ]  # flag "olditm" uses the standard ITM model instead of ITWOM, which has produced unrealistic results.
-                logger.debug(f"Executing SPLAT! command: {' '.join(splat_command)}")
-
-                splat_result = subprocess.run(
-                    splat_command,
-                    cwd=tmpdir,
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                )
+                    # write model parameter / lrp file
+                    with open(os.path.join(tmpdir, "splat.lrp"), "wb") as lrp_file:
+                        lrp_file.write(
+                            Splat._create_splat_lrp(
+                                ground_dielectric=request.ground_dielectric,
+                                ground_conductivity=request.ground_conductivity,
+                                atmosphere_bending=request.atmosphere_bending,
+                                frequency_mhz=request.frequency_mhz,
+                                radio_climate=request.radio_climate,
+                                polarization=request.polarization,
+                                situation_fraction=request.situation_fraction,
+                                time_fraction=request.time_fraction,
+                                tx_power=request.tx_power,
+                                tx_gain=request.tx_gain,
+                                tx_loss=request.tx_loss,
+                            )
+                        )
 
-                logger.debug(f"SPLAT! stdout:\n{splat_result.stdout}")
-                logger.debug(f"SPLAT! stderr:\n{splat_result.stderr}")
+                    # write colorbar / dcf file
+                    with open(os.path.join(tmpdir, "splat.dcf"), "wb") as dcf_file:
+                        dcf_file.write(
+                            Splat._create_splat_dcf(
+                                colormap_name=request.colormap,
+                                min_dbm=request.min_dbm,
+                                max_dbm=request.max_dbm,
+                            )
+                        )
 
-                if splat_result.returncode != 0:
-                    logger.error(
-                        f"SPLAT! execution failed with return code {splat_result.returncode}"
-                    )
-                    raise RuntimeError(
-                        f"SPLAT! execution failed with return code {splat_result.returncode}\n"
-                        f"Stdout: {splat_result.stdout}\nStderr: {splat_result.stderr}"
-                    )
+                    logger.debug(f"Contents of {tmpdir}: {os.listdir(tmpdir)}")
+
+                with job.stage("splat_run"):
+                    splat_command = [
+                        (
+                            self.splat_hd_binary
+                            if request.high_resolution
+                            else self.splat_binary
+                        ),
+                        "-t",
+                        "tx.qth",
+                        "-L",
+                        str(request.rx_height),
+                        "-d",
+                        self.tile_cache,
+                        "-metric",
+                        "-R",
+                        str(request.radius),
+                        "-sc",
+                        "-gc",
+                        str(request.clutter_height),
+                        "-ngs",
+                        "-N",
+                        "-o",
+                        "output.ppm",
+                        "-dbm",
+                        "-db",
+                        str(request.min_dbm),
+                        "-kml",
+                        "-olditm" if request.itm_mode else "",
+                    ]  # flag "olditm" uses the standard ITM model instead of ITWOM, which has produced unrealistic results.
+                    logger.debug(f"Executing SPLAT! command: {' '.join(splat_command)}")
+
+                    splat_result = Splat._run_splat(splat_command, tmpdir, job)
+
+                    logger.debug(f"SPLAT! stdout:\n{splat_result.stdout}")
+                    logger.debug(f"SPLAT! stderr:\n{splat_result.stderr}")
+
+                    if splat_result.returncode != 0:
+                        logger.error(
+                            f"SPLAT! execution failed with return code {splat_result.returncode}"
+                        )
+                        raise RuntimeError(
+                            f"SPLAT! execution failed with return code {splat_result.returncode}\n"
+                            f"Stdout: {splat_result.stdout}\nStderr: {splat_result.stderr}"
+                        )
 
-                self._save_all_files_from_tmpdir(tmpdir)
+                with job.stage("output_parsing"):
+                    if SPLAT_DEBUG_ARTIFACTS:
+                        self._save_all_files_from_tmpdir(tmpdir)
 
-                with open(os.path.join(tmpdir, "output-ck.ppm"), "rb") as label_file:
-                    legend_data = label_file.read()
-                    legend_png = Image.open(io.BytesIO(legend_data))
-                    buffered = io.BytesIO()
-                    legend_png.save(buffered, format="PNG")
-                    legend_html_blob = base64.b64encode(buffered.getvalue()).decode(
-                        "utf-8"
+                    legend_html_blob = Splat._ppm_to_png_base64(
+                        os.path.join(tmpdir, "output-ck.ppm")
                     )
 
-                # Calculate expected bounds from request parameters
-                # Approximate degrees per km: 1 degree ≈ 111 km
-                radius_degrees = request.radius / 111.0
-                lat_offset = radius_degrees
-                lon_offset = radius_degrees / math.cos(math.radians(request.lat)) if abs(request.lat) < 85 else radius_degrees
+                with job.stage("geotiff_build"):
+                    # Calculate expected bounds from request parameters
+                    # Approximate degrees per km: 1 degree ≈ 111 km
+                    radius_degrees = request.radius / 111.0
+                    lat_offset = radius_degrees
+                    lon_offset = radius_degrees / math.cos(math.radians(request.lat)) if abs(request.lat) < 85 else radius_degrees
                 
-                bounds = {
-                    "north": min(90, request.lat + lat_offset),
-                    "south": max(-90, request.lat - lat_offset),
-                    "east": min(180, request.lon + lon_offset),
-                    "west": max(-180, request.lon - lon_offset),
-                }
-                logger.debug(f"Calculated coverage bounds: {bounds}")
-
-                with open(os.path.join(tmpdir, "output.ppm"), "rb") as ppm_file:
-                    with open(os.path.join(tmpdir, "output.kml"), "rb") as kml_file:
-                        ppm_data = ppm_file.read()
-                        kml_data = kml_file.read()
-                        geotiff_data = Splat._create_splat_geotiff(
-                            ppm_data,
-                            kml_data,
-                            request.colormap,
-                            request.min_dbm,
-                            request.max_dbm,
-                            explicit_bounds=bounds,
-                        )
+                    bounds = {
+                        "north": min(90, request.lat + lat_offset),
+                        "south": max(-90, request.lat - lat_offset),
+                        "east": min(180, request.lon + lon_offset),
+                        "west": max(-180, request.lon - lon_offset),
+                    }
+                    logger.debug(f"Calculated coverage bounds: {bounds}")
+
+                    # The PPM is memory-mapped and only the crop window is decoded; both
+                    # rasters are written straight to their final paths.
+                    ppm_path = os.path.join(tmpdir, "output.ppm")
+                    kml_data = self._read_bytes(os.path.join(tmpdir, "output.kml"))
+                    Splat._create_splat_geotiff(
+                        ppm_path,
+                        kml_data,
+                        request.colormap,
+                        request.min_dbm,
+                        request.max_dbm,
+                        explicit_bounds=bounds,
+                        dst_path=geotiff_path,
+                    )
+                    Splat._create_splat_signal_geotiff(
+                        ppm_path,
+                        kml_data,
+                        request.colormap,
+                        request.min_dbm,
+                        request.max_dbm,
+                        explicit_bounds=bounds,
+                        tags={
+                            "tx_power": request.tx_power,
+                            "tx_gain": request.tx_gain,
+                            "tx_loss": request.tx_loss,
+                            "rx_loss": request.rx_loss,
+                        },
+                        dst_path=signal_path,
+                    )
+                job.output_size("geotiff", os.path.getsize(geotiff_path))
+                job.output_size("signal", os.path.getsize(signal_path))
 
                 logger.info("SPLAT! coverage prediction completed successfully.")
                 return {
-                    "geotiff": geotiff_data,
                     "data": dumps({"legend": legend_html_blob}),
+                    "process_peak_rss_kb": Splat._process_peak_rss_kb(),
                 }
 
             except Exception as e:
@@ -511,6 +557,108 @@ class Splat:
                     logger.warning(f"Skipping invalid line in {label}: {line!r}")
         return xs, ys
 
+    @staticmethod
+    def _parse_gp_xy(
+        data: bytes, *, value_index: int = 1, label="file"
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Bulk-parse a gnuplot .gp file into (xs, ys) float64 arrays with NumPy.
+        Falls back to the line-by-line parser when the file contains malformed rows.
+        """
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)  # empty input
+                values = np.loadtxt(
+                    io.BytesIO(data),
+                    delimiter="\t",
+                    usecols=(0, value_index),
+                    ndmin=2,
+                    dtype=np.float64,
+                )
+            return values[:, 0], values[:, 1]
+        except (ValueError, IndexError):
+            xs, ys = Splat._parse_gp_xy_lines(
+                Splat._decode_lines(data),
+                value_index=value_index,
+                logger=logger,
+                label=label,
+            )
+            return np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+
+    @staticmethod
+    def _lttb_indices(xs: np.ndarray, ys: np.ndarray, max_points: int) -> np.ndarray:
+        """
+        Largest-Triangle-Three-Buckets downsampling. Returns the indices of the points
+        to keep, always including the first and last point, so peaks in the terrain
+        profile survive decimation.
+        """
+        n = len(ys)
+        if max_points >= n or max_points < 3:
+            return np.arange(n)
+
+        edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+        indices = np.empty(max_points, dtype=np.int64)
+        indices[0] = 0
+        indices[-1] = n - 1
+
+        selected = 0
+        for bucket in range(max_points - 2):
+            start, end = edges[bucket], max(edges[bucket + 1], edges[bucket] + 1)
+            next_start = end
+            next_end = max(edges[bucket + 2], next_start + 1) if bucket + 2 < len(edges) else n
+
+            # average of the next bucket is the third vertex of the triangle
+            avg_x = xs[next_start:next_end].mean()
+            avg_y = ys[next_start:next_end].mean()
+
+            ax, ay = xs[selected], ys[selected]
+            area = np.abs(
+                (ax - avg_x) * (ys[start:end] - ay) - (ax - xs[start:end]) * (avg_y - ay)
+            )
+            selected = start + int(np.argmax(area))
+            indices[bucket + 1] = selected
+
+        return indices
+
+    @staticmethod
+    def _decimate_series(
+        series: Dict[str, np.ndarray], max_points: int, *, key: str
+    ) -> Dict[str, np.ndarray]:
+        """
+        Decimate all LOS series to at most `max_points` points using the indices picked
+        on the `key` series, so the arrays stay aligned with `distance`.
+        """
+        distance = series["distance"]
+        indices = Splat._lttb_indices(distance, series[key], max_points)
+
+        decimated = {}
+        for name, values in series.items():
+            if len(values) == len(distance):
+                decimated[name] = values[indices]
+            else:
+                # misaligned series (skipped rows), fall back to uniform sampling
+                count = min(len(values), max_points)
+                decimated[name] = values[
+                    np.linspace(0, len(values) - 1, count).astype(np.int64)
+                ] if len(values) else values
+        logger.debug(
+            f"Decimated LOS series from {len(distance)} to {len(indices)} points."
+        )
+        return decimated
+
+    @staticmethod
+    def _encode_series(values: np.ndarray, encoding: str):
+        """Encode a LOS series for the JSON payload ("json" list or base64 "float32")."""
+        if encoding == "float32":
+            return {
+                "dtype": "float32",
+                "shape": [len(values)],
+                "data": base64.b64encode(
+                    values.astype("<f4", copy=False).tobytes()
+                ).decode("ascii"),
+            }
+        return values.tolist()
+
     @staticmethod
     def _decode_lines(b: bytes):
         return b.decode("utf-8", errors="ignore").splitlines()
@@ -702,9 +850,57 @@ class Splat:
         for filename in os.listdir(tmpdir):
             src_path = os.path.join(tmpdir, filename)
             dst_path = os.path.join("/var/app/geoserver_data/tmp", filename)
-            with open(src_path, "rb") as src_file:
-                with open(dst_path, "wb") as dst_file:
-                    dst_file.write(src_file.read())
+            shutil.copyfile(src_path, dst_path)
+
+    @staticmethod
+    def _run_splat(
+        command: List[str], cwd: str, job: JobMetrics
+    ) -> subprocess.CompletedProcess:
+        """
+        Run SPLAT! like `subprocess.run(capture_output=True, text=True)`, but reap the child with
+        `os.wait4` so its own rusage (CPU time, max RSS, block I/O) is recorded on `job`.
+        Output goes through files in `cwd`, pipes could fill up while nobody reads them.
+        """
+        stdout_path = os.path.join(cwd, "splat.stdout")
+        stderr_path = os.path.join(cwd, "splat.stderr")
+        start = time.perf_counter()
+        with open(stdout_path, "wb") as stdout_file, open(stderr_path, "wb") as stderr_file:
+            process = subprocess.Popen(command, cwd=cwd, stdout=stdout_file, stderr=stderr_file)
+            try:
+                _, status, rusage = os.wait4(process.pid, 0)
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+            process.returncode = os.waitstatus_to_exitcode(status)
+        job.splat_rusage(rusage)
+
+        with open(stdout_path, errors="replace") as stdout_file, open(
+            stderr_path, errors="replace"
+        ) as stderr_file:
+            result = subprocess.CompletedProcess(
+                command, process.returncode, stdout_file.read(), stderr_file.read()
+            )
+        if job.profile is not None:
+            job.profile.record_splat(
+                command, result.returncode, result.stdout, result.stderr, time.perf_counter() - start
+            )
+        return result
+
+    @staticmethod
+    def _process_peak_rss_kb() -> Optional[int]:
+        """
+        Peak resident set size (VmHWM) of the whole API process since it started, in kB. Shared by
+        every job the process ran, the memory of one job is SPLAT!'s own max RSS (`_run_splat`).
+        """
+        try:
+            with open("/proc/self/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return None
 
     @staticmethod
     def _dir_content(dir: str) -> List[str]:
@@ -714,6 +910,22 @@ class Splat:
             logger.error(f"Error accessing temporary directory '{dir}': {e}")
             return []
 
+    @staticmethod
+    def terrain_tile_count(request) -> int:
+        """Terrain tiles a LOS or coverage request loads, the main input of its predicted cost."""
+        if isinstance(request, CoveragePredictionRequest):
+            # radius capped like in coverage_prediction
+            return len(
+                Splat._calculate_required_terrain_tiles_coverage(
+                    request.lat, request.lon, min(request.radius, 300) * 1000
+                )
+            )
+        return len(
+            Splat._calculate_required_terrain_tiles_los(
+                request.tx_lat, request.tx_lon, request.rx_lat, request.rx_lon
+            )
+        )
+
     @staticmethod
     def _calculate_required_terrain_tiles_los(
         tx_lat: float,
@@ -921,6 +1133,19 @@ class Splat:
             logger.error(f"Error generating .lrp file content: {e}")
             raise
 
+    @staticmethod
+    def _splat_dcf_levels(
+        colormap_name: str, min_dbm: float, max_dbm: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Signal levels (dBm, descending) and their RGB colours as written to the .dcf file."""
+        cmap = plt.get_cmap(colormap_name)
+        cmap_values = np.linspace(max_dbm, min_dbm, 32)  # SPLAT! supports up to 32 levels
+        cmap_norm = plt.Normalize(vmin=min_dbm, vmax=max_dbm)
+
+        # Generate RGB values
+        rgb_colors = (cmap(cmap_norm(cmap_values))[:, :3] * 255).astype(int)
+        return cmap_values.astype(int), rgb_colors
+
     @staticmethod
     def _create_splat_dcf(colormap_name: str, min_dbm: float, max_dbm: float) -> bytes:
         logger.debug(
@@ -928,21 +1153,14 @@ class Splat:
         )
 
         try:
-            # Generate color map values and normalization
-            cmap = plt.get_cmap(colormap_name)
-            cmap_values = np.linspace(
-                max_dbm, min_dbm, 32
-            )  # SPLAT! supports up to 32 levels
-            cmap_norm = plt.Normalize(vmin=min_dbm, vmax=max_dbm)
-
-            # Generate RGB values
-            rgb_colors = (cmap(cmap_norm(cmap_values))[:, :3] * 255).astype(int)
+            # Generate color map values and RGB colours
+            levels, rgb_colors = Splat._splat_dcf_levels(colormap_name, min_dbm, max_dbm)
 
             # Prepare .dcf content
             contents = "; SPLAT! Auto-generated DBM Signal Level Color Definition\n;\n"
             contents += "; Format: dBm: red, green, blue\n;\n"
-            for value, rgb in zip(cmap_values, rgb_colors):
-                contents += f"{int(value):+4d}: {rgb[0]:3d}, {rgb[1]:3d}, {rgb[2]:3d}\n"
+            for value, rgb in zip(levels, rgb_colors):
+                contents += f"{value:+4d}: {rgb[0]:3d}, {rgb[1]:3d}, {rgb[2]:3d}\n"
 
             logger.debug(f"Generated .dcf file contents:\n{contents}")
             return contents.encode("utf-8")
@@ -967,171 +1185,558 @@ class Splat:
         rgb_colors = list(cmap(cmap_norm(cmap_values))[:, :3] * 255).astype(int)
         return rgb_colors
 
+    @staticmethod
+    def _parse_kml_bounds(kml_bytes: bytes) -> Dict[str, float]:
+        """Parse the LatLonBox of a SPLAT! KML. SPLAT writes the full terrain mosaic extent there."""
+        tree = ET.ElementTree(ET.fromstring(kml_bytes))
+        namespace = {"kml": "http://earth.google.com/kml/2.1"}
+        box = tree.find(".//kml:LatLonBox", namespace)
+
+        return {
+            "north": float(box.find("kml:north", namespace).text),
+            "south": float(box.find("kml:south", namespace).text),
+            "east": float(box.find("kml:east", namespace).text),
+            "west": float(box.find("kml:west", namespace).text),
+        }
+
+    @staticmethod
+    def _crop_window(
+        src_height: int,
+        src_width: int,
+        kml_bounds: Dict[str, float],
+        explicit_bounds: dict = None,
+    ) -> Tuple[Tuple[int, int, int, int], Dict[str, float]]:
+        """
+        Pixel window (row_min, row_max, col_min, col_max) and geographic bounds of the
+        requested coverage extent inside the full SPLAT terrain mosaic.
+        """
+        kml_north = kml_bounds["north"]
+        kml_south = kml_bounds["south"]
+        kml_east = kml_bounds["east"]
+        kml_west = kml_bounds["west"]
+
+        if explicit_bounds is None:
+            return (0, src_height, 0, src_width), dict(kml_bounds)
+
+        lon_span = kml_east - kml_west
+        lat_span = kml_north - kml_south
+
+        if lon_span <= 0 or lat_span <= 0:
+            raise RuntimeError("Invalid KML bounds for SPLAT raster crop.")
+
+        crop_west = max(kml_west, explicit_bounds["west"])
+        crop_east = min(kml_east, explicit_bounds["east"])
+        crop_south = max(kml_south, explicit_bounds["south"])
+        crop_north = min(kml_north, explicit_bounds["north"])
+
+        if crop_west >= crop_east or crop_south >= crop_north:
+            raise RuntimeError(
+                "Requested coverage bounds do not overlap SPLAT raster bounds."
+            )
+
+        col_min = max(0, int(math.floor((crop_west - kml_west) / lon_span * src_width)))
+        col_max = min(
+            src_width, int(math.ceil((crop_east - kml_west) / lon_span * src_width))
+        )
+        row_min = max(
+            0, int(math.floor((kml_north - crop_north) / lat_span * src_height))
+        )
+        row_max = min(
+            src_height,
+            int(math.ceil((kml_north - crop_south) / lat_span * src_height)),
+        )
+
+        logger.debug(
+            "Cropping SPLAT raster from KML bounds to requested bounds: "
+            "rows=%s:%s cols=%s:%s",
+            row_min,
+            row_max,
+            col_min,
+            col_max,
+        )
+
+        return (row_min, row_max, col_min, col_max), {
+            "north": crop_north,
+            "south": crop_south,
+            "east": crop_east,
+            "west": crop_west,
+        }
+
+    @staticmethod
+    def _read_ppm(ppm_path: str) -> np.ndarray:
+        """
+        Memory-map a binary (P6) PPM as a read-only (height, width, 3) uint8 array.
+        Only the pages of the rows that are actually sliced get read from disk.
+        """
+        with open(ppm_path, "rb") as ppm_file:
+            header = ppm_file.read(512)
+
+        # header: magic, width, height, maxval separated by whitespace, '#' comments allowed
+        fields = []
+        pos = 0
+        while len(fields) < 4:
+            while header[pos : pos + 1].isspace():
+                pos += 1
+            if header[pos : pos + 1] == b"#":
+                pos = header.index(b"\n", pos) + 1
+                continue
+            end = pos
+            while end < len(header) and not header[end : end + 1].isspace():
+                end += 1
+            fields.append(header[pos:end])
+            pos = end
+        pos += 1  # single whitespace character before the raster
+
+        if fields[0] != b"P6" or int(fields[3]) != 255:
+            raise ValueError(f"Unsupported PPM format in {ppm_path}: {fields}")
+
+        width, height = int(fields[1]), int(fields[2])
+        return np.memmap(
+            ppm_path, dtype=np.uint8, mode="r", offset=pos, shape=(height, width, 3)
+        )
+
+    @staticmethod
+    def _ppm_to_png_base64(ppm_path: str) -> str:
+        """Base64 PNG of a small PPM, used for the SPLAT! colour key (output-ck.ppm)."""
+        with Image.open(ppm_path) as ppm_image:
+            buffered = io.BytesIO()
+            ppm_image.save(buffered, format="PNG")
+        return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+    @staticmethod
+    def _dbm_to_palette_index(
+        dbm_array: np.ndarray,
+        min_dbm: float,
+        max_dbm: float,
+        offset_db: float = 0.0,
+        no_data_value: int = 255,
+    ) -> np.ndarray:
+        """
+        Palette index of every signal level, 0..254 linearly over [min_dbm, max_dbm] after adding
+        `offset_db`. Shared by the SPLAT! pipeline and restyles so both colour a level the same.
+        """
+        valid = dbm_array != SIGNAL_NODATA
+        shifted = dbm_array.astype(np.float32) + np.float32(offset_db)
+        valid &= shifted >= min_dbm
+        scale = 254.0 / (max_dbm - min_dbm) if max_dbm != min_dbm else 0.0
+        index = np.clip(np.rint((shifted - min_dbm) * scale), 0, 254).astype(np.uint8)
+        index[~valid] = no_data_value
+        return index
+
     @staticmethod
     def _create_splat_geotiff(
-        ppm_bytes: bytes,
+        ppm_path: str,
         kml_bytes: bytes,
         colormap_name: str,
         min_dbm: float,
         max_dbm: float,
         null_value: int = 255,  # Define the null value for transparency
         explicit_bounds: dict = None,  # Optional: {"north", "south", "east", "west"}
-    ) -> bytes:
+        dst_path: str = None,
+    ) -> Optional[bytes]:
         logger.info("Starting GeoTIFF generation from SPLAT! PPM and KML data.")
 
         try:
-            # Parse KML bounds. SPLAT writes the full terrain mosaic extent there.
             logger.debug("Parsing KML content.")
-            tree = ET.ElementTree(ET.fromstring(kml_bytes))
-            namespace = {"kml": "http://earth.google.com/kml/2.1"}
-            box = tree.find(".//kml:LatLonBox", namespace)
-
-            kml_north = float(box.find("kml:north", namespace).text)
-            kml_south = float(box.find("kml:south", namespace).text)
-            kml_east = float(box.find("kml:east", namespace).text)
-            kml_west = float(box.find("kml:west", namespace).text)
-
-            logger.debug(
-                "Extracted KML bounds: north=%s, south=%s, east=%s, west=%s",
-                kml_north,
-                kml_south,
-                kml_east,
-                kml_west,
-            )
+            kml_bounds = Splat._parse_kml_bounds(kml_bytes)
+            logger.debug(f"Extracted KML bounds: {kml_bounds}")
 
             if explicit_bounds is not None:
-                north = explicit_bounds["north"]
-                south = explicit_bounds["south"]
-                east = explicit_bounds["east"]
-                west = explicit_bounds["west"]
-                logger.debug(
-                    "Using explicit bounds: north=%s, south=%s, east=%s, west=%s",
-                    north,
-                    south,
-                    east,
-                    west,
-                )
-            else:
-                north = kml_north
-                south = kml_south
-                east = kml_east
-                west = kml_west
+                logger.debug(f"Using explicit bounds: {explicit_bounds}")
 
-            # Read PPM content
+            # Memory-map PPM content, nothing is decoded yet
             logger.debug("Reading PPM content.")
-            with Image.open(io.BytesIO(ppm_bytes)) as img:
-                img_array = np.array(
-                    img.convert("L")
-                )  # Convert to single-channel grayscale
-                img_array = np.clip(img_array, 0, 255).astype("uint8")
-
-            logger.debug(f"PPM image dimensions: {img_array.shape}")
-
-            # Mask null values
-            img_array = np.where(
-                img_array == null_value, 255, img_array
-            )  # Optionally set to 0
-            no_data_value = null_value
+            ppm_array = Splat._read_ppm(ppm_path)
+            logger.debug(f"PPM image dimensions: {ppm_array.shape[:2]}")
 
             # When explicit bounds are provided, crop the full SPLAT terrain mosaic
             # down to the requested coverage extent before georeferencing.
-            if explicit_bounds is not None:
-                src_height, src_width = img_array.shape
-                lon_span = kml_east - kml_west
-                lat_span = kml_north - kml_south
-
-                if lon_span <= 0 or lat_span <= 0:
-                    raise RuntimeError("Invalid KML bounds for SPLAT raster crop.")
+            (row_min, row_max, col_min, col_max), bounds = Splat._crop_window(
+                ppm_array.shape[0], ppm_array.shape[1], kml_bounds, explicit_bounds
+            )
 
-                crop_west = max(kml_west, west)
-                crop_east = min(kml_east, east)
-                crop_south = max(kml_south, south)
-                crop_north = min(kml_north, north)
+            # Recover the signal level of only the crop window and index the palette by it
+            dbm_array = Splat._rgb_to_dbm(
+                ppm_array[row_min:row_max, col_min:col_max],
+                colormap_name,
+                min_dbm,
+                max_dbm,
+            )
+            no_data_value = null_value
+            img_array = Splat._dbm_to_palette_index(
+                dbm_array, min_dbm, max_dbm, no_data_value=no_data_value
+            )
 
-                if crop_west >= crop_east or crop_south >= crop_north:
-                    raise RuntimeError(
-                        "Requested coverage bounds do not overlap SPLAT raster bounds."
-                    )
+            geotiff_bytes = Splat._write_palette_geotiff(
+                img_array,
+                bounds,
+                colormap_name,
+                min_dbm,
+                max_dbm,
+                no_data_value,
+                dst_path=dst_path,
+            )
 
-                col_min = max(
-                    0, int(math.floor((crop_west - kml_west) / lon_span * src_width))
-                )
-                col_max = min(
-                    src_width, int(math.ceil((crop_east - kml_west) / lon_span * src_width))
-                )
-                row_min = max(
-                    0, int(math.floor((kml_north - crop_north) / lat_span * src_height))
-                )
-                row_max = min(
-                    src_height,
-                    int(math.ceil((kml_north - crop_south) / lat_span * src_height)),
-                )
+            logger.info("GeoTIFF generation successful.")
+            return geotiff_bytes
 
-                logger.debug(
-                    "Cropping SPLAT raster from KML bounds to requested bounds: "
-                    "rows=%s:%s cols=%s:%s",
-                    row_min,
-                    row_max,
-                    col_min,
-                    col_max,
-                )
+        except Exception as e:
+            logger.error(f"Error during GeoTIFF generation: {e}")
+            raise RuntimeError(f"Error during GeoTIFF generation: {e}")
 
-                img_array = img_array[row_min:row_max, col_min:col_max]
-                west = crop_west
-                east = crop_east
-                north = crop_north
-                south = crop_south
+    @staticmethod
+    def _write_palette_geotiff(
+        img_array: np.ndarray,
+        bounds: Dict[str, float],
+        colormap_name: str,
+        min_dbm: float,
+        max_dbm: float,
+        no_data_value: int = 255,
+        geotiff_format: str = None,
+        dst_path: str = None,
+        output_crs: str = None,
+    ) -> Optional[bytes]:
+        """
+        Write a uint8 index array on the EPSG:4326 grid of `bounds` as a palette GeoTIFF using the
+        colormap over the dBm range, warped to `output_crs` (default COVERAGE_OUTPUT_CRS) if it differs.
+        """
+        # Create GeoTIFF using Rasterio
+        height, width = img_array.shape
+        transform = from_bounds(
+            bounds["west"],
+            bounds["south"],
+            bounds["east"],
+            bounds["north"],
+            width,
+            height,
+        )
+        crs = "EPSG:4326"
 
-            # Create GeoTIFF using Rasterio
+        output_crs = output_crs or COVERAGE_OUTPUT_CRS
+        if output_crs != crs:
+            img_array, transform = Splat._warp_palette_index(
+                img_array, transform, bounds, output_crs, no_data_value
+            )
             height, width = img_array.shape
-            transform = from_bounds(west, south, east, north, width, height)
-            logger.debug(f"GeoTIFF transform matrix: {transform}")
-
-            # Generate colormap with transparency
-            cmap = plt.get_cmap(colormap_name, 256)  # colormap with 256 levels
-            cmap_norm = plt.Normalize(
-                vmin=min_dbm, vmax=max_dbm
-            )  # Normalize based on dBm range
-            cmap_values = np.linspace(min_dbm, max_dbm, 255)
-
-            # Map data values to RGB for visible colors
-            rgb_colors = (cmap(cmap_norm(cmap_values))[:, :3] * 255).astype(int)
-
-            # Initialize GDAL-compatible colormap with transparency for null values
-            gdal_colormap = {i: tuple(rgb) + (255,) for i, rgb in enumerate(rgb_colors)}
-
-            # Write GeoTIFF to memory
-            with io.BytesIO() as buffer:
-                with rasterio.open(
-                    buffer,
-                    "w",
-                    driver="GTiff",
-                    height=height,
-                    width=width,
-                    count=1,  # Single-band data
-                    dtype="uint8",
-                    crs="EPSG:4326",
-                    transform=transform,
-                    photometric="palette",  # Colormap interpretation
-                    compress="lzw",
-                    nodata=no_data_value,  # Set NoData value
-                ) as dst:
-                    dst.write(img_array, 1)  # Write the raster data
-                    dst.write_colormap(1, gdal_colormap)  # Attach the colormap
-
-                buffer.seek(0)
-                geotiff_bytes = buffer.read()
+            crs = output_crs
+        logger.debug(f"GeoTIFF transform matrix: {transform}")
 
-            logger.info("GeoTIFF generation successful.")
-            return geotiff_bytes
+        # Generate colormap with transparency
+        cmap = plt.get_cmap(colormap_name, 256)  # colormap with 256 levels
+        cmap_norm = plt.Normalize(
+            vmin=min_dbm, vmax=max_dbm
+        )  # Normalize based on dBm range
+        cmap_values = np.linspace(min_dbm, max_dbm, 255)
+
+        # Map data values to RGB for visible colors
+        rgb_colors = (cmap(cmap_norm(cmap_values))[:, :3] * 255).astype(int)
+
+        # Initialize GDAL-compatible colormap with transparency for null values
+        gdal_colormap = {i: tuple(rgb) + (255,) for i, rgb in enumerate(rgb_colors)}
+
+        def fill(dst):
+            dst.write(img_array, 1)  # Write the raster data
+            dst.write_colormap(1, gdal_colormap)  # Attach the colormap
+
+        return write_geotiff(
+            dst_path,
+            dict(
+                height=height,
+                width=width,
+                count=1,  # Single-band data
+                dtype="uint8",
+                crs=crs,
+                transform=transform,
+                nodata=no_data_value,  # Set NoData value
+                **geotiff_profile(geotiff_format, palette=True),
+            ),
+            fill,
+        )
+
+    @staticmethod
+    def _warp_palette_index(
+        img_array: np.ndarray,
+        transform,
+        bounds: Dict[str, float],
+        dst_crs: str,
+        no_data_value: int = 255,
+    ) -> Tuple[np.ndarray, object]:
+        """
+        Reproject an EPSG:4326 palette index array to `dst_crs` at about the same resolution.
+        Nearest neighbour only, interpolated palette indices would be meaningless colours.
+        """
+        height, width = img_array.shape
+        dst_transform, dst_width, dst_height = calculate_default_transform(
+            "EPSG:4326",
+            dst_crs,
+            width,
+            height,
+            left=bounds["west"],
+            bottom=bounds["south"],
+            right=bounds["east"],
+            top=bounds["north"],
+        )
+
+        warped = np.full((dst_height, dst_width), no_data_value, dtype=np.uint8)
+        reproject(
+            source=img_array,
+            destination=warped,
+            src_transform=transform,
+            src_crs="EPSG:4326",
+            src_nodata=no_data_value,
+            dst_transform=dst_transform,
+            dst_crs=dst_crs,
+            dst_nodata=no_data_value,
+            resampling=Resampling.nearest,
+            num_threads=os.cpu_count() or 1,
+        )
+        logger.info(
+            f"Warped coverage from EPSG:4326 {width}x{height} to {dst_crs} {dst_width}x{dst_height}."
+        )
+        return warped, dst_transform
+
+    @staticmethod
+    def _rgb_to_dbm(
+        rgb_array: np.ndarray,
+        colormap_name: str,
+        min_dbm: float,
+        max_dbm: float,
+        nodata: int = SIGNAL_NODATA,
+    ) -> np.ndarray:
+        """
+        Recover the quantised signal level of every pixel of a SPLAT! -dbm PPM by inverting
+        the .dcf colour table. SPLAT! paints a pixel with the colour of the highest level the
+        signal reaches, so the recovered value is the lower bound of its level. Pixels that
+        match no level (background, site markers) become `nodata`.
+        """
+        levels, rgb_colors = Splat._splat_dcf_levels(colormap_name, min_dbm, max_dbm)
+
+        # Pack RGB triplets into one integer key per level. Levels are walked from the
+        # strongest to the weakest so a colour shared by adjacent levels maps to the lower
+        # (conservative) one. Pure white is SPLAT!'s no-signal background with -ngs.
+        lut = {}
+        for level, (r, g, b) in zip(levels, rgb_colors):
+            key = (int(r) << 16) | (int(g) << 8) | int(b)
+            if key != 0xFFFFFF:
+                lut[key] = level
+
+        # Table over every packed RGB value (16 MiB) pointing into `values`, 0 = no level
+        table = np.zeros(1 << 24, dtype=np.uint8)
+        table[np.fromiter(lut.keys(), dtype=np.uint32, count=len(lut))] = np.arange(
+            1, len(lut) + 1, dtype=np.uint8
+        )
+        values = np.array([nodata, *lut.values()], dtype=np.int16)
+
+        packed = rgb_array[..., 0].astype(np.uint32) << 16
+        packed |= rgb_array[..., 1].astype(np.uint32) << 8
+        packed |= rgb_array[..., 2]
+
+        return values[table[packed]]
+
+    @staticmethod
+    def _create_splat_signal_geotiff(
+        ppm_path: str,
+        kml_bytes: bytes,
+        colormap_name: str,
+        min_dbm: float,
+        max_dbm: float,
+        explicit_bounds: dict = None,
+        tags: dict = None,
+        dst_path: str = None,
+    ) -> Optional[bytes]:
+        """
+        Generate a single-band int16 GeoTIFF holding the received signal level in dBm,
+        recovered from the SPLAT! PPM, so the coverage can be restyled or thresholded
+        without rerunning SPLAT!.
+        """
+        logger.info("Starting signal level GeoTIFF generation from SPLAT! PPM data.")
+
+        try:
+            kml_bounds = Splat._parse_kml_bounds(kml_bytes)
+
+            ppm_array = Splat._read_ppm(ppm_path)
+
+            (row_min, row_max, col_min, col_max), bounds = Splat._crop_window(
+                ppm_array.shape[0], ppm_array.shape[1], kml_bounds, explicit_bounds
+            )
+            dbm_array = Splat._rgb_to_dbm(
+                ppm_array[row_min:row_max, col_min:col_max],
+                colormap_name,
+                min_dbm,
+                max_dbm,
+            )
+
+            signal_bytes = Splat._write_signal_geotiff(
+                dbm_array,
+                bounds,
+                {
+                    "colormap": colormap_name,
+                    "min_dbm": min_dbm,
+                    "max_dbm": max_dbm,
+                    "offset_db": 0,
+                    **(tags or {}),
+                },
+                dst_path=dst_path,
+            )
+
+            logger.info("Signal level GeoTIFF generation successful.")
+            return signal_bytes
 
         except Exception as e:
-            logger.error(f"Error during GeoTIFF generation: {e}")
-            raise RuntimeError(f"Error during GeoTIFF generation: {e}")
+            logger.error(f"Error during signal level GeoTIFF generation: {e}")
+            raise RuntimeError(f"Error during signal level GeoTIFF generation: {e}")
+
+    @staticmethod
+    def _write_signal_geotiff(
+        dbm_array: np.ndarray,
+        bounds: Dict[str, float],
+        tags: dict,
+        geotiff_format: str = None,
+        dst_path: str = None,
+    ) -> Optional[bytes]:
+        """Write an int16 dBm array as an EPSG:4326 single-band GeoTIFF with the given tags."""
+        height, width = dbm_array.shape
+        transform = from_bounds(
+            bounds["west"],
+            bounds["south"],
+            bounds["east"],
+            bounds["north"],
+            width,
+            height,
+        )
+
+        def fill(dst):
+            dst.write(dbm_array, 1)
+            dst.set_band_description(1, "signal_dbm")
+            dst.update_tags(units="dBm", **tags)
+
+        return write_geotiff(
+            dst_path,
+            dict(
+                height=height,
+                width=width,
+                count=1,
+                dtype="int16",
+                crs="EPSG:4326",
+                transform=transform,
+                nodata=SIGNAL_NODATA,
+                **geotiff_profile(geotiff_format),
+            ),
+            fill,
+        )
+
+    @staticmethod
+    def _create_legend_png(colormap_name: str, min_dbm: float, max_dbm: float) -> bytes:
+        """Render a SPLAT!-like colour key (32 dBm levels) as PNG."""
+        levels, rgb_colors = Splat._splat_dcf_levels(colormap_name, min_dbm, max_dbm)
+
+        fig = Figure(figsize=(1.6, 6.0), dpi=100)
+        FigureCanvasAgg(fig)
+        ax = fig.add_axes([0.05, 0.02, 0.3, 0.96])
+        ax.imshow(
+            (rgb_colors[:, np.newaxis, :]).astype("uint8"),
+            aspect="auto",
+            extent=(0, 1, len(levels), 0),
+        )
+        ax.set_xticks([])
+        ax.yaxis.tick_right()
+        ax.set_yticks(np.arange(len(levels)) + 0.5)
+        ax.set_yticklabels([f"{level} dBm" for level in levels], fontsize=6)
+
+        with io.BytesIO() as buffer:
+            fig.savefig(buffer, format="png")
+            return buffer.getvalue()
+
+    @staticmethod
+    def restyle_coverage(
+        signal_bytes: bytes,
+        colormap_name: Optional[str] = None,
+        min_dbm: Optional[float] = None,
+        max_dbm: Optional[float] = None,
+        tx_power: Optional[float] = None,
+        tx_gain: Optional[float] = None,
+        tx_loss: Optional[float] = None,
+        rx_loss: Optional[float] = None,
+        offset_db: float = 0.0,
+    ) -> dict:
+        """
+        Build a new styled coverage from a stored signal level raster without running SPLAT!.
+
+        Power budget changes are applied as a linear dB shift relative to the budget stored
+        in the raster tags. Levels SPLAT! never computed (below the original min_dbm) stay
+        NoData, so a positive shift can not grow the coverage edge.
+
+        Returns the same structure as `coverage_prediction`.
+        """
+        logger.info("Restyling coverage from stored signal level raster.")
+
+        try:
+            with rasterio.open(io.BytesIO(signal_bytes)) as src:
+                dbm_array = src.read(1)
+                tags = src.tags()
+                src_bounds = src.bounds
+
+            bounds = {
+                "north": src_bounds.top,
+                "south": src_bounds.bottom,
+                "east": src_bounds.right,
+                "west": src_bounds.left,
+            }
+
+            colormap_name = colormap_name or tags["colormap"]
+            min_dbm = float(tags["min_dbm"]) if min_dbm is None else min_dbm
+            max_dbm = float(tags["max_dbm"]) if max_dbm is None else max_dbm
+
+            # Linear dB shift: new budget - stored budget, on top of earlier restyles
+            budget = {}
+            for name, value, sign in (
+                ("tx_power", tx_power, 1),
+                ("tx_gain", tx_gain, 1),
+                ("tx_loss", tx_loss, -1),
+                ("rx_loss", rx_loss, -1),
+            ):
+                stored = float(tags.get(name, 0.0))
+                budget[name] = stored if value is None else value
+                offset_db += sign * (budget[name] - stored)
+            total_offset = float(tags.get("offset_db", 0.0)) + offset_db
+
+            index = Splat._dbm_to_palette_index(dbm_array, min_dbm, max_dbm, total_offset)
+
+            geotiff_bytes = Splat._write_palette_geotiff(
+                index, bounds, colormap_name, min_dbm, max_dbm, 255
+            )
+            signal_out = Splat._write_signal_geotiff(
+                dbm_array,
+                bounds,
+                {
+                    **{k: v for k, v in tags.items() if k not in ("AREA_OR_POINT", "units")},
+                    "colormap": colormap_name,
+                    "min_dbm": min_dbm,
+                    "max_dbm": max_dbm,
+                    "offset_db": total_offset,
+                    **budget,
+                },
+            )
+            legend_html_blob = base64.b64encode(
+                Splat._create_legend_png(colormap_name, min_dbm, max_dbm)
+            ).decode("utf-8")
+
+            logger.info(f"Coverage restyled (offset {total_offset:+.2f} dB).")
+            return {
+                "geotiff": geotiff_bytes,
+                "signal": signal_out,
+                "data": dumps({"legend": legend_html_blob}),
+            }
+
+        except Exception as e:
+            logger.error(f"Error during coverage restyle: {e}")
+            raise RuntimeError(f"Error during coverage restyle: {e}")
 
     def _download_terrain_tile(
         self, required_tiles: List[Tuple[str, str, str]], high_resolution: bool
-    ) -> bytes:
+    ) -> int:
+        """Download the required tiles missing from the tile cache, returns how many were downloaded."""
+        downloaded = 0
         for tile_name, sdf_name, sdf_hd_name in required_tiles:
             url = ""
             # Check cache first
@@ -1178,6 +1783,8 @@ class Splat:
                 "wb",
             ) as sdf_file:
                 sdf_file.write(response.content)
+            downloaded += 1
+        return downloaded
 
     @staticmethod
     def _hgt_filename_to_sdf_filename(
@@ -1227,12 +1834,13 @@ if __name__ == "__main__":
 
         # Execute coverage prediction
         logger.info("Starting SPLAT! coverage prediction...")
-        result = splat_service.coverage_prediction(test_coverage_request)
-
         # Save GeoTIFF output for inspection
         output_path = "splat_output.tif"
-        with open(output_path, "wb") as output_file:
-            output_file.write(result)
+        splat_service.coverage_prediction(
+            test_coverage_request,
+            geotiff_path=output_path,
+            signal_path="splat_output.signal.tif",
+        )
         logger.info(f"GeoTIFF saved to: {output_path}")
 
     except Exception as e:
@@ -0,0 +1,356 @@
+import logging
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# "local" keeps results on a filesystem shared with GeoServer, "s3" in an S3 compatible bucket (e.g. MinIO)
+RESULT_STORE = os.getenv("RESULT_STORE", "local")
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", "/var/app/geoserver_data")
+GEOSERVER_RESULT_STORE_PATH = os.getenv("GEOSERVER_RESULT_STORE_PATH", "/opt/geoserver_data/data")
+
+S3_BUCKET = os.getenv("S3_BUCKET", "rf-site-planner")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://minio:9000, None for AWS
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+# Endpoint GeoServer reaches the bucket through, when it differs from the API's
+S3_GEOSERVER_ENDPOINT_URL = os.getenv("S3_GEOSERVER_ENDPOINT_URL", S3_ENDPOINT_URL)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def geotiff_name(task_id: str) -> str:
+    """Styled (palette) coverage GeoTIFF of a task."""
+    return f"{task_id}.geotiff"
+
+
+def signal_raster_name(task_id: str) -> str:
+    """Signal level (dBm) raster of a coverage, stored next to the styled GeoTIFF but not published."""
+    return f"{task_id}.signal.geotiff"
+
+
+def result_name(task_id: str) -> str:
+    """zstd compressed task result too large to be kept in Redis."""
+    return f"{task_id}.result.zst"
+
+
+def profile_name(task_id: str, artifact: str) -> str:
+    """Profiling artifact (pstats, collapsed stacks, SPLAT! output) of a profiled task."""
+    return f"{task_id}.profile.{artifact}"
+
+
+@dataclass
+class ResultInfo:
+    name: str
+    size: int
+    mtime: float
+
+
+class ResultStore(ABC):
+    """
+    Blob storage for task results (coverage rasters, large task payloads).
+
+    Writes are streamed (`open_write`, `staged`) and reads can be ranged (`read`, `iter_read`),
+    so neither side has to hold a whole raster in memory. Redis only keeps names pointing here.
+    """
+
+    @abstractmethod
+    @contextmanager
+    def open_write(self, name: str) -> Iterator[BinaryIO]:
+        """Writable binary file, the blob becomes visible atomically once the block exits cleanly."""
+
+    @abstractmethod
+    @contextmanager
+    def staged(self, name: str) -> Iterator[str]:
+        """Local path to write the blob to (e.g. with GDAL), stored once the block exits cleanly."""
+
+    @abstractmethod
+    def read(self, name: str, offset: int = 0, length: int = None) -> bytes:
+        """`length` bytes (all by default) from `offset`, FileNotFoundError if there is no such blob."""
+
+    @abstractmethod
+    def iter_read(
+        self, name: str, offset: int = 0, length: int = None, chunk_size: int = CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """Like `read`, in chunks of at most `chunk_size` bytes."""
+
+    @abstractmethod
+    def stat(self, name: str) -> Optional[ResultInfo]:
+        """Size and modification time of a blob, None if it doesn't exist."""
+
+    @abstractmethod
+    def delete(self, name: str) -> int:
+        """Delete a blob if it exists, returns the number of bytes freed."""
+
+    @abstractmethod
+    def list(self) -> Iterator[ResultInfo]:
+        """Every blob in the store."""
+
+    @abstractmethod
+    def gdal_path(self, name: str) -> str:
+        """Path GDAL / rasterio can open the blob with."""
+
+    @abstractmethod
+    def geoserver_url(self, name: str) -> str:
+        """Location of the blob as GeoServer sees it."""
+
+    def local_path(self, name: str) -> Optional[str]:
+        """Filesystem path of the blob if the store is a local directory, None otherwise."""
+        return None
+
+    def put(self, name: str, data: bytes) -> None:
+        with self.open_write(name) as blob:
+            blob.write(data)
+
+
+class LocalResultStore(ResultStore):
+    """Results in a local directory, mounted into GeoServer at `geoserver_root`."""
+
+    def __init__(self, root: str = RESULT_STORE_PATH, geoserver_root: str = GEOSERVER_RESULT_STORE_PATH):
+        self.root = root
+        self.geoserver_root = geoserver_root
+
+    @contextmanager
+    def open_write(self, name: str) -> Iterator[BinaryIO]:
+        path = self.local_path(name)
+        part_path = f"{path}.part"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with open(part_path, "wb") as blob:
+                yield blob
+            os.replace(part_path, path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    @contextmanager
+    def staged(self, name: str) -> Iterator[str]:
+        # writers already write next to the final path and rename, nothing left to copy
+        os.makedirs(self.root, exist_ok=True)
+        yield self.local_path(name)
+
+    def read(self, name: str, offset: int = 0, length: int = None) -> bytes:
+        with open(self.local_path(name), "rb") as blob:
+            blob.seek(offset)
+            return blob.read() if length is None else blob.read(length)
+
+    def iter_read(
+        self, name: str, offset: int = 0, length: int = None, chunk_size: int = CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        with open(self.local_path(name), "rb") as blob:
+            blob.seek(offset)
+            remaining = length
+            while remaining is None or remaining > 0:
+                chunk = blob.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def stat(self, name: str) -> Optional[ResultInfo]:
+        try:
+            stat = os.stat(self.local_path(name))
+        except FileNotFoundError:
+            return None
+        return ResultInfo(name, stat.st_size, stat.st_mtime)
+
+    def delete(self, name: str) -> int:
+        try:
+            size = os.path.getsize(self.local_path(name))
+            os.remove(self.local_path(name))
+            return size
+        except FileNotFoundError:
+            return 0
+
+    def list(self) -> Iterator[ResultInfo]:
+        if not os.path.isdir(self.root):
+            return
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.endswith(".part"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield ResultInfo(entry.name, stat.st_size, stat.st_mtime)
+
+    def local_path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def gdal_path(self, name: str) -> str:
+        return self.local_path(name)
+
+    def geoserver_url(self, name: str) -> str:
+        return f"{self.geoserver_root}/{name}"
+
+
+class _S3MultipartWriter:
+    """File-like writer uploading to S3 in `part_size` multipart chunks as data comes in."""
+
+    def __init__(self, client, bucket: str, key: str, part_size: int):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+
+    def write(self, data) -> int:
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+        return len(data)
+
+    def complete(self) -> None:
+        if self.buffer or not self.parts:
+            self._upload_part(bytes(self.buffer))
+            self.buffer.clear()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
+        )
+
+    def abort(self) -> None:
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+    def _upload_part(self, data: bytes) -> None:
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+
+class S3ResultStore(ResultStore):
+    """
+    Results in an S3 compatible bucket. GeoServer reads the coverages directly from the bucket
+    as Cloud Optimized GeoTIFFs (cog:// URLs, needs the GeoServer COG extension), and so does
+    GDAL through /vsis3/, so API, workers and GeoServer don't need to share a filesystem.
+    """
+
+    def __init__(
+        self,
+        bucket: str = S3_BUCKET,
+        endpoint_url: str = S3_ENDPOINT_URL,
+        region: str = S3_REGION,
+        geoserver_endpoint_url: str = S3_GEOSERVER_ENDPOINT_URL,
+        part_size: int = 8 * 1024 * 1024,
+        max_pool_connections: int = 20,
+    ):
+        # only needed for this backend
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.geoserver_endpoint_url = geoserver_endpoint_url or endpoint_url
+        self.part_size = part_size
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=Config(max_pool_connections=max_pool_connections),
+        )
+
+        # GDAL (rasterio) reads /vsis3/ paths with its own client, configured through the environment
+        os.environ.setdefault("AWS_REGION", region)
+        if endpoint_url:
+            endpoint = urlsplit(endpoint_url)
+            os.environ.setdefault("AWS_S3_ENDPOINT", endpoint.netloc)
+            os.environ.setdefault("AWS_HTTPS", "YES" if endpoint.scheme == "https" else "NO")
+            os.environ.setdefault("AWS_VIRTUAL_HOSTING", "FALSE")
+
+    @contextmanager
+    def open_write(self, name: str) -> Iterator[BinaryIO]:
+        writer = _S3MultipartWriter(self.client, self.bucket, name, self.part_size)
+        try:
+            yield writer
+        except BaseException:
+            writer.abort()
+            raise
+        writer.complete()
+
+    @contextmanager
+    def staged(self, name: str) -> Iterator[str]:
+        tmp_dir = tempfile.mkdtemp(prefix="result-")
+        path = os.path.join(tmp_dir, name)
+        try:
+            yield path
+            # boto3 streams the file in multipart chunks
+            self.client.upload_file(path, self.bucket, name)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def read(self, name: str, offset: int = 0, length: int = None) -> bytes:
+        return b"".join(self.iter_read(name, offset, length))
+
+    def iter_read(
+        self, name: str, offset: int = 0, length: int = None, chunk_size: int = CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        kwargs = {}
+        if offset or length is not None:
+            end = "" if length is None else offset + length - 1
+            kwargs["Range"] = f"bytes={offset}-{end}"
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=name, **kwargs)
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(name)
+        yield from response["Body"].iter_chunks(chunk_size)
+
+    def stat(self, name: str) -> Optional[ResultInfo]:
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return ResultInfo(name, response["ContentLength"], response["LastModified"].timestamp())
+
+    def delete(self, name: str) -> int:
+        info = self.stat(name)
+        if info is None:
+            return 0
+        self.client.delete_object(Bucket=self.bucket, Key=name)
+        return info.size
+
+    def list(self) -> Iterator[ResultInfo]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket):
+            for item in page.get("Contents", []):
+                yield ResultInfo(item["Key"], item["Size"], item["LastModified"].timestamp())
+
+    def gdal_path(self, name: str) -> str:
+        return f"/vsis3/{self.bucket}/{name}"
+
+    def geoserver_url(self, name: str) -> str:
+        return f"cog://{self.geoserver_endpoint_url}/{self.bucket}/{name}"
+
+
+def create_result_store(kind: str = None) -> ResultStore:
+    """Result store selected with the RESULT_STORE environment variable."""
+    kind = kind or RESULT_STORE
+    if kind == "local":
+        return LocalResultStore()
+    if kind == "s3":
+        return S3ResultStore()
+    raise ValueError(f"Unsupported result store '{kind}'.")
+
+
+result_store = create_result_store()
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+import zstandard
+from redis import StrictRedis
+from redis.asyncio import StrictRedis as AsyncStrictRedis
+
+from services.storage import ResultStore, result_name
+
+logger = logging.getLogger(__name__)
+
+TASK_TTL_S = 3600
+FINAL_STATUSES = ("completed", "failed")
+
+# Results above this size are zstd compressed into their own key instead of the task hash
+RESULT_INLINE_MAX_BYTES = int(os.getenv("TASK_RESULT_INLINE_MAX_BYTES", "1024"))
+RESULT_ZSTD_LEVEL = 3
+
+# zstandard (de)compressors must not be used by two threads at once, results are stored from every job worker
+_zstd = threading.local()
+
+
+def _compressor() -> zstandard.ZstdCompressor:
+    if not hasattr(_zstd, "compressor"):
+        _zstd.compressor = zstandard.ZstdCompressor(level=RESULT_ZSTD_LEVEL)
+    return _zstd.compressor
+
+
+def _decompressor() -> zstandard.ZstdDecompressor:
+    if not hasattr(_zstd, "decompressor"):
+        _zstd.decompressor = zstandard.ZstdDecompressor()
+    return _zstd.decompressor
+
+
+def task_key(task_id: str) -> str:
+    """Redis hash holding status, timestamps, timings and the (reference to the) result of a task."""
+    return f"{task_id}:task"
+
+
+def result_key(task_id: str) -> str:
+    """Redis key of a zstd compressed result too large to be kept in the task hash."""
+    return f"{task_id}:result"
+
+
+def task_channel(task_id: str) -> str:
+    """Redis pub/sub channel announcing status changes of a task."""
+    return f"task:{task_id}"
+
+
+class TaskStore:
+    """
+    Task records in Redis, expiring after TASK_TTL_S.
+
+    A task is one hash (`task_key`) with its status, created/updated/finished timestamps, stage
+    timings and either the result itself or, above RESULT_INLINE_MAX_BYTES, a reference to a
+    zstd compressed copy in `result_key`. With a `result_store` that copy is written to the blob
+    store instead (`result_blob`), so Redis only holds metadata and pointers. Every write is a
+    single MULTI pipeline. A read is one Redis round-trip, plus a second one for a result kept
+    in `result_key` or a blob store fetch for a result kept in `result_blob`.
+
+    Every status change is also published on `task_channel(task_id)`, so any API worker can
+    push it to clients waiting on a long-poll, SSE or WebSocket stream instead of being polled.
+
+    `redis_client` is used from the background workers, `async_redis_client` from request
+    handlers (the `*_async` methods), so Redis round-trips never block the event loop.
+    """
+
+    def __init__(
+        self,
+        redis_client: StrictRedis,
+        async_redis_client: AsyncStrictRedis,
+        pubsub_redis_client: AsyncStrictRedis = None,
+        result_store: ResultStore = None,
+    ):
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self.pubsub_redis_client = pubsub_redis_client or async_redis_client
+        self.result_store = result_store
+
+    def set_processing(self, task_id: str) -> None:
+        self._set_status(task_id, "processing")
+
+    def set_completed(self, task_id: str, data=None, timings: Dict[str, Any] = None) -> None:
+        self._set_status(task_id, "completed", data=data, timings=timings)
+
+    def set_failed(self, task_id: str, error: str, timings: Dict[str, Any] = None) -> None:
+        self._set_status(task_id, "failed", fields={"error": error}, timings=timings)
+
+    async def set_processing_async(self, task_id: str) -> None:
+        """`set_processing` for request handlers, without blocking the event loop."""
+        pipe = self.async_redis_client.pipeline()
+        self._queue_status(pipe, task_id, "processing")
+        await pipe.execute()
+
+    def get(self, task_id: str) -> Optional[Dict[str, str]]:
+        """The `/task/{task_id}` response of a task, None if it doesn't exist (anymore)."""
+        task = self.redis_client.hgetall(task_key(task_id))
+        result = None
+        # most polls are of unfinished or small results, only fetch a result stored elsewhere
+        if b"result_ref" in task:
+            result = self.redis_client.get(result_key(task_id))
+        elif b"result_blob" in task:
+            result = self._read_result_blob(task[b"result_blob"].decode("utf-8"))
+        return self._content(task, result)
+
+    async def get_async(self, task_id: str) -> Optional[Dict[str, str]]:
+        task = await self.async_redis_client.hgetall(task_key(task_id))
+        result = None
+        if b"result_ref" in task:
+            result = await self.async_redis_client.get(result_key(task_id))
+        elif b"result_blob" in task:
+            result = await asyncio.to_thread(
+                self._read_result_blob, task[b"result_blob"].decode("utf-8")
+            )
+        return self._content(task, result)
+
+    async def wait(self, task_id: str, timeout: float) -> Optional[Dict[str, str]]:
+        """The task once it is completed or failed, or as it is after `timeout` seconds."""
+
+        async def finished():
+            async for content in self.stream([task_id]):
+                if content["status"] in FINAL_STATUSES or content["status"] == "not_found":
+                    return content
+
+        try:
+            content = await asyncio.wait_for(finished(), timeout)
+            if content["status"] != "not_found":
+                content.pop("task_id")
+                return content
+        except asyncio.TimeoutError:
+            pass
+        return await self.get_async(task_id)
+
+    async def stream(
+        self, task_ids: Iterable[str], heartbeat_s: float = None
+    ) -> AsyncIterator[Optional[Dict[str, str]]]:
+        """
+        Yield the current state of every task and then each status change, until all tasks
+        are completed, failed or unknown. Unknown tasks are yielded as {"task_id", "status": "not_found"}.
+        With `heartbeat_s`, None is yielded whenever nothing happened for that long.
+        """
+        task_ids = list(dict.fromkeys(task_ids))
+        pending = set(task_ids)
+
+        async with self.pubsub_redis_client.pubsub() as pubsub:
+            # subscribe before reading the current state so no change is missed in between
+            await pubsub.subscribe(*[task_channel(task_id) for task_id in task_ids])
+
+            for task_id in task_ids:
+                content = await self.get_async(task_id)
+                if content is None:
+                    pending.discard(task_id)
+                    yield {"task_id": task_id, "status": "not_found"}
+                    continue
+                if content["status"] in FINAL_STATUSES:
+                    pending.discard(task_id)
+                yield {"task_id": task_id, **content}
+
+            loop = asyncio.get_running_loop()
+            last_yield = loop.time()
+            while pending:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=heartbeat_s
+                )
+                if message is None:
+                    # also returned for skipped subscribe confirmations
+                    if heartbeat_s is not None and loop.time() - last_yield >= heartbeat_s:
+                        last_yield = loop.time()
+                        yield None
+                    continue
+                task_id = message["channel"].decode("utf-8").split(":", 1)[1]
+                if task_id not in pending:
+                    continue
+
+                content = await self.get_async(task_id)
+                if content is None:
+                    continue
+                if content["status"] in FINAL_STATUSES:
+                    pending.discard(task_id)
+                last_yield = loop.time()
+                yield {"task_id": task_id, **content}
+
+    def _set_status(
+        self,
+        task_id: str,
+        status: str,
+        fields: Dict[str, str] = None,
+        data=None,
+        timings: Dict[str, Any] = None,
+    ) -> None:
+        pipe = self.redis_client.pipeline()
+        self._queue_status(pipe, task_id, status, fields, data, timings)
+        pipe.execute()
+
+    def _queue_status(
+        self,
+        pipe,
+        task_id: str,
+        status: str,
+        fields: Dict[str, str] = None,
+        data=None,
+        timings: Dict[str, Any] = None,
+    ) -> None:
+        now = time.time()
+        key = task_key(task_id)
+        values = {"status": status, "updated_at": now, **(fields or {})}
+        if status in FINAL_STATUSES:
+            values["finished_at"] = now
+        if timings:
+            values["timings"] = json.dumps(timings)
+
+        if data is not None:
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            if len(data) > RESULT_INLINE_MAX_BYTES and self.result_store is not None:
+                # written before the pointer is, so readers never see a dangling one
+                self.result_store.put(result_name(task_id), _compressor().compress(data))
+                values["result_blob"] = result_name(task_id)
+                values["result_size"] = len(data)
+            elif len(data) > RESULT_INLINE_MAX_BYTES:
+                pipe.setex(result_key(task_id), TASK_TTL_S, _compressor().compress(data))
+                values["result_ref"] = result_key(task_id)
+                values["result_size"] = len(data)
+            else:
+                values["data"] = data
+
+        pipe.hsetnx(key, "created_at", now)
+        pipe.hset(key, mapping=values)
+        pipe.expire(key, TASK_TTL_S)
+        pipe.publish(task_channel(task_id), json.dumps({"status": status}))
+
+    def _read_result_blob(self, name: str) -> Optional[bytes]:
+        if self.result_store is None:
+            return None
+        try:
+            return self.result_store.read(name)
+        except FileNotFoundError:
+            logger.warning(f"Result blob {name} is gone.")
+            return None
+
+    @staticmethod
+    def _content(task: Dict[bytes, bytes], result: Optional[bytes]) -> Optional[Dict[str, str]]:
+        if not task or b"status" not in task:
+            return None
+
+        status = task[b"status"].decode("utf-8")
+        content = {"status": status}
+        if status == "completed":
+            if (b"result_ref" in task or b"result_blob" in task) and result is not None:
+                data = _decompressor().decompress(result)
+            else:
+                data = task.get(b"data")
+            if data:
+                content["data"] = data.decode("utf-8")
+        elif status == "failed":
+            content["error"] = task.get(b"error", b"").decode("utf-8")
+        if b"timings" in task:
+            content["timings"] = json.loads(task[b"timings"])
+        return content
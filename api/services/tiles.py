@@ -0,0 +1,314 @@
+import io
+import logging
+import math
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import rasterio
+from PIL import Image
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.errors import RasterioIOError
+from rasterio.transform import from_bounds
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import transform_bounds
+from rasterio.windows import Window
+from rasterio.windows import from_bounds as window_from_bounds
+from services.metrics import XYZ_TILE_CACHE
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+MAX_ZOOM = 22
+
+# Half the circumference of the earth in EPSG:3857 meters
+WEB_MERCATOR_ORIGIN = 20037508.342789244
+WEB_MERCATOR_MAX_LAT = 85.0511287798066
+WEB_MERCATOR_CRS = CRS.from_epsg(3857)
+
+
+class CoverageTiles:
+    """
+    Renders XYZ (Web Mercator) PNG tiles straight from the published coverage GeoTIFFs.
+
+    Rendered tiles are kept in an on-disk cache which is evicted least recently used
+    first once it grows over `cache_size_mb`. Coverage results never change once
+    published, but they are deleted after their retention period, so clients may only
+    cache a tile for COVERAGE_CACHE_MAX_AGE_S (see COVERAGE_CACHE_CONTROL in main).
+    """
+
+    def __init__(
+        self,
+        geotiff_path,
+        cache_dir: str = ".coverage_tiles",
+        cache_size_mb: int = 1024,
+        render_threads: int = 4,
+        prerender_threads: int = 1,
+        prerender_max_zoom: int = 9,
+    ):
+        self.geotiff_path = geotiff_path  # task_id -> GeoTIFF path GDAL can open (local or /vsis3/)
+        self.cache_dir = os.path.join(os.getcwd(), cache_dir)
+        self.cache_size = cache_size_mb * 1024 * 1024
+        self.prerender_max_zoom = prerender_max_zoom
+        self.executor = ThreadPoolExecutor(
+            max_workers=render_threads, thread_name_prefix="tile-render"
+        )
+        # pre-rendering gets its own pool so on-demand tiles never queue behind a whole pyramid
+        self.prerender_executor = ThreadPoolExecutor(
+            max_workers=prerender_threads, thread_name_prefix="tile-prerender"
+        )
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._cache_lock = threading.Lock()
+        self._evicting = False
+        self._cache_bytes = self._scan_cache_size()
+        logger.info(
+            f"Using coverage tile cache directory: {self.cache_dir} ({self._cache_bytes} bytes)"
+        )
+
+        self._empty_tile = self._encode_png(
+            np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8), {}, 0
+        )
+
+    def submit(self, task_id: str, z: int, x: int, y: int) -> Future:
+        """Schedule `get_tile` on the render thread pool."""
+        return self.executor.submit(self.get_tile, task_id, z, x, y)
+
+    def get_tile(self, task_id: str, z: int, x: int, y: int) -> Optional[bytes]:
+        """PNG tile of a coverage, from the cache or freshly rendered. None if the coverage doesn't exist."""
+        self._check_task_id(task_id)
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z):
+            raise ValueError(f"Invalid tile {z}/{x}/{y}")
+
+        path = self._tile_path(task_id, z, x, y)
+        try:
+            with open(path, "rb") as tile_file:
+                tile = tile_file.read()
+            os.utime(path)  # LRU bookkeeping
+            XYZ_TILE_CACHE.labels("hit").inc()
+            return tile
+        except FileNotFoundError:
+            pass
+
+        XYZ_TILE_CACHE.labels("miss").inc()
+        tile = self.render_tile(task_id, z, x, y)
+        if tile is not None:
+            self._store(path, tile)
+        return tile
+
+    def render_tile(self, task_id: str, z: int, x: int, y: int) -> Optional[bytes]:
+        west, south, east, north = self._tile_bounds(z, x, y)
+
+        try:
+            src = rasterio.open(self.geotiff_path(task_id))
+        except RasterioIOError:
+            # no such coverage, checked by opening it as the raster may not be on a local disk
+            return None
+
+        with src:
+            nodata = int(src.nodata) if src.nodata is not None else 255
+            src_bounds = transform_bounds(
+                src.crs, WEB_MERCATOR_CRS, *src.bounds, densify_pts=21
+            )
+            if (
+                src_bounds[0] >= east
+                or src_bounds[2] <= west
+                or src_bounds[1] >= north
+                or src_bounds[3] <= south
+            ):
+                return self._empty_tile
+
+            if src.crs == WEB_MERCATOR_CRS:
+                # pre-warped coverage (COVERAGE_OUTPUT_CRS), a plain windowed read is enough
+                index = self._read_mercator_window(src, west, south, east, north, nodata)
+                colormap = src.colormap(1) if src.count == 1 else {}
+                return self._encode_png(index, colormap, nodata)
+
+            # only the source blocks (or overview level) under the tile are read
+            with WarpedVRT(
+                src,
+                crs=WEB_MERCATOR_CRS,
+                transform=from_bounds(west, south, east, north, TILE_SIZE, TILE_SIZE),
+                width=TILE_SIZE,
+                height=TILE_SIZE,
+                resampling=Resampling.nearest,
+                nodata=nodata,
+            ) as vrt:
+                index = vrt.read(1)
+
+            colormap = src.colormap(1) if src.count == 1 else {}
+
+        return self._encode_png(index, colormap, nodata)
+
+    def prerender(self, task_id: str) -> None:
+        """Render the low zoom tiles of a freshly published coverage in the background."""
+        try:
+            with rasterio.open(self.geotiff_path(task_id)) as src:
+                bounds = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
+        except Exception as e:
+            # tiles are still rendered on request, a coverage is never failed because of this
+            logger.error(f"Could not pre-render tiles for coverage {task_id}: {e}")
+            return
+
+        count = 0
+        for z in range(self.prerender_max_zoom + 1):
+            for x, y in self._tiles_for_bounds(bounds, z):
+                self.prerender_executor.submit(self.get_tile, task_id, z, x, y)
+                count += 1
+        logger.info(f"Scheduled pre-rendering of {count} tiles for coverage {task_id}.")
+
+    def remove(self, task_id: str) -> int:
+        """Drop the cached tiles of a coverage, returns the number of bytes freed."""
+        self._check_task_id(task_id)
+        task_dir = os.path.join(self.cache_dir, task_id)
+        size = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(task_dir)
+            for name in files
+        )
+        shutil.rmtree(task_dir, ignore_errors=True)
+        with self._cache_lock:
+            self._cache_bytes = max(0, self._cache_bytes - size)
+        return size
+
+    @staticmethod
+    def _read_mercator_window(src, west, south, east, north, nodata: int) -> np.ndarray:
+        """Tile of an EPSG:3857 dataset, read from the window under the tile (or an overview)."""
+        tile = np.full((TILE_SIZE, TILE_SIZE), nodata, dtype=np.uint8)
+
+        window = window_from_bounds(west, south, east, north, src.transform)
+        scale_x = TILE_SIZE / window.width
+        scale_y = TILE_SIZE / window.height
+
+        # part of the tile covered by the dataset, in source and in tile pixels
+        col_min = max(window.col_off, 0)
+        col_max = min(window.col_off + window.width, src.width)
+        row_min = max(window.row_off, 0)
+        row_max = min(window.row_off + window.height, src.height)
+        x_min = int(round((col_min - window.col_off) * scale_x))
+        x_max = int(round((col_max - window.col_off) * scale_x))
+        y_min = int(round((row_min - window.row_off) * scale_y))
+        y_max = int(round((row_max - window.row_off) * scale_y))
+        if x_max <= x_min or y_max <= y_min:
+            return tile
+
+        tile[y_min:y_max, x_min:x_max] = src.read(
+            1,
+            window=Window(col_min, row_min, col_max - col_min, row_max - row_min),
+            out_shape=(y_max - y_min, x_max - x_min),
+            resampling=Resampling.nearest,
+        )
+        return tile
+
+    @staticmethod
+    def _encode_png(index: np.ndarray, colormap: Dict[int, tuple], nodata: int) -> bytes:
+        """Palette PNG with the NoData index fully transparent."""
+        img = Image.fromarray(index)  # becomes a "P" image with putpalette()
+        palette = np.zeros((256, 3), dtype=np.uint8)
+        for i, rgba in colormap.items():
+            palette[i] = rgba[:3]
+        img.putpalette(palette.tobytes())
+
+        with io.BytesIO() as buffer:
+            # zlib level 1 encodes about 5x faster than the default for ~8% larger tiles
+            img.save(buffer, format="PNG", transparency=nodata, compress_level=1)
+            return buffer.getvalue()
+
+    @staticmethod
+    def _tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+        """(west, south, east, north) of an XYZ tile in EPSG:3857 meters."""
+        size = 2 * WEB_MERCATOR_ORIGIN / 2**z
+        west = -WEB_MERCATOR_ORIGIN + x * size
+        north = WEB_MERCATOR_ORIGIN - y * size
+        return west, north - size, west + size, north
+
+    @staticmethod
+    def _tiles_for_bounds(
+        bounds: Tuple[float, float, float, float], z: int
+    ) -> Iterator[Tuple[int, int]]:
+        """XYZ tiles at zoom `z` covering (west, south, east, north) in degrees."""
+        n = 2**z
+
+        def tile_x(lon):
+            return min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+
+        def tile_y(lat):
+            lat = max(-WEB_MERCATOR_MAX_LAT, min(WEB_MERCATOR_MAX_LAT, lat))
+            lat_rad = math.radians(lat)
+            y = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
+            return min(n - 1, max(0, int(y)))
+
+        west, south, east, north = bounds
+        for x in range(tile_x(west), tile_x(east) + 1):
+            for y in range(tile_y(north), tile_y(south) + 1):
+                yield x, y
+
+    @staticmethod
+    def _check_task_id(task_id: str) -> None:
+        # task ids become cache directory names
+        if task_id in ("", ".", "..") or os.path.basename(task_id) != task_id:
+            raise ValueError(f"Invalid task id {task_id}")
+
+    def _tile_path(self, task_id: str, z: int, x: int, y: int) -> str:
+        return os.path.join(self.cache_dir, task_id, str(z), str(x), f"{y}.png")
+
+    def _store(self, path: str, tile: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part_path = f"{path}.{threading.get_ident()}.part"
+        with open(part_path, "wb") as tile_file:
+            tile_file.write(tile)
+        os.replace(part_path, path)
+
+        with self._cache_lock:
+            self._cache_bytes += len(tile)
+            evict = self._cache_bytes > self.cache_size and not self._evicting
+            if evict:
+                self._evicting = True
+        if evict:
+            self.executor.submit(self._evict)
+
+    def _evict(self) -> None:
+        """Delete least recently used tiles until the cache is back under 90% of its size."""
+        try:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+
+            entries.sort()
+            target = int(self.cache_size * 0.9)
+            removed = 0
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+
+            logger.info(f"Evicted {removed} tiles from the coverage tile cache.")
+            with self._cache_lock:
+                self._cache_bytes = total
+        finally:
+            with self._cache_lock:
+                self._evicting = False
+
+    def _scan_cache_size(self) -> int:
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(self.cache_dir)
+            for name in files
+        )
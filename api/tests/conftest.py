@@ -0,0 +1,19 @@
+"""
+Fixtures of the API unit tests
+
+Like the benchmarks the tests are hermetic: they need neither the SPLAT! binaries, Redis nor a GeoServer.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.storage import LocalResultStore  # noqa: E402
+
+
+@pytest.fixture
+def result_store(tmp_path):
+    return LocalResultStore(root=str(tmp_path / "results"), geoserver_root="/var/app/results")
@@ -0,0 +1,73 @@
+import threading
+import time
+import uuid
+
+import pytest
+from services import profiling as profiling_module
+from services.profiling import JobProfile, profiling
+from services.storage import profile_name
+
+
+def busy_job(seconds: float) -> int:
+    total, deadline = 0, time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        total += sum(range(100))
+    return total
+
+
+def test_concurrent_profiled_jobs_complete(result_store):
+    task_ids = [str(uuid.uuid4()) for _ in range(2)]
+    profiles = [JobProfile(sample_interval_s=0.001) for _ in task_ids]
+    errors = []
+    both_running = threading.Barrier(2)
+
+    def run(task_id, profile):
+        try:
+            with profiling(profile, task_id, result_store):
+                both_running.wait(timeout=5)
+                busy_job(0.2)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=pair) for pair in zip(task_ids, profiles)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # cProfile went to one job, both have their own sampled stacks
+    assert sum(profile.profiler is not None for profile in profiles) == 1
+    for task_id, profile in zip(task_ids, profiles):
+        assert "busy_job" in profile.sampler.collapsed()
+        assert set(profile.stored) == ({"pstats"} if profile.profiler else set()) | {"collapsed", "splat"}
+        assert result_store.stat(profile_name(task_id, "collapsed")) is not None
+
+    # the lock is free again for the next profiled job
+    profile = JobProfile()
+    with profile.running():
+        busy_job(0.01)
+    assert profile.profiler is not None
+
+
+def test_unavailable_cprofile_does_not_fail_job(result_store, monkeypatch):
+    class ActiveProfiler:
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(profiling_module.cProfile, "Profile", ActiveProfiler)
+    profile = JobProfile(sample_interval_s=0.001)
+    with profiling(profile, str(uuid.uuid4()), result_store):
+        busy_job(0.05)
+
+    assert profile.profiler is None
+    assert profile.stored == ["collapsed", "splat"]
+    assert not profiling_module._cprofile_lock.locked()
+
+
+def test_failed_job_still_stores_profile(result_store):
+    task_id = str(uuid.uuid4())
+    with pytest.raises(RuntimeError):
+        with profiling(JobProfile(), task_id, result_store):
+            raise RuntimeError("SPLAT! failed")
+    assert result_store.stat(profile_name(task_id, "pstats")) is not None
@@ -0,0 +1,71 @@
+import io
+import os
+
+import numpy as np
+import pytest
+import rasterio
+from services.splat import Splat
+
+KML_PATH = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures", "output.kml")
+
+COLORMAP = "rainbow"
+MIN_DBM = -130
+MAX_DBM = -30
+
+
+def write_ppm(path, rgb):
+    height, width = rgb.shape[:2]
+    with open(path, "wb") as ppm_file:
+        ppm_file.write(f"P6\n{width} {height}\n255\n".encode("ascii"))
+        ppm_file.write(np.ascontiguousarray(rgb, dtype=np.uint8).tobytes())
+
+
+@pytest.fixture
+def coverage(tmp_path):
+    """Palette and signal GeoTIFFs built from a SPLAT!-like -dbm PPM, as a coverage job writes them."""
+    levels, rgb_colors = Splat._splat_dcf_levels(COLORMAP, MIN_DBM, MAX_DBM)
+    size = 400
+    yy, xx = np.ogrid[0:size, 0:size]
+    distance = np.hypot(yy - size / 2, xx - size / 2) / (size / 2)
+    noise = np.random.default_rng(1).normal(0, 4, (size, size))
+    dbm = MAX_DBM - distance * 140 + noise
+    rgb = np.full((size, size, 3), 255, dtype=np.uint8)
+    for level, color in zip(levels[::-1], rgb_colors[::-1]):
+        rgb[dbm >= level] = color
+
+    ppm_path = str(tmp_path / "output.ppm")
+    write_ppm(ppm_path, rgb)
+    with open(KML_PATH, "rb") as kml_file:
+        kml = kml_file.read()
+
+    geotiff = Splat._create_splat_geotiff(ppm_path, kml, COLORMAP, MIN_DBM, MAX_DBM)
+    signal = Splat._create_splat_signal_geotiff(ppm_path, kml, COLORMAP, MIN_DBM, MAX_DBM)
+    return geotiff, signal
+
+
+def read_palette(geotiff):
+    with rasterio.open(io.BytesIO(geotiff)) as src:
+        return src.read(1), src.colormap(1), src.nodata
+
+
+def test_restyle_with_same_parameters_is_identical(coverage):
+    geotiff, signal = coverage
+    restyled = Splat.restyle_coverage(signal, COLORMAP, MIN_DBM, MAX_DBM)
+
+    index, colormap, nodata = read_palette(geotiff)
+    restyled_index, restyled_colormap, restyled_nodata = read_palette(restyled["geotiff"])
+    assert np.array_equal(index, restyled_index)
+    assert colormap == restyled_colormap
+    assert nodata == restyled_nodata
+    # the coverage is neither empty nor all signal
+    assert 0 < np.count_nonzero(index == nodata) < index.size
+
+
+def test_restyle_offset_shifts_index(coverage):
+    geotiff, signal = coverage
+    restyled = Splat.restyle_coverage(signal, offset_db=10)
+
+    index, _, nodata = read_palette(geotiff)
+    restyled_index, _, _ = read_palette(restyled["geotiff"])
+    covered = (index != nodata) & (restyled_index != nodata)
+    assert np.all(restyled_index[covered] >= index[covered])
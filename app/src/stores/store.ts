@@ -5,6 +5,7 @@ import type {
 	CenterNodeSimulatorSite,
 	CoverageSimulatorPayload,
 	CoverageSimulatorSite,
+	CoverageWmsLayer,
 	LosSimulatorPayload,
 	LosSimulatorResponse,
 	LosSimulatorResponseUpdated,
@@ -90,34 +91,67 @@ const useStore = defineStore("store", {
 			intervalTime = 2000,
 		): Promise<{ status: string; data: string }> {
 			return new Promise((resolve, reject) => {
-				try {
-					const interval = setInterval(async () => {
-						const res = await fetch(
-							`${import.meta.env.VITE_API_URL}/task/${taskId}`,
-						);
+				const poll = () => {
+					try {
+						const interval = setInterval(async () => {
+							const res = await fetch(
+								`${import.meta.env.VITE_API_URL}/task/${taskId}`,
+							);
 
-						if (!res.ok) throw new Error("Error fetching task status");
+							if (!res.ok) throw new Error("Error fetching task status");
 
-						const data = await res.json();
+							const data = await res.json();
 
-						switch (data.status) {
-							case "completed":
-								clearInterval(interval);
-								resolve(data);
-								break;
-							case "failed":
-								clearInterval(interval);
-								reject(new Error("Task failed"));
-								break;
-						}
-					}, intervalTime);
-				} catch (error) {
-					reject(error);
+							switch (data.status) {
+								case "completed":
+									clearInterval(interval);
+									resolve(data);
+									break;
+								case "failed":
+									clearInterval(interval);
+									reject(new Error("Task failed"));
+									break;
+							}
+						}, intervalTime);
+					} catch (error) {
+						reject(error);
+					}
+				};
+
+				if (typeof EventSource === "undefined") {
+					poll();
+					return;
 				}
+
+				// The API pushes status changes, polling is only the fallback
+				const events = new EventSource(
+					`${import.meta.env.VITE_API_URL}/tasks/events?task_id=${taskId}`,
+				);
+				events.addEventListener("status", (event) => {
+					const data = JSON.parse((event as MessageEvent).data);
+
+					switch (data.status) {
+						case "completed":
+							events.close();
+							resolve(data);
+							break;
+						case "failed":
+						case "not_found":
+							events.close();
+							reject(new Error("Task failed"));
+							break;
+					}
+				});
+				events.onerror = () => {
+					events.close();
+					poll();
+				};
 			});
 		},
-		getMapWmsUrl(taskId: string): string {
-			return `${import.meta.env.VITE_GEOSERVER_URL}/RF-SITE-PLANNER/wms?service=WMS&version=1.1.0&transparent=true&request=GetMap&layers=RF-SITE-PLANNER:${taskId}&bbox={bbox-epsg-3857}&width=256&height=256&srs=EPSG:3857&format=image/png`;
+		getMapWmsUrl(taskId: string, wms?: CoverageWmsLayer): string {
+			const layers = wms?.layers ?? `RF-SITE-PLANNER:${taskId}`;
+			const cqlFilter = wms?.cql_filter ? `&CQL_FILTER=${encodeURIComponent(wms.cql_filter)}` : "";
+			return `${import.meta.env.VITE_GEOSERVER_URL}/RF-SITE-PLANNER/wms?service=WMS&version=1.1.0&transparent=true&request=GetMap&layers=${layers}${cqlFilter}&bbox={bbox-epsg-3857}&width=256&height=256&srs=EPSG:3857&format=image/png`;
 		},
 		deleteCoverageSimulation(taskId: string) {
 			return fetch(`${import.meta.env.VITE_API_URL}/coverage/${taskId}`, {
@@ -98,11 +98,17 @@ export type CoverageSimulatorPayload = {
 	itm_mode: boolean;
 };
 
+export type CoverageWmsLayer = {
+	layers: string;
+	cql_filter?: string;
+};
+
 export type CoverageSimulatorSite = CoverageSimulatorPayload & {
 	id: string;
 	title: string;
 	opacity: number;
 	wmsUrl?: string;
+	taskId?: string;
 };
 
 export const climateOptions = ref([
@@ -0,0 +1,148 @@
+"""
+GeoServer publish mode benchmark
+
+CLI tool measuring how publish and delete latency evolve as the catalog fills up, for both GeoServer publish modes of the
+API: "store" (one coverage store and layer per task) and "mosaic" (one granule per task in a single ImageMosaic). Small
+synthetic coverages are published one after another and every `--checkpoint` publications the p50/p95 latency of the
+last batch and the duration of a WMS GetCapabilities request are reported. Afterwards all coverages are deleted again,
+reported the same way.
+
+Run it against a disposable GeoServer, it creates and deletes `--count` coverages in the RF-SITE-PLANNER workspace.
+
+Args:
+    --url (str): GeoServer base URL (default http://localhost:8081/geoserver).
+    --user / --password (str): GeoServer admin credentials (default GEOSERVER_ADMIN_USER / GEOSERVER_ADMIN_PASSWORD).
+    --data-dir (str): GeoServer data volume as seen from this machine (default geoserver.d/data).
+    --geoserver-data-dir (str): The same volume as seen by GeoServer (default /opt/geoserver_data/data).
+    --count (int): Coverages to publish per mode (default 10000).
+    --checkpoint (int): Report every this many coverages (default 1000).
+    --modes (str): Comma separated publish modes to benchmark (default store,mosaic).
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from uuid import uuid4
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from services.geoserver import GeoServerClient  # noqa: E402
+from services.splat import Splat  # noqa: E402
+from services.storage import LocalResultStore  # noqa: E402
+
+COVERAGE_SIZE = 64  # pixels, the catalog size is what is measured, not the raster size
+
+
+def write_coverage(path, rng):
+    """Small palette coverage somewhere in Slovenia, like the ones the API publishes."""
+    west = rng.uniform(13.5, 16.0)
+    south = rng.uniform(45.5, 46.5)
+    bounds = {"west": west, "south": south, "east": west + 0.1, "north": south + 0.1}
+    index = rng.integers(0, 256, (COVERAGE_SIZE, COVERAGE_SIZE), dtype=np.uint8)
+    Splat._write_palette_geotiff(index, bounds, "rainbow", -130, -30, 255, dst_path=path)
+
+
+def percentiles(times):
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    return statistics.median(times) * 1000, p95 * 1000
+
+
+def capabilities_time(wms_url):
+    start = time.perf_counter()
+    requests.get(wms_url, params={"service": "WMS", "request": "GetCapabilities"}, timeout=300)
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark_mode(args, mode):
+    client = GeoServerClient(
+        base_url=f"{args.url}/rest",
+        user=args.user,
+        password=args.password,
+        publish_mode=mode,
+        store=LocalResultStore(args.data_dir, args.geoserver_data_dir),
+        timeout=300,
+    )
+    client.initialise()
+    wms_url = f"{args.url}/RF-SITE-PLANNER/wms"
+    rng = np.random.default_rng(0)
+
+    print(f"\n### {mode}\n")
+    print("| Coverages | Publish p50 [ms] | Publish p95 [ms] | GetCapabilities [ms] |")
+    print("| --- | --- | --- | --- |")
+
+    task_ids = []
+    batch = []
+    for i in range(1, args.count + 1):
+        task_id = str(uuid4())
+        write_coverage(os.path.join(args.data_dir, f"{task_id}.geotiff"), rng)
+
+        start = time.perf_counter()
+        client.store_coverage(task_id)
+        batch.append(time.perf_counter() - start)
+        task_ids.append(task_id)
+
+        if i % args.checkpoint == 0 or i == args.count:
+            p50, p95 = percentiles(batch)
+            print(f"| {i} | {p50:.1f} | {p95:.1f} | {capabilities_time(wms_url):.0f} |", flush=True)
+            batch = []
+
+    print("")
+    print("| Coverages left | Delete p50 [ms] | Delete p95 [ms] |")
+    print("| --- | --- | --- |")
+
+    batch = []
+    for i, task_id in enumerate(task_ids, start=1):
+        start = time.perf_counter()
+        client.remove_coverage(task_id)
+        batch.append(time.perf_counter() - start)
+
+        path = os.path.join(args.data_dir, f"{task_id}.geotiff")
+        if os.path.exists(path):
+            os.remove(path)
+
+        if i % args.checkpoint == 0 or i == len(task_ids):
+            p50, p95 = percentiles(batch)
+            print(f"| {len(task_ids) - i} | {p50:.1f} | {p95:.1f} |", flush=True)
+            batch = []
+
+    print("")
+    print("| Operation | Calls | Errors | Mean [ms] | Max [ms] |")
+    print("| --- | --- | --- | --- | --- |")
+    for operation, stats in client.latency_stats().items():
+        print(
+            f"| {operation} | {stats['count']} | {stats['errors']} | {stats['mean_ms']:.1f} | {stats['max_ms']:.1f} |"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GeoServer publish modes")
+    parser.add_argument("--url", type=str, default="http://localhost:8081/geoserver", help="GeoServer base URL")
+    parser.add_argument("--user", type=str, default=os.getenv("GEOSERVER_ADMIN_USER"), help="GeoServer admin user")
+    parser.add_argument(
+        "--password", type=str, default=os.getenv("GEOSERVER_ADMIN_PASSWORD"), help="GeoServer admin password"
+    )
+    parser.add_argument("--data-dir", type=str, default="geoserver.d/data", help="Local path of the data volume")
+    parser.add_argument(
+        "--geoserver-data-dir", type=str, default="/opt/geoserver_data/data", help="GeoServer path of the data volume"
+    )
+    parser.add_argument("--count", type=int, default=10000, help="Coverages to publish per mode")
+    parser.add_argument("--checkpoint", type=int, default=1000, help="Report interval in coverages")
+    parser.add_argument("--modes", type=str, default="store,mosaic", help="Comma separated publish modes")
+    args = parser.parse_args()
+
+    logging.getLogger("services.splat").setLevel(logging.WARNING)
+    logging.getLogger("services.geoserver").setLevel(logging.WARNING)
+
+    for mode in args.modes.split(","):
+        benchmark_mode(args, mode)
+
+
+if __name__ == "__main__":
+    main()
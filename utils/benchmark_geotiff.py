@@ -0,0 +1,195 @@
+"""
+Coverage GeoTIFF format benchmark
+
+CLI tool comparing the legacy stripped GeoTIFF with Cloud Optimized GeoTIFF variants written by the API, in the native
+EPSG:4326 grid and pre-warped to EPSG:3857 (COVERAGE_OUTPUT_CRS). For every variant it reports the file size, the write
+time, the time to read a 256x256 tile at a low zoom (whole extent, served from overviews when present) and at native
+resolution, and the time to render Web Mercator XYZ tiles the way the tile endpoint does (reprojection included when the
+file is not in EPSG:3857). Optionally it also times EPSG:3857 WMS GetMap requests against layers already published in
+GeoServer.
+
+Args:
+    --ppm / --kml (str): SPLAT! output.ppm and output.kml to convert. Without them a synthetic coverage is used.
+    --size (int): Width and height in pixels of the synthetic coverage (default 3600).
+    --repeat (int): Number of timed repetitions (default 5).
+    --wms-url (str): GeoServer WMS endpoint, e.g. http://localhost:8082/geoserver/RF-SITE-PLANNER/wms.
+    --layers (str): Comma separated layer names to time with GetMap (e.g. legacy and COG copies of a coverage).
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from urllib.request import urlopen
+
+import numpy as np
+import rasterio
+from PIL import Image
+from rasterio.warp import transform_bounds
+from rasterio.windows import Window
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+import services.rasters as rasters_module  # noqa: E402
+from services.splat import Splat  # noqa: E402
+from services.tiles import CoverageTiles  # noqa: E402
+
+VARIANTS = [
+    ("gtiff (legacy, lzw)", {"format": "gtiff"}),
+    ("cog deflate 256", {"format": "cog", "compress": "deflate", "blocksize": 256}),
+    ("cog deflate 512", {"format": "cog", "compress": "deflate", "blocksize": 512}),
+    ("cog zstd 256", {"format": "cog", "compress": "zstd", "blocksize": 256}),
+    ("cog zstd 512", {"format": "cog", "compress": "zstd", "blocksize": 512}),
+    ("gtiff (legacy, lzw) EPSG:3857", {"format": "gtiff", "crs": "EPSG:3857"}),
+    ("cog deflate 256 EPSG:3857", {"format": "cog", "compress": "deflate", "blocksize": 256, "crs": "EPSG:3857"}),
+]
+
+# XYZ tiles rendered per variant: zoom levels from the whole coverage down to street level
+XYZ_ZOOMS = (8, 11, 14)
+
+
+def synthetic_coverage(size):
+    levels, rgb_colors = Splat._splat_dcf_levels("rainbow", -130, -30)
+    yy, xx = np.mgrid[0:size, 0:size]
+    noise = np.random.default_rng(0).normal(0, 4, (size, size))
+    dbm = -30 - np.hypot(yy - size / 2, xx - size / 2) / (size / 2) * 120 + noise
+
+    img = np.full((size, size, 3), 255, dtype=np.uint8)
+    for level, rgb in zip(levels[::-1], rgb_colors[::-1]):
+        img[dbm >= level] = rgb
+
+    with io.BytesIO() as buffer:
+        Image.fromarray(img).save(buffer, format="PPM")
+        ppm = buffer.getvalue()
+    kml = (
+        b'<?xml version="1.0"?><kml xmlns="http://earth.google.com/kml/2.1"><Folder><GroundOverlay>'
+        b"<LatLonBox><north>46.5</north><south>45.5</south><east>14.5</east><west>13.0</west></LatLonBox>"
+        b"</GroundOverlay></Folder></kml>"
+    )
+    return ppm, kml
+
+
+def timed(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times)
+
+
+def render_times(geotiff, repeat):
+    # the dataset is reopened every time so GDAL's block cache does not hide the decode cost
+    def low_zoom():
+        # the whole extent squeezed into one tile, overviews are used when present
+        with rasterio.open(io.BytesIO(geotiff)) as src:
+            return src.read(1, out_shape=(256, 256))
+
+    def native():
+        # one native resolution tile in the middle
+        with rasterio.open(io.BytesIO(geotiff)) as src:
+            return src.read(1, window=Window(src.width // 2, src.height // 2, 256, 256))
+
+    _, low = timed(low_zoom, repeat)
+    _, high = timed(native, repeat)
+    return low, high
+
+
+def xyz_times(geotiff, bounds, repeat):
+    """Median time to render the XYZ tile under the middle of the coverage at each of XYZ_ZOOMS."""
+    lon = (bounds["west"] + bounds["east"]) / 2
+    lat = (bounds["south"] + bounds["north"]) / 2
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "coverage.geotiff")
+        with open(path, "wb") as geotiff_file:
+            geotiff_file.write(geotiff)
+
+        tiles = CoverageTiles(lambda task_id: path, cache_dir=os.path.join(tmp_dir, "tiles"), render_threads=1)
+        results = {}
+        for z in XYZ_ZOOMS:
+            # render_tile() skips the tile cache
+            x, y = next(tiles._tiles_for_bounds((lon, lat, lon, lat), z))
+            _, results[z] = timed(lambda: tiles.render_tile("benchmark", z, x, y), repeat)
+        tiles.executor.shutdown()
+    return results
+
+
+def wms_times(wms_url, layer, repeat):
+    # the front end requests Web Mercator tiles
+    results = {}
+    for label, bbox in (
+        ("full", (13.0, 45.5, 14.5, 46.5)),
+        ("zoomed", (13.70, 45.95, 13.80, 46.05)),
+    ):
+        bbox = ",".join(str(v) for v in transform_bounds("EPSG:4326", "EPSG:3857", *bbox))
+        url = (
+            f"{wms_url}?service=WMS&version=1.1.0&request=GetMap&layers={layer}&bbox={bbox}"
+            "&width=256&height=256&srs=EPSG:3857&format=image/png&transparent=true"
+        )
+        _, results[label] = timed(lambda: urlopen(url, timeout=30).read(), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark coverage GeoTIFF formats")
+    parser.add_argument("--ppm", type=str, help="SPLAT! output.ppm")
+    parser.add_argument("--kml", type=str, help="SPLAT! output.kml")
+    parser.add_argument("--size", type=int, default=3600, help="Synthetic coverage size in pixels")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions")
+    parser.add_argument("--wms-url", type=str, help="GeoServer WMS endpoint")
+    parser.add_argument("--layers", type=str, help="Comma separated WMS layers to time")
+    args = parser.parse_args()
+
+    if args.ppm and args.kml:
+        with open(args.ppm, "rb") as ppm_file, open(args.kml, "rb") as kml_file:
+            ppm, kml = ppm_file.read(), kml_file.read()
+    else:
+        ppm, kml = synthetic_coverage(args.size)
+
+    with Image.open(io.BytesIO(ppm)) as img:
+        index = np.asarray(img.convert("L"))
+    bounds = Splat._parse_kml_bounds(kml)
+
+    xyz_header = " | ".join(f"XYZ z{z} [ms]" for z in XYZ_ZOOMS)
+    print(f"| Variant | Size [KiB] | Write [ms] | Low zoom tile [ms] | Native tile [ms] | {xyz_header} |")
+    print("| --- | --- | --- | --- | --- |" + " --- |" * len(XYZ_ZOOMS))
+    for label, variant in VARIANTS:
+        # same knobs as the GEOTIFF_COMPRESS / GEOTIFF_BLOCKSIZE environment variables
+        rasters_module.GEOTIFF_COMPRESS = variant.get("compress", rasters_module.GEOTIFF_COMPRESS)
+        rasters_module.GEOTIFF_BLOCKSIZE = variant.get("blocksize", rasters_module.GEOTIFF_BLOCKSIZE)
+
+        geotiff, write = timed(
+            lambda: Splat._write_palette_geotiff(
+                index,
+                bounds,
+                "rainbow",
+                -130,
+                -30,
+                255,
+                geotiff_format=variant["format"],
+                output_crs=variant.get("crs", "EPSG:4326"),
+            ),
+            args.repeat,
+        )
+        low, high = render_times(geotiff, args.repeat)
+        xyz = " | ".join(f"{t * 1000:.2f}" for t in xyz_times(geotiff, bounds, args.repeat).values())
+        print(
+            f"| {label} | {len(geotiff) / 1024:.0f} | {write * 1000:.1f} | {low * 1000:.2f} | {high * 1000:.2f} | {xyz} |"
+        )
+
+    if args.wms_url and args.layers:
+        print("")
+        print("| Layer | Full extent GetMap [ms] | Zoomed GetMap [ms] |")
+        print("| --- | --- | --- |")
+        for layer in args.layers.split(","):
+            times = wms_times(args.wms_url, layer, args.repeat)
+            print(f"| {layer} | {times['full'] * 1000:.1f} | {times['zoomed'] * 1000:.1f} |")
+
+
+if __name__ == "__main__":
+    main()
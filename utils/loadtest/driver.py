@@ -0,0 +1,275 @@
+"""
+End-to-end load test driver
+
+CLI tool submitting prediction jobs to the API as an open-loop Poisson arrival process at `--rate` jobs per second for
+`--duration` seconds, mixing job types by `--mix`, and following every job with `GET /task/{task_id}` polls until it
+completes or fails. Afterwards the throughput and the p50/p95/p99 latency are reported per endpoint (the HTTP requests
+themselves) and per job type (submit to final status), to size worker counts before a big planning event.
+
+Run it against an API using the fake SPLAT! binaries and stub servers of stubs.py (see README.md), or against a real
+deployment. Only the standard library is used, so one process generates hundreds of concurrent jobs.
+
+Args:
+    --url (str): API base URL (default http://localhost:8081).
+    --rate (float): Job arrivals per second (default 1).
+    --duration (float): Seconds to submit jobs for (default 60).
+    --mix (str): Job type weights, of los, los-hd, coverage and coverage-hd (default los=0.7,coverage=0.3).
+    --radius (str): Comma separated coverage radii in km, picked at random (default 10,25,50).
+    --poll-interval (float): Pause between the status polls of a job in seconds (default 0.5).
+    --poll-wait (float): Long-poll `?wait=` seconds of a status poll, 0 for plain polls (default 0).
+    --timeout (float): Seconds after which a job still running counts as timed out (default 600).
+    --seed (int): Random seed of arrivals, job types and sites (default 0).
+    --label (str): Label of the run in the report.
+    --json (str): Also write the report as JSON to this file.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+JOB_TYPES = {
+    # job type -> endpoint, high resolution
+    "los": ("/los", False),
+    "los-hd": ("/los", True),
+    "coverage": ("/coverage", False),
+    "coverage-hd": ("/coverage", True),
+}
+
+# Sites are picked around Ljubljana, like most planning requests
+CENTER = (46.05, 14.50)
+SPREAD_DEG = 0.5
+
+COMMON = {
+    "tx_height": 3.0,
+    "tx_power": 27.0,
+    "tx_gain": 5.0,
+    "tx_loss": 0,
+    "frequency_mhz": 869.525,
+    "rx_height": 1.5,
+    "rx_loss": 0,
+    "clutter_height": 1.0,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.requests = defaultdict(list)  # endpoint -> latencies
+        self.request_status = defaultdict(lambda: defaultdict(int))  # endpoint -> status -> count
+        self.jobs = defaultdict(list)  # job type -> submit to final status latencies
+        self.job_status = defaultdict(lambda: defaultdict(int))  # job type -> final status -> count
+
+    def request(self, endpoint, status, latency):
+        self.request_status[endpoint][status] += 1
+        if 200 <= status < 300:
+            self.requests[endpoint].append(latency)
+
+    def job(self, job_type, status, latency=None):
+        self.job_status[job_type][status] += 1
+        if latency is not None:
+            self.jobs[job_type].append(latency)
+
+
+async def http_request(host, port, method, path, body=None):
+    """One HTTP/1.1 request on its own connection, returns (status, body)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        writer.write(head.encode("ascii") + b"\r\n" + (body or b""))
+        await writer.drain()
+
+        headers = await reader.readuntil(b"\r\n\r\n")
+        status = int(headers.split(b" ", 2)[1])
+        length = None
+        for line in headers.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+        content = await (reader.readexactly(length) if length is not None else reader.read())
+        return status, content
+    finally:
+        writer.close()
+
+
+def payload(job_type, rng, radii):
+    _, high_resolution = JOB_TYPES[job_type]
+    lat = CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+    lon = CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+    if job_type.startswith("los"):
+        return {
+            **COMMON,
+            "tx_lat": lat,
+            "tx_lon": lon,
+            "rx_lat": lat + rng.uniform(-0.3, 0.3),
+            "rx_lon": lon + rng.uniform(-0.3, 0.3),
+            "high_resolution": high_resolution,
+        }
+    return {
+        **COMMON,
+        "lat": lat,
+        "lon": lon,
+        "radius": rng.choice(radii),
+        "min_dbm": -130,
+        "max_dbm": -80,
+        "high_resolution": high_resolution,
+    }
+
+
+async def run_job(args, host, port, job_type, body, recorder):
+    path, _ = JOB_TYPES[job_type]
+    start = time.perf_counter()
+    try:
+        status, content = await http_request(host, port, "POST", path, body)
+    except (OSError, asyncio.IncompleteReadError):
+        recorder.request(f"POST {path}", 0, None)
+        recorder.job(job_type, "error")
+        return
+    recorder.request(f"POST {path}", status, time.perf_counter() - start)
+    if status == 429:
+        recorder.job(job_type, "rejected")
+        return
+    if status != 200:
+        recorder.job(job_type, "error")
+        return
+
+    task_id = json.loads(content)["task_id"]
+    endpoint = "GET /task?wait" if args.poll_wait else "GET /task"
+    query = f"?wait={args.poll_wait:g}" if args.poll_wait else ""
+    deadline = start + args.timeout
+    while time.perf_counter() < deadline:
+        request_start = time.perf_counter()
+        try:
+            status, content = await http_request(host, port, "GET", f"/task/{task_id}{query}")
+        except (OSError, asyncio.IncompleteReadError):
+            recorder.request(endpoint, 0, None)
+            await asyncio.sleep(args.poll_interval)
+            continue
+        recorder.request(endpoint, status, time.perf_counter() - request_start)
+
+        if status == 200:
+            task_status = json.loads(content).get("status")
+            if task_status in ("completed", "failed"):
+                recorder.job(job_type, task_status, time.perf_counter() - start)
+                return
+        await asyncio.sleep(args.poll_interval)
+    recorder.job(job_type, "timeout")
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    rng = random.Random(args.seed)
+    mix = {}
+    for part in args.mix.split(","):
+        job_type, weight = part.split("=")
+        if job_type not in JOB_TYPES:
+            raise SystemExit(f"Unknown job type '{job_type}', use one of {', '.join(JOB_TYPES)}")
+        mix[job_type] = float(weight)
+    radii = [float(radius) for radius in args.radius.split(",")]
+
+    recorder = Recorder()
+    jobs = []
+    start = time.perf_counter()
+    next_arrival = start
+    while next_arrival < start + args.duration:
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        job_type = rng.choices(list(mix), weights=list(mix.values()))[0]
+        body = json.dumps(payload(job_type, rng, radii)).encode("utf-8")
+        jobs.append(asyncio.create_task(run_job(args, host, port, job_type, body, recorder)))
+        next_arrival += rng.expovariate(args.rate)
+
+    await asyncio.gather(*jobs)
+    return recorder, time.perf_counter() - start
+
+
+def percentiles(latencies):
+    if not latencies:
+        return None, None, None
+    if len(latencies) == 1:
+        return (latencies[0] * 1000,) * 3
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+def report(recorder, elapsed, label):
+    rows = {"label": label, "elapsed_s": elapsed, "endpoints": {}, "jobs": {}}
+    for endpoint, statuses in sorted(recorder.request_status.items()):
+        p50, p95, p99 = percentiles(recorder.requests[endpoint])
+        rows["endpoints"][endpoint] = {
+            "requests": sum(statuses.values()),
+            "statuses": dict(statuses),
+            "throughput_per_s": sum(statuses.values()) / elapsed,
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+        }
+    for job_type, statuses in sorted(recorder.job_status.items()):
+        p50, p95, p99 = percentiles(recorder.jobs[job_type])
+        rows["jobs"][job_type] = {
+            "jobs": sum(statuses.values()),
+            "statuses": dict(statuses),
+            "throughput_per_s": statuses.get("completed", 0) / elapsed,
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+        }
+    return rows
+
+
+def fmt(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_report(rows):
+    title = f" ({rows['label']})" if rows["label"] else ""
+    print(f"\n### Endpoints{title}, {rows['elapsed_s']:.0f} s\n")
+    print("| Endpoint | Requests | Statuses | Throughput [req/s] | p50 [ms] | p95 [ms] | p99 [ms] |")
+    print("| --- | --- | --- | --- | --- | --- | --- |")
+    for endpoint, row in rows["endpoints"].items():
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(row["statuses"].items()))
+        print(
+            f"| {endpoint} | {row['requests']} | {statuses} | {row['throughput_per_s']:.2f} | "
+            f"{fmt(row['p50_ms'])} | {fmt(row['p95_ms'])} | {fmt(row['p99_ms'])} |"
+        )
+
+    print(f"\n### Jobs{title}\n")
+    print("| Job type | Jobs | Final statuses | Completed [jobs/s] | p50 [ms] | p95 [ms] | p99 [ms] |")
+    print("| --- | --- | --- | --- | --- | --- | --- |")
+    for job_type, row in rows["jobs"].items():
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(row["statuses"].items()))
+        print(
+            f"| {job_type} | {row['jobs']} | {statuses} | {row['throughput_per_s']:.3f} | "
+            f"{fmt(row['p50_ms'])} | {fmt(row['p95_ms'])} | {fmt(row['p99_ms'])} |"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the prediction endpoints")
+    parser.add_argument("--url", type=str, default="http://localhost:8081", help="API base URL")
+    parser.add_argument("--rate", type=float, default=1, help="Job arrivals per second")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to submit jobs for")
+    parser.add_argument("--mix", type=str, default="los=0.7,coverage=0.3", help="Job type weights")
+    parser.add_argument("--radius", type=str, default="10,25,50", help="Coverage radii in km")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Pause between status polls")
+    parser.add_argument("--poll-wait", type=float, default=0, help="Long-poll seconds of a status poll")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds before a job counts as timed out")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--label", type=str, default="", help="Label of the run")
+    parser.add_argument("--json", type=str, help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    recorder, elapsed = asyncio.run(run(args))
+    rows = report(recorder, elapsed, args.label)
+    print_report(rows)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(rows, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Fake SPLAT! binaries for load tests
+
+Stands in for `splat`, `splat-hd`, `srtm2sdf` and `srtm2sdf-hd` (see `stubs.py --splat-dir`, which links it under those
+names). Called the way the API calls SPLAT!, it writes the files the API reads afterwards in the working directory:
+
+- line-of-sight (`-t tx.qth -r rx.qth`): tx-to-rx.txt and the profile, curvature, fresnel, fresnel_pt_6 and reference
+  .gp files, one row per terrain sample along the path (90 m, 30 m for splat-hd);
+- coverage (`-t tx.qth -R <km> -o output.ppm`): the -dbm output.ppm over the whole terrain mosaic (1200 pixels per
+  degree, 3600 for splat-hd) painted with the colours of splat.dcf, output.kml with the mosaic extent and the colour key
+  output-ck.ppm.
+
+Runtime is configured with environment variables, inherited from the API process:
+
+    FAKE_SPLAT_LOS_S (float): Runtime of a line-of-sight analysis in seconds (default 0.5).
+    FAKE_SPLAT_COVERAGE_S (float): Runtime of a 50 km coverage in seconds (default 5), it grows with the covered area.
+    FAKE_SPLAT_HD_FACTOR (float): Runtime multiplier of splat-hd (default 9, nine times the terrain samples).
+    FAKE_SPLAT_CPU (bool): Burn CPU instead of sleeping, like SPLAT! does (default false).
+"""
+
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+LOS_S = float(os.getenv("FAKE_SPLAT_LOS_S", "0.5"))
+COVERAGE_S = float(os.getenv("FAKE_SPLAT_COVERAGE_S", "5"))
+HD_FACTOR = float(os.getenv("FAKE_SPLAT_HD_FACTOR", "9"))
+BURN_CPU = os.getenv("FAKE_SPLAT_CPU", "false").lower() == "true"
+
+EARTH_RADIUS_KM = 6371.0
+STRIP_ROWS = 1024
+
+# SPLAT! options followed by a value, all others are switches
+VALUE_OPTIONS = {"-t", "-r", "-L", "-R", "-d", "-o", "-db", "-gc", "-f", "-H", "-m", "-erp"}
+
+
+def parse_args(argv):
+    options = {}
+    i = 0
+    while i < len(argv):
+        option = argv[i]
+        if option in VALUE_OPTIONS and i + 1 < len(argv):
+            options.setdefault(option, argv[i + 1])
+            i += 2
+        else:
+            options[option] = True
+            i += 1
+    return options
+
+
+def read_qth(path):
+    """Latitude and (east positive) longitude of a SPLAT! .qth file, which holds west longitudes."""
+    with open(path) as qth_file:
+        _, lat, west, _ = qth_file.read().splitlines()[:4]
+    west = float(west)
+    return float(lat), 360 - west if west >= 180 else -west
+
+
+def read_dcf(path):
+    """Signal levels (dBm, descending) and their RGB colours of a SPLAT! .dcf file."""
+    levels, colors = [], []
+    with open(path) as dcf_file:
+        for line in dcf_file:
+            if line.startswith(";") or ":" not in line:
+                continue
+            level, rgb = line.split(":", 1)
+            levels.append(int(level))
+            colors.append([int(value) for value in rgb.split(",")])
+    return np.array(levels), np.array(colors, dtype=np.uint8)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def spend(seconds):
+    if BURN_CPU:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            sum(range(10_000))
+    else:
+        time.sleep(seconds)
+
+
+def write_ppm(path, rgb):
+    height, width = rgb.shape[:2]
+    with open(path, "wb") as ppm_file:
+        ppm_file.write(f"P6\n{width} {height}\n255\n".encode("ascii"))
+        ppm_file.write(np.ascontiguousarray(rgb).tobytes())
+
+
+def line_of_sight(options, high_resolution):
+    tx_lat, tx_lon = read_qth(options["-t"])
+    rx_lat, rx_lon = read_qth(options["-r"])
+    frequency_mhz = float(str(options.get("-f", "868M")).rstrip("M"))
+    rng = np.random.default_rng(abs(hash((tx_lat, tx_lon, rx_lat, rx_lon))) % 2**32)
+
+    distance = max(distance_km(tx_lat, tx_lon, rx_lat, rx_lon), 0.1)
+    samples = max(2, int(distance * 1000 / (30 if high_resolution else 90)))
+    spend(LOS_S * (HD_FACTOR if high_resolution else 1))
+
+    d = np.linspace(0, distance, samples)
+    terrain = 300 + 250 * np.sin(d / distance * math.pi) + rng.normal(0, 8, samples).cumsum() / 5
+    curvature = d * (distance - d) / (2 * 8494.0) * 1000  # 4/3 earth radius bulge in m
+    reference = np.linspace(terrain[0] + 10, terrain[-1] + 2, samples)
+    fresnel_radius = 8.656 * np.sqrt(d * (distance - d) / (distance * frequency_mhz / 1000 + 1e-9) + 1e-9)
+    for name, values in (
+        ("profile", terrain),
+        ("curvature", terrain + curvature),
+        ("fresnel", reference - fresnel_radius),
+        ("fresnel_pt_6", reference - 0.6 * fresnel_radius),
+        ("reference", reference),
+    ):
+        with open(f"{name}.gp", "w") as gp_file:
+            gp_file.writelines(f"{x:.6f}\t{y:.6f}\n" for x, y in zip(d, values))
+
+    free_space = 32.44 + 20 * math.log10(distance) + 20 * math.log10(frequency_mhz)
+    path_loss = free_space + float(rng.uniform(0, 40))
+    obstructed = bool(np.any(terrain + curvature > reference))
+    lines = [
+        "\n\t\t--==[ SPLAT! v1.4.2 Path Analysis ]==--\n",
+        "Transmitter site: tx",
+        f"Distance to rx: {distance:.2f} kilometers",
+        "",
+        "Summary For The Link Between tx and rx:\n",
+        f"Free space path loss: {free_space:.2f} dB",
+        f"{'Longley-Rice' if '-olditm' in options else 'ITWOM Version 3.0'} path loss: {path_loss:.2f} dB",
+        f"Signal power level at rx: {20 - path_loss:.2f} dBm",
+        "",
+    ]
+    if obstructed:
+        lines.append("Between rx and tx, SPLAT! detected obstructions at:\n")
+        for i in np.flatnonzero(terrain + curvature > reference)[:50]:
+            t = d[i] / distance
+            lat = rx_lat + (tx_lat - rx_lat) * t
+            west = 360 - (rx_lon + (tx_lon - rx_lon) * t)
+            lines.append(f"\t{lat:8.4f} N, {west % 360:8.4f} W, {d[i]:5.2f} kilometers, {terrain[i]:6.2f} meters AMSL")
+        lines += [
+            "\nAntenna at rx must be raised to at least 42.00 meters AGL",
+            "to clear all obstructions detected by SPLAT!",
+        ]
+    else:
+        lines += [
+            "No obstructions to LOS path due to terrain were detected by SPLAT!",
+            "The first Fresnel zone is clear.",
+            "60% of the first Fresnel zone is clear.",
+        ]
+    with open("tx-to-rx.txt", "w") as report_file:
+        report_file.write("\n".join(lines) + "\n")
+
+
+def coverage(options, high_resolution):
+    lat, lon = read_qth(options["-t"])
+    radius_km = float(options.get("-R", 50))
+    levels, colors = read_dcf("splat.dcf")
+    min_dbm = float(options.get("-db", levels.min()))
+
+    # SPLAT! maps the whole 1 degree terrain tiles the radius touches
+    delta_lat = radius_km / 111.0
+    delta_lon = delta_lat / max(math.cos(math.radians(lat)), 0.01)
+    south, north = math.floor(lat - delta_lat), math.floor(lat + delta_lat) + 1
+    west, east = math.floor(lon - delta_lon), math.floor(lon + delta_lon) + 1
+    pixels_per_degree = 3600 if high_resolution else 1200
+    height, width = (north - south) * pixels_per_degree, (east - west) * pixels_per_degree
+
+    start = time.perf_counter()
+    cols = (west + np.arange(width, dtype=np.float32) / pixels_per_degree - lon) * 111.0 * math.cos(math.radians(lat))
+    with open(options.get("-o", "output.ppm"), "wb") as ppm_file:
+        ppm_file.write(f"P6\n{width} {height}\n255\n".encode("ascii"))
+        # painted in strips of rows, a 30 m mosaic of a large radius does not fit in memory at once
+        for row in range(0, height, STRIP_ROWS):
+            rows = (north - np.arange(row, min(row + STRIP_ROWS, height), dtype=np.float32) / pixels_per_degree - lat)
+            distance = np.hypot(rows[:, None] * 111.0, cols[None, :])
+            dbm = levels.max() - 110 * distance / radius_km
+            dbm[distance > radius_km] = -999
+
+            rgb = np.full(distance.shape + (3,), 255, dtype=np.uint8)
+            for level, color in zip(levels[::-1], colors[::-1]):
+                if level >= min_dbm:
+                    rgb[dbm >= level] = color
+            ppm_file.write(rgb.tobytes())
+
+    write_ppm("output-ck.ppm", np.repeat(np.repeat(colors[:, None, :], 30, axis=0), 130, axis=1))
+    with open("output.kml", "w") as kml_file:
+        kml_file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://earth.google.com/kml/2.1">\n'
+            "<Folder><GroundOverlay><Icon><href>output.png</href></Icon>\n"
+            f"<LatLonBox><north>{north:.6f}</north><south>{south:.6f}</south>"
+            f"<east>{east:.6f}</east><west>{west:.6f}</west><rotation>0.0</rotation></LatLonBox>\n"
+            "</GroundOverlay></Folder>\n</kml>\n"
+        )
+
+    # SPLAT! time grows with the area it analyses
+    runtime = COVERAGE_S * (radius_km / 50) ** 2 * (HD_FACTOR if high_resolution else 1)
+    spend(max(0.0, runtime - (time.perf_counter() - start)))
+
+
+def main():
+    binary = os.path.basename(sys.argv[0])
+    if binary.startswith("srtm2sdf"):
+        return 0
+
+    options = parse_args(sys.argv[1:])
+    high_resolution = binary.endswith("-hd")
+    print(f"SPLAT!{' HD' if high_resolution else ''} v1.4.2 (fake, {' '.join(sys.argv[1:])})")
+    if "-r" in options:
+        line_of_sight(options, high_resolution)
+    else:
+        coverage(options, high_resolution)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Stub terrain and GeoServer servers for load tests
+
+CLI tool running the two services the API depends on besides Redis, so the whole stack can be load tested on one machine
+without terrain data or a GeoServer:
+
+- a terrain tile server answering `/3-arc/<tile>.sdf` and `/1-arc/<tile>-hd.sdf` with a tile of realistic size after
+  `--terrain-latency` seconds, like the download from TERRAIN_BASE_URL;
+- a GeoServer REST endpoint accepting the calls of a publish and an unpublish after `--geoserver-latency` seconds. It
+  remembers the published coverage stores, so the janitor's orphan scan sees a consistent catalog.
+
+With `--splat-dir` the fake SPLAT! binaries (fake_splat.py) are linked into that directory as splat, splat-hd, srtm2sdf
+and srtm2sdf-hd first. Run the API against it all with
+
+    SPLAT_PATH=<splat dir> TERRAIN_BASE_URL=http://localhost:8090 GEOSERVER_REST_URL=http://localhost:8091/geoserver/rest
+
+Args:
+    --host (str): Interface to listen on (default 127.0.0.1).
+    --terrain-port (int): Port of the terrain tile server (default 8090).
+    --geoserver-port (int): Port of the GeoServer stub (default 8091).
+    --terrain-latency (float): Seconds before a terrain tile is sent (default 0.2).
+    --tile-size-mb / --hd-tile-size-mb (float): Size of a 90 m / 30 m terrain tile (default 9 / 75, like the .sdf files).
+    --geoserver-latency (float): Seconds before a GeoServer REST call is answered (default 0.05).
+    --splat-dir (str): Directory to install the fake SPLAT! binaries in.
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_SPLAT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_splat.py")
+SPLAT_BINARIES = ("splat", "splat-hd", "srtm2sdf", "srtm2sdf-hd")
+
+COVERAGE_STORE_PATTERN = re.compile(r"/workspaces/[^/]+/coveragestores/([^/.?]+)")
+
+# Written in 1 MiB pieces of one shared buffer, serving a tile costs no memory per request
+CHUNK = b"0\n" * (512 * 1024)
+
+
+def install_fake_splat(splat_dir):
+    os.makedirs(splat_dir, exist_ok=True)
+    os.chmod(FAKE_SPLAT, os.stat(FAKE_SPLAT).st_mode | 0o111)
+    for binary in SPLAT_BINARIES:
+        path = os.path.join(splat_dir, binary)
+        if os.path.lexists(path):
+            os.remove(path)
+        os.symlink(FAKE_SPLAT, path)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_s = 0.0
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def reply(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TerrainHandler(StubHandler):
+    tile_bytes = {"3-arc": 0, "1-arc": 0}
+
+    def do_GET(self):
+        resolution = self.path.strip("/").split("/", 1)[0]
+        if resolution not in self.tile_bytes or not self.path.endswith(".sdf"):
+            self.reply(404)
+            return
+
+        time.sleep(self.latency_s)
+        size = self.tile_bytes[resolution]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        while size > 0:
+            piece = CHUNK[: min(size, len(CHUNK))]
+            self.wfile.write(piece)
+            size -= len(piece)
+
+
+class GeoServerHandler(StubHandler):
+    coverage_stores = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        self.read_body()
+        time.sleep(self.latency_s)
+        if self.path.split("?")[0].endswith("/coveragestores.json"):
+            with self.lock:
+                stores = [{"name": name} for name in sorted(self.coverage_stores)]
+            body = {"coverageStores": {"coverageStore": stores} if stores else ""}
+            self.reply(200, json.dumps(body).encode("utf-8"))
+        else:
+            # workspace, raster style and mosaic exist
+            self.reply(200, b"{}")
+
+    def do_POST(self):
+        self.read_body()
+        time.sleep(self.latency_s)
+        self.reply(201)
+
+    def do_PUT(self):
+        self.read_body()
+        time.sleep(self.latency_s)
+        match = COVERAGE_STORE_PATTERN.search(self.path)
+        if match and "/external." in self.path:
+            with self.lock:
+                self.coverage_stores.add(match.group(1))
+            self.reply(201)
+        else:
+            self.reply(200)
+
+    def do_DELETE(self):
+        self.read_body()
+        time.sleep(self.latency_s)
+        match = COVERAGE_STORE_PATTERN.search(self.path)
+        with self.lock:
+            if match and match.group(1) not in self.coverage_stores:
+                self.reply(404)
+                return
+            if match:
+                self.coverage_stores.discard(match.group(1))
+        self.reply(200)
+
+
+def serve(handler, host, port):
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub terrain and GeoServer servers for load tests")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--terrain-port", type=int, default=8090, help="Terrain tile server port")
+    parser.add_argument("--geoserver-port", type=int, default=8091, help="GeoServer stub port")
+    parser.add_argument("--terrain-latency", type=float, default=0.2, help="Seconds before a tile is sent")
+    parser.add_argument("--tile-size-mb", type=float, default=9, help="Size of a 90 m terrain tile")
+    parser.add_argument("--hd-tile-size-mb", type=float, default=75, help="Size of a 30 m terrain tile")
+    parser.add_argument("--geoserver-latency", type=float, default=0.05, help="Seconds before a REST call is answered")
+    parser.add_argument("--splat-dir", type=str, help="Directory to install the fake SPLAT! binaries in")
+    args = parser.parse_args()
+
+    if args.splat_dir:
+        install_fake_splat(args.splat_dir)
+        print(f"Fake SPLAT! binaries installed in {args.splat_dir}")
+
+    TerrainHandler.latency_s = args.terrain_latency
+    TerrainHandler.tile_bytes = {
+        "3-arc": int(args.tile_size_mb * 1024 * 1024),
+        "1-arc": int(args.hd_tile_size_mb * 1024 * 1024),
+    }
+    GeoServerHandler.latency_s = args.geoserver_latency
+
+    servers = [
+        serve(TerrainHandler, args.host, args.terrain_port),
+        serve(GeoServerHandler, args.host, args.geoserver_port),
+    ]
+    print(f"Terrain tiles on http://{args.host}:{args.terrain_port}")
+    print(f"GeoServer REST on http://{args.host}:{args.geoserver_port}/geoserver/rest")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
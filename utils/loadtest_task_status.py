@@ -0,0 +1,108 @@
+"""
+Task status poll storm load test
+
+CLI tool simulating many clients polling `GET /task/{task_id}` at the same time, like the analyze scripts do with up to 80
+tasks in flight. Every poller keeps one HTTP/1.1 keep-alive connection open and requests the status of its task in a
+loop for `--duration` seconds. The p50/p95/p99 latency and the request rate are reported, run it once against the API
+before and once after a change to compare.
+
+Only the standard library is used, so the load generator itself stays cheap enough for 1000 pollers in one process.
+
+Args:
+    --url (str): API base URL (default http://localhost:8080).
+    --pollers (int): Concurrent pollers (default 1000).
+    --duration (float): Seconds to poll (default 30).
+    --interval (float): Pause between the requests of one poller in seconds (default 0.2, like the analyze scripts).
+    --task-id (str): Task to poll. By default a random task id is polled, the API then answers 404 after the same
+        Redis lookup as for a real task.
+    --label (str): Label of the result row, e.g. "before" or "after".
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+
+async def poller(host, port, path, deadline, interval, latencies, errors):
+    reader = writer = None
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode("ascii")
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in headers.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            errors.append(1)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+
+        await asyncio.sleep(interval)
+
+    if writer is not None:
+        writer.close()
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host = url.hostname
+    port = url.port or 80
+    path = f"{url.path.rstrip('/')}/task/{args.task_id or uuid4()}"
+
+    latencies = []
+    errors = []
+    start = time.monotonic()
+    deadline = start + args.duration
+    await asyncio.gather(
+        *[
+            poller(host, port, path, deadline, args.interval, latencies, errors)
+            for _ in range(args.pollers)
+        ]
+    )
+    elapsed = time.monotonic() - start
+
+    latencies.sort()
+    if not latencies:
+        print(f"| {args.label} | {args.pollers} | 0 | - | - | - | {len(errors)} |")
+        return
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(
+        f"| {args.label} | {args.pollers} | {len(latencies) / elapsed:.0f} | "
+        f"{statistics.median(latencies) * 1000:.1f} | {percentile(0.95):.1f} | {percentile(0.99):.1f} | {len(errors)} |"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test GET /task/{task_id} with many concurrent pollers")
+    parser.add_argument("--url", type=str, default="http://localhost:8080", help="API base URL")
+    parser.add_argument("--pollers", type=int, default=1000, help="Concurrent pollers")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to poll")
+    parser.add_argument("--interval", type=float, default=0.2, help="Pause between requests of one poller")
+    parser.add_argument("--task-id", type=str, help="Task id to poll, random by default")
+    parser.add_argument("--label", type=str, default="", help="Label of the result row")
+    args = parser.parse_args()
+
+    print("| Run | Pollers | Requests/s | p50 [ms] | p95 [ms] | p99 [ms] | Errors |")
+    print("| --- | --- | --- | --- | --- | --- | --- |")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
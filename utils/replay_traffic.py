@@ -0,0 +1,296 @@
+"""
+Traffic replay and comparison
+
+CLI tool replaying traffic captured by the API (TRAFFIC_CAPTURE_DIR, see services/capture.py) against any deployment,
+and comparing the per endpoint latency distributions of two replays. Replay the same capture before and after a change
+to see whether it made the API faster for what planners actually do.
+
+`replay` merges the capture files of all API processes, sends every request at its original offset divided by
+`--speed` and records the latency and status per endpoint (method and route). Task ids are substituted: a captured
+`GET /task/{task}` of a job submitted in the capture polls the job submitted in the replay. Each captured client is
+sent with its own X-Real-IP, so per client behaviour is replayed too.
+
+`compare` prints the p50/p95/p99 latency of every endpoint in two replays, their change and the Kolmogorov-Smirnov
+distance between the two distributions with its p-value (a small p-value means the change is not noise).
+
+Examples:
+    python utils/replay_traffic.py replay captures/*.jsonl.gz --url http://localhost:8081 --speed 2 --out before.json
+    python utils/replay_traffic.py compare before.json after.json
+
+Args (replay):
+    captures (str): Capture files (.jsonl.gz).
+    --url (str): API base URL (default http://localhost:8081).
+    --speed (float): Replay speed, 2 sends the traffic twice as fast as it was captured (default 1).
+    --routes (str): Regular expression of the "METHOD /route" keys to replay, e.g. "^POST" (default all).
+    --task-wait (float): Seconds a request waits for the replayed job whose task id it needs (default 10).
+    --label (str): Label of the replay.
+    --out (str): JSON file to write the results to (default replay.json).
+
+Args (compare):
+    baseline / candidate (str): Results of two replays.
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import math
+import re
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+TASK_TOKEN_PATTERN = re.compile(r"\{task:([0-9a-f]+)\}")
+
+
+def load_captures(paths):
+    """All captured requests of the given files, ordered by arrival."""
+    records = []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as capture_file:
+            for line in capture_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line of a capture still being written may be incomplete
+                    continue
+                if "t" in record:
+                    records.append(record)
+    return sorted(records, key=lambda record: record["t"])
+
+
+def endpoint(record):
+    return f"{record['method']} {record.get('route') or record['path']}"
+
+
+def client_address(token):
+    """A stable private address per captured client."""
+    digest = hashlib.sha256((token or "").encode("ascii")).digest()
+    return f"10.{digest[0]}.{digest[1]}.{digest[2]}"
+
+
+async def http_request(host, port, method, path, body=None, headers=None):
+    """One HTTP/1.1 request on its own connection, returns (status, body)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+        for name, value in (headers or {}).items():
+            head += f"{name}: {value}\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + (body or b""))
+        await writer.drain()
+
+        response_headers = await reader.readuntil(b"\r\n\r\n")
+        status = int(response_headers.split(b" ", 2)[1])
+        length = None
+        for line in response_headers.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+        content = await (reader.readexactly(length) if length is not None else reader.read())
+        return status, content
+    finally:
+        writer.close()
+
+
+class Replay:
+    def __init__(self, url, speed, task_wait_s):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.speed = speed
+        self.task_wait_s = task_wait_s
+        self.task_ids = {}  # captured task token -> task id of the replayed job
+        self.task_events = defaultdict(asyncio.Event)
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.skipped = 0
+
+    async def task_id(self, token):
+        if token not in self.task_ids:
+            try:
+                await asyncio.wait_for(self.task_events[token].wait(), self.task_wait_s)
+            except asyncio.TimeoutError:
+                # submitted before the capture started or never answered, the API answers 404 as it did then
+                self.task_ids[token] = str(uuid.uuid4())
+        return self.task_ids[token]
+
+    async def substitute(self, text):
+        for token in set(TASK_TOKEN_PATTERN.findall(text)):
+            text = text.replace(f"{{task:{token}}}", await self.task_id(token))
+        return text
+
+    async def send(self, record):
+        key = endpoint(record)
+        path = await self.substitute(record["path"])
+        if record.get("query"):
+            path += "?" + await self.substitute(record["query"])
+        body = None
+        if record["method"] in ("POST", "PUT", "PATCH"):
+            if record.get("body") is None:
+                self.skipped += 1
+                return
+            body = json.dumps(record["body"]).encode("utf-8")
+
+        start = time.perf_counter()
+        try:
+            status, content = await http_request(
+                self.host,
+                self.port,
+                record["method"],
+                path,
+                body,
+                headers={"X-Real-IP": client_address(record.get("client"))},
+            )
+        except (OSError, asyncio.IncompleteReadError):
+            self.statuses[key]["error"] += 1
+            return
+        self.latencies[key].append((time.perf_counter() - start) * 1000)
+        self.statuses[key][str(status)] += 1
+
+        if record.get("task") and status == 200:
+            try:
+                self.task_ids[record["task"]] = json.loads(content)["task_id"]
+            except (ValueError, KeyError):
+                pass
+            self.task_events[record["task"]].set()
+
+    async def run(self, records):
+        t0 = records[0]["t"]
+        start = time.perf_counter()
+        requests = []
+        for record in records:
+            delay = (record["t"] - t0) / self.speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            requests.append(asyncio.create_task(self.send(record)))
+        await asyncio.gather(*requests)
+        return time.perf_counter() - start
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))]
+
+
+def ks_test(a, b):
+    """Two sample Kolmogorov-Smirnov distance and its asymptotic p-value."""
+    a, b = sorted(a), sorted(b)
+    i = j = 0
+    distance = 0.0
+    while i < len(a) and j < len(b):
+        value = min(a[i], b[j])
+        while i < len(a) and a[i] <= value:
+            i += 1
+        while j < len(b) and b[j] <= value:
+            j += 1
+        distance = max(distance, abs(i / len(a) - j / len(b)))
+
+    n = len(a) * len(b) / (len(a) + len(b))
+    lam = (math.sqrt(n) + 0.12 + 0.11 / math.sqrt(n)) * distance
+    p_value = 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * lam * lam) for k in range(1, 101))
+    return distance, min(1.0, max(0.0, p_value))
+
+
+def fmt(value, unit=""):
+    return "-" if value is None else f"{value:.1f}{unit}"
+
+
+def replay(args):
+    records = load_captures(args.captures)
+    if args.routes:
+        routes = re.compile(args.routes)
+        records = [record for record in records if routes.search(endpoint(record))]
+    if not records:
+        raise SystemExit("No captured requests to replay.")
+
+    span = records[-1]["t"] - records[0]["t"]
+    print(f"Replaying {len(records)} requests captured over {span:.0f} s at {args.speed:g}x.")
+    runner = Replay(args.url, args.speed, args.task_wait)
+    elapsed = asyncio.run(runner.run(records))
+
+    results = {
+        "label": args.label,
+        "url": args.url,
+        "speed": args.speed,
+        "captures": args.captures,
+        "duration_s": elapsed,
+        "skipped": runner.skipped,
+        "endpoints": {
+            key: {"statuses": dict(runner.statuses[key]), "latencies_ms": runner.latencies[key]}
+            for key in sorted(runner.statuses)
+        },
+    }
+    with open(args.out, "w") as out_file:
+        json.dump(results, out_file)
+
+    print("| Endpoint | Requests | Statuses | p50 [ms] | p95 [ms] | p99 [ms] |")
+    print("| --- | --- | --- | --- | --- | --- |")
+    for key, result in results["endpoints"].items():
+        latencies = result["latencies_ms"]
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(result["statuses"].items()))
+        print(
+            f"| {key} | {sum(result['statuses'].values())} | {statuses} | {fmt(percentile(latencies, 50))} | "
+            f"{fmt(percentile(latencies, 95))} | {fmt(percentile(latencies, 99))} |"
+        )
+    if runner.skipped:
+        print(f"\n{runner.skipped} requests without a captured body were skipped.")
+    print(f"\nResults written to {args.out}.")
+
+
+def compare(args):
+    with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+
+    print(f"Baseline: {baseline.get('label') or args.baseline}, candidate: {candidate.get('label') or args.candidate}\n")
+    print(
+        "| Endpoint | Requests | p50 [ms] | p95 [ms] | p99 [ms] | p50 change | p95 change | p99 change | KS D | p-value |"
+    )
+    print("| --- | --- | --- | --- | --- | --- | --- | --- | --- | --- |")
+    for key in sorted(set(baseline["endpoints"]) | set(candidate["endpoints"])):
+        a = baseline["endpoints"].get(key, {}).get("latencies_ms", [])
+        b = candidate["endpoints"].get(key, {}).get("latencies_ms", [])
+        cells = []
+        changes = []
+        for q in (50, 95, 99):
+            before, after = percentile(a, q), percentile(b, q)
+            cells.append(f"{fmt(before)} → {fmt(after)}")
+            changes.append(fmt((after - before) / before * 100, " %") if before and after is not None else "-")
+        distance, p_value = ks_test(a, b) if a and b else (None, None)
+        print(
+            f"| {key} | {len(a)} / {len(b)} | {' | '.join(cells)} | {' | '.join(changes)} | "
+            f"{fmt(distance and distance * 100, ' %')} | {'-' if p_value is None else f'{p_value:.3g}'} |"
+        )
+
+    print(f"\nBaseline took {baseline['duration_s']:.0f} s, the candidate {candidate['duration_s']:.0f} s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured API traffic and compare replays")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = commands.add_parser("replay", help="Replay captured traffic against an API")
+    replay_parser.add_argument("captures", nargs="+", help="Capture files (.jsonl.gz)")
+    replay_parser.add_argument("--url", type=str, default="http://localhost:8081", help="API base URL")
+    replay_parser.add_argument("--speed", type=float, default=1, help="Replay speed multiplier")
+    replay_parser.add_argument("--routes", type=str, help='Regular expression of "METHOD /route" keys to replay')
+    replay_parser.add_argument("--task-wait", type=float, default=10, help="Seconds to wait for a replayed job")
+    replay_parser.add_argument("--label", type=str, default="", help="Label of the replay")
+    replay_parser.add_argument("--out", type=str, default="replay.json", help="Results file")
+
+    compare_parser = commands.add_parser("compare", help="Compare the latency distributions of two replays")
+    compare_parser.add_argument("baseline", help="Results of the baseline replay")
+    compare_parser.add_argument("candidate", help="Results of the candidate replay")
+
+    args = parser.parse_args()
+    if args.command == "replay":
+        replay(args)
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()